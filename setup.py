@@ -27,6 +27,9 @@ setup(name='simplace',
       install_requires=[
           jp, 'numpy'
       ],
+      entry_points={
+          'console_scripts': ['simplace-run = simplace.cli:main']
+      },
       classifiers=[
           'Development Status :: 4 - Beta',
           'Intended Audience :: Developers',
@@ -32,30 +32,57 @@ framework http://www.simplace.net
 import simplace
 
 class SimplaceInstance:
-    """Class to access and control the simulation Framework Simplace"""
+    """Class to access and control the simulation Framework Simplace
+
+    With lazy=True the java virtual machine and Simplace are started on the
+    first call that needs them, using the arguments given here.
+    """
 
     def __init__(self, installDir = None, workDir = None, outputDir = None,
                 projectsDir=None, dataDir=None,
-                 additionalClasspathList =[], javaParameters = None):
-        self._sh = simplace.initSimplace(installDir, workDir, outputDir,
-                                 projectsDir, dataDir,
-                                 additionalClasspathList, javaParameters)
+                 additionalClasspathList =[], javaParameters = None,
+                 autoJava = None, lazy = False):
+        self._config = (installDir, workDir, outputDir, projectsDir, dataDir,
+                        additionalClasspathList, javaParameters, autoJava)
+        self._handle = None
+        self._runStatistics = None
+        if not lazy:
+            self._start()
+
+    @property
+    def _sh(self):
+        if self._handle is None:
+            self._start()
+        return self._handle
+
+    def _start(self):
+        self._handle = simplace.initSimplace(*self._config)
+
+    def isStarted(self):
+        """Whether the java virtual machine and Simplace are running."""
+        return self._handle is not None
 
     def shutDown(self):
         """Terminates the java virtual machine"""
-        simplace.shutDown(self._sh)
+        if self._handle is not None:
+            simplace.shutDown(self._handle)
 
-    def openProject(self, solution, project = None, parameters=None):
+    def openProject(self, solution, project = None, parameters=None,
+                    reuse = False):
         """Create a project from the solution and optional project file."""
-        simplace.openProject(self._sh, solution, project, parameters)
+        simplace.openProject(self._sh, solution, project, parameters, reuse)
 
     def closeProject(self):
         """Close the project."""
         simplace.closeProject(self._sh)
 
-    def runProject(self):
+    def runProject(self, profiler = None):
         """Run the project."""
-        simplace.runProject(self._sh)
+        sh = self._sh
+        before = simplace.getJvmStatistics()
+        simplace.runProject(sh, profiler)
+        self._runStatistics = simplace.jvmStatisticsDelta(
+            before, simplace.getJvmStatistics())
 
     def setProjectLines(self, lines):
         """Set the line numbers of the project data file used for simulations."""
@@ -79,9 +106,17 @@ class SimplaceInstance:
         """Set values of all simulations in queue."""
         simplace.setAllSimulationValues(self._sh, parameterlist)
 
-    def runSimulations(self, selectsimulation = False):
+    def runSimulations(self, selectsimulation = False, profiler = None):
         """Run created simulations."""
-        simplace.runSimulations(self._sh, selectsimulation)
+        sh = self._sh
+        before = simplace.getJvmStatistics()
+        simplace.runSimulations(sh, selectsimulation, profiler)
+        self._runStatistics = simplace.jvmStatisticsDelta(
+            before, simplace.getJvmStatistics())
+
+    def getRunStatistics(self):
+        """Get garbage collection and heap statistics of the last run."""
+        return self._runStatistics
 
     def stepSimulation(self, count = 1, parameters = None, varFilter = None,
                        simulationnumber = 0):
@@ -96,11 +131,27 @@ class SimplaceInstance:
                                          varFilter)
         return [SimplaceVarmap(varmap) for varmap in varmaps]
 
+    def createStepReader(self, varFilter = None, simulationnumber = 0):
+        """Create a reader that steps a simulation into numpy arrays."""
+        return simplace.StepReader(self._sh, varFilter, simulationnumber)
+
     def getResult(self, output, simulation=None):
         """Get a specific output of a finished simulation."""
         result = simplace.getResult(self._sh, output, simulation)
         return SimplaceResult(result)
 
+    def getResultTable(self, output, simulations = None, expand = True,
+                       columns = None):
+        """Get an output of several simulations as one columnar table."""
+        return simplace.getResultTable(self._sh, output, simulations, expand,
+                                       columns)
+
+    def getResults(self, outputs, simulation = None, columns = None,
+                   expand = True):
+        """Get several outputs as columnar tables in one pass."""
+        return simplace.getResults(self._sh, outputs, simulation, columns,
+                                   expand)
+
 
     def getSimplaceDirectories(self):
         """get work-, output-, projects- and data-directory."""
@@ -118,6 +169,7 @@ class SimplaceInstance:
         """Set the log's verbosity. Ranges from least verbose
             'ERROR','WARN','INFO','DEBUG' to most verbose 'TRACE'.
         """
+        self._sh  # the java classes are loaded when the vm runs
         simplace.setLogLevel(level)
 
     def setCheckLevel(self, level):
@@ -126,6 +178,7 @@ class SimplaceInstance:
 
     def setSlotCount(self, count):
         """Set the maximum numbers of processors used  when running projects."""
+        self._sh  # the java classes are loaded when the vm runs
         simplace.setSlotCount(count)
 
 
@@ -145,6 +198,10 @@ class SimplaceResult():
     def getDatatypes(self):
         """Get datatypes of the result values."""
         return simplace.getDatatypesOfResult(self._rs)
+    def aggregate(self, by = 'month', funcs = None,
+                  dateColumn = 'CURRENT.DATE', window = 10000):
+        """Aggregate the result by year, month or day while fetching it."""
+        return simplace.aggregateResult(self._rs, by, funcs, dateColumn, window)
 
 
 
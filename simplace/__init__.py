@@ -1,3 +1,48 @@
 from .simplace import *
-from .SimplaceClasses import SimplaceInstance
+from .simplace import __all__ as _simplaceAll
 from ._version import __version__, __version_info__
+
+# Classes and functions of the submodules are imported on first access
+# (PEP 562), so importing the package doesn't load jpype, numpy or any
+# submodule that is not used.
+
+_LAZY = {
+    'SimplaceClasses': ['SimplaceInstance'],
+    'scheduler': ['runProjectScheduled', 'LineCostModel'],
+    'checkpoint': ['runProjectResumable', 'unfinishedLines'],
+    'jvm': ['autoJavaParameters', 'getJvmStatistics', 'jvmStatisticsDelta'],
+    'distributed': ['Broker', 'SQLiteBroker', 'Coordinator', 'runWorker'],
+    'grid': ['GridRunner', 'GridResult'],
+    'profiling': ['Profiler', 'profileProjectLines'],
+    'aggregate': ['aggregateResult'],
+    'tables': ['ResultTable', 'getResultTable', 'resultToTable', 'getResults'],
+    'streaming': ['streamProject', 'runProjectStreaming'],
+    'stepping': ['StepReader', 'VarmapLayout', 'EnsembleStepper'],
+    'harness': ['FixtureResult', 'recordResult', 'recordVarmap',
+                'checkFixture', 'benchmark'],
+    'sensitivity': ['SobolAccumulator', 'MorrisAccumulator', 'saltelliSample',
+                    'morrisSample', 'elementaryEffects'],
+    'inputs': ['TmpfsCsvWriter'],
+    'csvreader': ['readOutputFile', 'readOutputFiles', 'findOutputFiles'],
+    'incremental': ['IncrementalProject', 'runProjectIncremental'],
+    'emulator': ['Emulator', 'GaussianProcess', 'latinHypercube'],
+    'batching': ['AdaptiveBatchExecutor'],
+    'store': ['CompactResultStore', 'CompactColumn'],
+}
+_ORIGIN = {name: module for module, names in _LAZY.items() for name in names}
+__all__ = _simplaceAll + sorted(_ORIGIN)
+
+
+def __getattr__(name):
+    import importlib
+    if name in _LAZY or name == 'cli':
+        return importlib.import_module('.' + name, __name__)
+    module = _ORIGIN.get(name)
+    if module is None:
+        raise AttributeError("module 'simplace' has no attribute %r" % name)
+    value = getattr(importlib.import_module('.' + module, __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_ORIGIN))
@@ -1,2 +1,2 @@
-__version_info__ = (5,1,0)
+__version_info__ = (5,2,0)
 __version__ = '.'.join(map(str,__version_info__))
\ No newline at end of file
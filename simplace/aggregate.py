@@ -0,0 +1,192 @@
+"""
+Aggregate daily outputs to monthly or yearly statistics while fetching them.
+
+The columns of the result are fetched once as java arrays and converted in
+windows of rows. Only the date column, the id columns and the aggregated
+columns of a window are converted, reduced by a vectorised group-by and
+merged with the partial aggregates of the previous windows, so the full
+daily table is never kept in python. Results of several simulations or
+project lines are aggregated separately.
+
+**Example** - *Monthly rain sums and maximal LAI:*
+
+    >>> import simplace
+    >>> res = simplace.getResult(sp, 'DailyOut', simid)
+    >>> monthly = simplace.aggregateResult(res, by='month',
+    ...                 funcs={'Rain':'sum', 'LAI':'max'})
+    >>> print(monthly['year'][:2], monthly['month'][:2], monthly['Rain'][:2])
+    [1990 1990] [1 2] [ 61.2  48.9]
+
+"""
+
+import numpy
+
+_REDUCERS = ['sum', 'mean', 'min', 'max', 'count', 'first', 'last']
+_ID_SUFFIXES = ('SIMULATIONID', 'PROJECTID')
+_PERIOD_OFFSET = 2 ** 31
+
+
+def aggregateResult(result, by='month', funcs=None,
+                    dateColumn='CURRENT.DATE', window=10000, idColumns=None):
+    """
+    Aggregate the rows of a result by simulation and year, month or day.
+
+    NaN values are ignored by all reducers, a period without finite values
+    gets NaN (count 0).
+
+    Args:
+        result: handle to simulation result (as returned by getResult())
+        by (str): 'year', 'month' or 'day'
+        funcs (dict): column names as keys, reducer names as values. A
+            reducer is one of 'sum', 'mean', 'min', 'max', 'count', 'first'
+            and 'last', or a list of them
+        dateColumn (str): name of the date column
+        window (int): number of rows converted at once
+        idColumns (list): columns identifying the simulation or project line
+            of a row. By default all columns whose name ends with
+            SIMULATIONID or PROJECTID (case insensitive)
+
+    Returns:
+        dict : id columns (as strings), key columns ('year', 'month' or
+        'date') and one column for every aggregated variable, named like
+        the variable for single reducers and variable_reducer for lists of
+        reducers
+    """
+    if by not in ['year', 'month', 'day']:
+        raise ValueError("by must be 'year', 'month' or 'day'")
+    specs = []
+    for name, f in (funcs or {}).items():
+        reducers = [f] if isinstance(f, str) else list(f)
+        for r in reducers:
+            if r not in _REDUCERS:
+                raise ValueError('Unknown reducer %s' % r)
+            label = name if isinstance(f, str) else name + '_' + r
+            specs.append((name, r, label))
+
+    names = [str(s) for s in result.getHeaderStrings()]
+    if idColumns is None:
+        idColumns = [n for n in names if n.upper().endswith(_ID_SUFFIXES)]
+    dateIndex = names.index(dateColumn)
+    idIndex = [names.index(name) for name in idColumns]
+    columns = sorted(set(name for name, _, _ in specs))
+    index = {name: names.index(name) for name in columns}
+
+    obj = result.getDataObjects()
+    rowCount = len(obj[dateIndex]) if len(obj) > 0 else 0
+    ids = {}
+    keys = numpy.zeros(0, dtype=numpy.int64)
+    partial = {key: numpy.zeros(0) for key in _needed(specs)}
+    for start in range(0, rowCount, window):
+        end = min(start + window, rowCount)
+        dates = numpy.array([str(s)[:10] for s in obj[dateIndex][start:end]],
+                            dtype='datetime64[D]')
+        values = {name: numpy.array(obj[index[name]][start:end], dtype=float)
+                  for name in columns}
+        codes = _idCodes([obj[i][start:end] for i in idIndex], ids, end - start)
+        k, p = _reduce(codes * 2 ** 32 + _periodKeys(dates, by) + _PERIOD_OFFSET,
+                       values, specs)
+        keys, partial = _merge(keys, partial, k, p, specs)
+
+    out = {}
+    idValues = list(ids)
+    for i, name in enumerate(idColumns):
+        out[name] = numpy.array([idValues[c][i] for c in keys >> 32], dtype=str)
+    out.update(_keyColumns((keys & 0xffffffff) - _PERIOD_OFFSET, by))
+    for name, r, label in specs:
+        if r == 'mean':
+            with numpy.errstate(invalid='ignore', divide='ignore'):
+                out[label] = partial[(name, 'sum')] / partial[(name, 'count')]
+        elif r == 'sum':
+            out[label] = numpy.where(partial[(name, 'count')] > 0,
+                                     partial[(name, 'sum')], numpy.nan)
+        else:
+            out[label] = partial[(name, r)]
+    return out
+
+
+# Helper Functions
+
+def _periodKeys(dates, by):
+    if by == 'year':
+        return dates.astype('datetime64[Y]').astype(numpy.int64)
+    elif by == 'month':
+        return dates.astype('datetime64[M]').astype(numpy.int64)
+    else:
+        return dates.astype(numpy.int64)
+
+def _keyColumns(keys, by):
+    if by == 'year':
+        return {'year': keys + 1970}
+    elif by == 'month':
+        return {'year': keys // 12 + 1970, 'month': keys % 12 + 1}
+    else:
+        return {'date': keys.astype('datetime64[D]')}
+
+def _groups(keys):
+    order = numpy.argsort(keys, kind='stable')
+    sortedKeys = keys[order]
+    starts = numpy.flatnonzero(numpy.r_[True, sortedKeys[1:] != sortedKeys[:-1]])
+    ends = numpy.r_[starts[1:], len(keys)]
+    return sortedKeys[starts], order, starts, ends
+
+def _idCodes(columns, ids, rows):
+    if len(columns) == 0:
+        return numpy.zeros(rows, dtype=numpy.int64)
+    values = list(zip(*[[str(s) for s in col] for col in columns]))
+    return numpy.array([ids.setdefault(v, len(ids)) for v in values],
+                       dtype=numpy.int64)
+
+def _reduceOne(v, r, order, starts, ends):
+    s = v[order]
+    if r in ('sum', 'count'):
+        return numpy.add.reduceat(s, starts)
+    elif r == 'min':
+        return numpy.fmin.reduceat(s, starts)
+    elif r == 'max':
+        return numpy.fmax.reduceat(s, starts)
+    out = numpy.full(len(starts), numpy.nan)
+    positions = numpy.flatnonzero(numpy.isfinite(s))
+    if len(positions) == 0:
+        return out
+    if r == 'first':
+        i = numpy.minimum(numpy.searchsorted(positions, starts),
+                          len(positions) - 1)
+    else:
+        i = numpy.maximum(numpy.searchsorted(positions, ends) - 1, 0)
+    p = positions[i]
+    found = (p >= starts) & (p < ends)
+    out[found] = s[p[found]]
+    return out
+
+def _needed(specs):
+    needed = set()
+    for name, r, _ in specs:
+        if r in ('mean', 'sum'):
+            needed.update([(name, 'sum'), (name, 'count')])
+        else:
+            needed.add((name, r))
+    return sorted(needed)
+
+def _reduce(keys, values, specs):
+    uniq, order, starts, ends = _groups(keys)
+    partial = {}
+    for name, r in _needed(specs):
+        v = values[name]
+        valid = numpy.isfinite(v)
+        if r == 'count':
+            v = valid.astype(float)
+        elif r == 'sum':
+            v = numpy.where(valid, v, 0.0)
+        partial[(name, r)] = _reduceOne(v, r, order, starts, ends)
+    return uniq, partial
+
+def _merge(keys, partial, newKeys, newPartial, specs):
+    if len(keys) == 0:
+        return newKeys, newPartial
+    allKeys = numpy.concatenate([keys, newKeys])
+    uniq, order, starts, ends = _groups(allKeys)
+    merged = {}
+    for name, r in _needed(specs):
+        v = numpy.concatenate([partial[(name, r)], newPartial[(name, r)]])
+        merged[(name, r)] = _reduceOne(v, r, order, starts, ends)
+    return uniq, merged
@@ -0,0 +1,184 @@
+"""
+Queue simulations in batches whose size adapts to throughput and heap.
+
+An AdaptiveBatchExecutor creates a batch of simulations, runs them and
+fetches their outputs. After every batch it measures the time of the three
+phases and the heap of the java virtual machine, estimates the memory a
+simulation occupies and chooses the next batch size: it keeps growing
+while the simulations per second improve, steps back when they get worse
+and never exceeds the batch size that fits below the memory ceiling. Every
+decision is recorded, so a run can be reproduced with fixed batch sizes.
+
+Finished simulations stay in the memory of Simplace until the project is
+opened again. Pass a release function (e.g. reopening the solution) to
+free them between batches, otherwise the executor shrinks the batches as
+the heap fills up.
+
+**Example** - *Running 20000 parameter sets:*
+
+    >>> import simplace
+    >>> simplace.openProject(sp, '/sol/Maize.sol.xml')
+    >>> ex = simplace.AdaptiveBatchExecutor(sp, ['YearOut'],
+    ...     release=lambda: simplace.openProject(sp, '/sol/Maize.sol.xml'))
+    >>> results = ex.run(parameterlist)
+    >>> print([d['size'] for d in ex.decisions][:6])
+    [8, 16, 32, 64, 45, 38]
+
+"""
+
+import json
+import time
+import warnings
+
+import simplace
+
+
+class AdaptiveBatchExecutor:
+    """Runs parameter sets in batches of adaptive size.
+
+    Args:
+        simplaceInstance: handle to the SimplaceWrapper object returned by
+            initSimplace (solution must be opened)
+        outputs (list): names of memory outputs fetched for every simulation
+        initialBatch (int): size of the first batch
+        minBatch (int): minimal batch size
+        maxBatch (int): maximal batch size
+        memoryFraction (float): ceiling for the heap after garbage
+            collection, as fraction of the maximal heap
+        growth (float): factor by which the batch size is changed
+        tolerance (float): relative change of the throughput regarded as
+            noise
+        convert (function): converts a result handle (default resultToList)
+        release (function): called after the outputs of a batch have been
+            converted, e.g. to reopen the project (optional)
+        logFile (str): file where every decision is appended as json line
+            (optional)
+        verbose (bool): print the decisions
+    """
+
+    def __init__(self, simplaceInstance, outputs, initialBatch=8, minBatch=1,
+                 maxBatch=10000, memoryFraction=0.7, growth=2.0,
+                 tolerance=0.05, convert=None, release=None, logFile=None,
+                 verbose=False):
+        self._sh = simplaceInstance
+        self.outputs = list(outputs)
+        self.size = initialBatch
+        self.minBatch = minBatch
+        self.maxBatch = maxBatch
+        self.memoryFraction = memoryFraction
+        self.growth = growth
+        self.tolerance = tolerance
+        self.convert = convert or simplace.resultToList
+        self.release = release
+        self.logFile = logFile
+        self.verbose = verbose
+        self.decisions = []
+        self._direction = 1
+        self._step = growth
+        self._best = None
+
+    def run(self, parameterlist, callback=None):
+        """
+        Run all parameter sets.
+
+        Args:
+            parameterlist (list): list of dictionaries with parameters for
+                createSimulation
+            callback (function): called with the parameters and converted
+                outputs of every batch. If given, the outputs are not kept
+
+        Returns:
+            list : for every parameter set a dictionary with the output names
+            as keys and the converted outputs as values (empty if a callback
+            is given)
+        """
+        parameterlist = list(parameterlist)
+        results = []
+        position = 0
+        while position < len(parameterlist):
+            batch = parameterlist[position:position + self.size]
+            position += len(batch)
+            converted = self._runBatch(batch)
+            if callback is not None:
+                callback(batch, converted)
+            else:
+                results.extend(converted)
+        return results
+
+    def _runBatch(self, batch):
+        before = simplace.getJvmStatistics()
+        t0 = time.perf_counter()
+        ids = [simplace.createSimulation(self._sh, p) for p in batch]
+        t1 = time.perf_counter()
+        simplace.runSimulations(self._sh)
+        t2 = time.perf_counter()
+        converted = [{o: self.convert(simplace.getResult(self._sh, o, simid))
+                      for o in self.outputs} for simid in ids]
+        t3 = time.perf_counter()
+        after = simplace.getJvmStatistics()
+        if self.release is not None:
+            self.release()
+        self._decide(len(batch), t1 - t0, t2 - t1, t3 - t2, before, after)
+        return converted
+
+    def _decide(self, size, createSeconds, runSeconds, convertSeconds,
+                before, after):
+        seconds = createSeconds + runSeconds + convertSeconds
+        throughput = size / seconds if seconds > 0 else float('inf')
+        if after['gcCount'] > before['gcCount']:
+            heap, base = after['heapAfterGc'], before['heapAfterGc']
+        else:
+            heap, base = after['heapUsed'], before['heapUsed']
+        perSimulation = max(heap - base, 0) / size
+        ceiling = self.memoryFraction * after['heapMax']
+        headroom = ceiling - (base if self.release is not None else heap)
+        memoryLimit = int(headroom / perSimulation) if perSimulation > 0 \
+            else self.maxBatch
+
+        if self._best is None or size == self._best[0]:
+            improved = self._best is not None and \
+                throughput > self._best[1] * (1 + self.tolerance)
+            self._best = (size, throughput)
+            reason = 'first batch, grow' if len(self.decisions) == 0 else \
+                'best size measured again' + (', continue' if improved else '')
+        elif throughput > self._best[1] * (1 + self.tolerance):
+            self._best = (size, throughput)
+            reason = 'throughput improved, continue'
+        elif throughput < self._best[1] * (1 - self.tolerance):
+            self._direction = 1 if self._best[0] > size else -1
+            self._step = max(self._step ** 0.5, 1.0 + self.tolerance)
+            reason = 'throughput decreased, back to best size'
+        else:
+            self._direction = 1 if self._best[0] > size else -1
+            self._step = max(self._step ** 0.5, 1.0 + self.tolerance)
+            reason = 'throughput unchanged, refine'
+        proposed = self.size * self._step if self._direction > 0 \
+            else self.size / self._step
+        proposed = int(round(proposed))
+        if proposed == self.size:
+            proposed += self._direction
+        nextSize = min(max(proposed, self.minBatch), self.maxBatch)
+        if nextSize > memoryLimit:
+            nextSize = max(memoryLimit, self.minBatch)
+            self._direction = -1
+            reason += ', limited by memory'
+            if memoryLimit < self.minBatch:
+                warnings.warn('Heap ceiling reached, outputs of finished '
+                              'simulations should be released between batches')
+        decision = {'batch': len(self.decisions), 'size': size,
+                    'createSeconds': createSeconds, 'runSeconds': runSeconds,
+                    'convertSeconds': convertSeconds,
+                    'throughput': throughput, 'heap': heap,
+                    'heapMax': after['heapMax'],
+                    'memoryPerSimulation': perSimulation,
+                    'memoryLimit': memoryLimit, 'nextSize': nextSize,
+                    'reason': reason}
+        self.decisions.append(decision)
+        if self.logFile is not None:
+            with open(self.logFile, 'a') as f:
+                f.write(json.dumps(decision) + '\n')
+        if self.verbose:
+            print('batch %d: %d simulations, %.1f/s, %.0f MB heap -> %d (%s)'
+                  % (decision['batch'], size, throughput, heap / 2 ** 20,
+                     nextSize, reason))
+        self.size = nextSize
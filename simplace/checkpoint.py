@@ -0,0 +1,193 @@
+"""
+Run long projects in chunks of project lines that can be resumed.
+
+The project lines are run chunk by chunk. After every chunk the manifest file
+is updated atomically with the lines, the runtime, the throughput and the
+output files of the chunk. If the run is interrupted, calling the function
+again with the same manifest skips the chunks that are already finished.
+
+**Example** - *Running a project resumable in chunks of 500 lines:*
+
+    >>> import simplace
+    >>> sp = simplace.initSimplace('/ws/','/runs/simulation/','/out/')
+    >>> manifest = simplace.runProjectResumable(sp, '/sol/Maize.sol.xml',
+    ...     '/proj/NRW.proj.xml', '1-40000', '/out/NRW.manifest.json',
+    ...     chunkSize=500)
+    >>> print(len(manifest['chunks']))
+    80
+
+"""
+
+import fnmatch
+import json
+import os
+import re
+import shutil
+import time
+import xml.etree.ElementTree as ElementTree
+
+import numpy
+
+import simplace
+
+
+def runProjectResumable(simplaceInstance, solution, project, lines, manifest,
+                        chunkSize=100, parameters=None, outputs=None,
+                        moveOutputFiles=True, outputFiles=None,
+                        verbose=False):
+    """
+    Run project lines chunkwise and record finished chunks in a manifest.
+
+    Output files of the solution written to the output directory during a
+    chunk are moved to a chunk specific subfolder next to the manifest, so
+    that the following chunks don't overwrite them. Other files in the
+    output directory are left alone. Memory outputs are saved as .npz files.
+
+    Args:
+        simplaceInstance: handle to the SimplaceWrapper object returned by
+            initSimplace
+        solution (str): path to solution file
+        project (str): path to project file
+        lines (str): line specification, e.g. "1-400,500" or list of lines
+        manifest (str): path of the manifest file (json)
+        chunkSize (int): number of project lines per chunk
+        parameters (dict): parameters passed to openProject (optional)
+        outputs (list): names of memory outputs that are saved for every
+            chunk (optional)
+        moveOutputFiles (bool): move the output files of a chunk to the
+            chunk folder
+        outputFiles (list): glob patterns (relative to the output directory)
+            of the files written by the run. By default they are taken from
+            the filename elements of the solution, placeholders like
+            ${projectid} match any text (optional)
+        verbose (bool): print progress messages
+
+    Returns:
+        dict : the manifest with an entry for every finished chunk
+    """
+    lines = simplace.projectLinesToList(lines)
+    chunks = [lines[i:i + chunkSize] for i in range(0, len(lines), chunkSize)]
+    state = _loadManifest(manifest, {
+        'solution': os.path.abspath(solution),
+        'project': os.path.abspath(project) if project is not None else None,
+        'lines': simplace.projectLinesToString(lines),
+        'chunkSize': chunkSize,
+        'chunks': {}})
+    chunkRoot = os.path.splitext(os.path.abspath(manifest))[0] + '_chunks'
+    dirs = simplace.getSimplaceDirectories(simplaceInstance)
+    outputDir = dirs['_OUTPUTDIR_']
+    if outputFiles is None:
+        outputFiles = _solutionOutputFiles(solution, dirs)
+    patterns = [os.path.join(os.path.abspath(outputDir), p) for p in outputFiles]
+
+    for number, chunk in enumerate(chunks):
+        name = '%06d' % number
+        if name in state['chunks']:
+            continue
+        chunkDir = os.path.join(chunkRoot, name)
+        os.makedirs(chunkDir, exist_ok=True)
+        before = _fileTimes(outputDir, chunkRoot)
+        start = time.time()
+        data = simplace.runProjectLines(simplaceInstance, solution, project,
+                                        chunk, parameters, outputs)
+        files = []
+        for output, columns in data.items():
+            path = os.path.join(chunkDir, output + '.npz')
+            numpy.savez(path, **{k: numpy.asarray(v)
+                                 for k, v in columns.items()})
+            files.append(path)
+        for path in _changedFiles(outputDir, chunkRoot, before, patterns):
+            if moveOutputFiles:
+                target = os.path.join(chunkDir, os.path.relpath(path, outputDir))
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.move(path, target)
+                path = target
+            files.append(path)
+        seconds = time.time() - start
+        state['chunks'][name] = {
+            'lines': simplace.projectLinesToString(chunk),
+            'start': start,
+            'seconds': seconds,
+            'linesPerSecond': len(chunk) / seconds if seconds > 0 else None,
+            'files': files}
+        _saveManifest(manifest, state)
+        if verbose:
+            print('chunk %s of %d finished: %d lines in %.1fs'
+                  % (name, len(chunks), len(chunk), seconds))
+    return state
+
+
+def unfinishedLines(manifest):
+    """
+    Get the project lines of a manifest that are not yet finished.
+
+    Args:
+        manifest (str): path of the manifest file (json)
+
+    Returns:
+        str : line specification of the unfinished lines
+    """
+    with open(manifest) as f:
+        state = json.load(f)
+    done = set()
+    for chunk in state['chunks'].values():
+        done.update(simplace.projectLinesToList(chunk['lines']))
+    todo = [l for l in simplace.projectLinesToList(state['lines'])
+            if l not in done]
+    return simplace.projectLinesToString(todo)
+
+
+# Helper Functions
+
+def _loadManifest(path, new):
+    if not os.path.exists(path):
+        return new
+    with open(path) as f:
+        state = json.load(f)
+    for key in ['solution', 'project', 'lines', 'chunkSize']:
+        if state.get(key) != new[key]:
+            raise ValueError('Manifest %s belongs to a different run (%s: %s)'
+                             % (path, key, state.get(key)))
+    return state
+
+def _saveManifest(path, state):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def _isInside(path, directory):
+    path, directory = os.path.abspath(path), os.path.abspath(directory)
+    return os.path.commonpath([path, directory]) == directory
+
+def _fileTimes(directory, exclude):
+    return {os.path.join(d, fn): os.stat(os.path.join(d, fn)).st_mtime_ns
+            for d, _, files in os.walk(directory)
+            if not _isInside(d, exclude)
+            for fn in files}
+
+def _changedFiles(directory, exclude, before, patterns):
+    after = _fileTimes(directory, exclude)
+    return sorted(p for p, t in after.items() if before.get(p) != t
+                  and any(fnmatch.fnmatch(os.path.abspath(p), pattern)
+                          for pattern in patterns))
+
+def _solutionOutputFiles(solution, dirs):
+    if not os.path.exists(solution):
+        solution = os.path.join(dirs['_WORKDIR_'], solution.lstrip("\\/"))
+    root = ElementTree.parse(solution).getroot()
+    outputDir = os.path.abspath(dirs['_OUTPUTDIR_'])
+    patterns = []
+    for element in root.iter('filename'):
+        name = (element.text or '').strip()
+        if name == '':
+            continue
+        for key, value in dirs.items():
+            name = name.replace('${%s}' % key, value)
+        name = re.sub(r'\$\{[^}]*\}', '*', name)
+        if os.path.isabs(name):
+            name = os.path.relpath(name, outputDir)
+        patterns.append(os.path.normpath(name))
+    return patterns
@@ -0,0 +1,207 @@
+"""
+Command line interface for running projects on several worker processes.
+
+The command simplace-run runs project lines with runProjectScheduled,
+prints the progress (lines/s and output rows/s) to stderr and a json
+summary of the run to stdout. Memory outputs are written per batch as npz
+or parquet files.
+
+**Example** - *Running 4000 project lines on 8 workers:*
+
+    $ simplace-run /sol/Maize.sol.xml /proj/NRW.proj.xml --lines 1-4000 \\
+          --workers 8 --install-dir /ws/ --output-dir /out/ \\
+          --outputs YearOut --result-dir /out/year --java-option=-Xmx4g
+
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import simplace
+
+
+def parseParameter(text):
+    """
+    Parse a parameter given as name=value.
+
+    Values are converted to int or float if possible, values with commas
+    to lists.
+
+    Args:
+        text (str): parameter as name=value
+
+    Returns:
+        tuple : name and value
+    """
+    name, sep, value = text.partition('=')
+    if sep == '':
+        raise argparse.ArgumentTypeError('Parameter must be name=value')
+    if ',' in value:
+        return name, [_number(v) for v in value.split(',')]
+    return name, _number(value)
+
+def buildParser():
+    """Create the argument parser of simplace-run."""
+    parser = argparse.ArgumentParser(
+        prog='simplace-run',
+        description='Run Simplace project lines on parallel worker processes.')
+    parser.add_argument('solution', help='solution file')
+    parser.add_argument('project', nargs='?', default=None,
+                        help='project file')
+    parser.add_argument('--lines', required=True,
+                        help='project lines, e.g. 1-400,500')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes (default cpus)')
+    parser.add_argument('--slot-count', type=int, default=1,
+                        help='cores used by each worker')
+    parser.add_argument('--install-dir', default=None)
+    parser.add_argument('--work-dir', default=None)
+    parser.add_argument('--output-dir', default=None)
+    parser.add_argument('--projects-dir', default=None)
+    parser.add_argument('--data-dir', default=None)
+    parser.add_argument('--java-option', action='append', default=[],
+                        help='option for the java vm (repeatable)')
+    parser.add_argument('--auto-java', action='store_true',
+                        help='derive heap size and gc from the workload')
+    parser.add_argument('--param', action='append', default=[],
+                        type=parseParameter, help='parameter as name=value')
+    parser.add_argument('--outputs', default=None,
+                        help='comma separated memory outputs to save')
+    parser.add_argument('--result-dir', default='results',
+                        help='directory for the saved outputs')
+    parser.add_argument('--format', choices=['npz', 'parquet'], default='npz',
+                        help='file format of the saved outputs')
+    parser.add_argument('--cost-db', default=None,
+                        help='SQLite file with learned line runtimes')
+    parser.add_argument('--min-batch', type=int, default=1)
+    parser.add_argument('--max-batch', type=int, default=None)
+    parser.add_argument('--summary', default=None,
+                        help='also write the json summary to this file')
+    parser.add_argument('--quiet', action='store_true',
+                        help="don't show the progress")
+    return parser
+
+def main(argv=None):
+    """
+    Run simplace-run.
+
+    Args:
+        argv (list): command line arguments (default sys.argv)
+
+    Returns:
+        int : exit code, 0 if all batches succeeded, 1 if some failed, 2 if
+        the run couldn't be carried out (the summary contains the error)
+    """
+    args = buildParser().parse_args(argv)
+    lines = simplace.projectLinesToList(args.lines)
+    outputs = args.outputs.split(',') if args.outputs else None
+    initArgs = {'installDir': args.install_dir, 'workDir': args.work_dir,
+                'outputDir': args.output_dir, 'projectsDir': args.projects_dir,
+                'dataDir': args.data_dir,
+                'javaParameters': args.java_option or None}
+    if args.auto_java:
+        initArgs['autoJava'] = {'slotCount': args.slot_count,
+                                'projectLines': len(lines)}
+    progress = None if args.quiet else _Progress(len(lines))
+    try:
+        report = simplace.runProjectScheduled(
+            args.solution, args.project, lines, workers=args.workers,
+            costDatabase=args.cost_db, initArgs=initArgs,
+            parameters=dict(args.param) or None, slotCount=args.slot_count,
+            outputs=outputs, resultDir=args.result_dir if outputs else None,
+            minBatchSize=args.min_batch, maxBatchSize=args.max_batch,
+            format=args.format, progress=progress)
+        error = None
+    except Exception as e:
+        report = {'batches': [], 'failed': [], 'seconds': 0.0}
+        error = '%s: %s' % (type(e).__name__, e)
+    if progress is not None:
+        progress.finish()
+    summary = summarize(report, args.solution, args.project, len(lines))
+    summary['error'] = error
+    text = json.dumps(summary, indent=1)
+    print(text)
+    if args.summary is not None:
+        with open(args.summary, 'w') as f:
+            f.write(text)
+    if error is not None:
+        return 2
+    return 1 if len(report['failed']) > 0 else 0
+
+def summarize(report, solution, project, lineCount):
+    """
+    Build the machine readable summary of a scheduled run.
+
+    Args:
+        report (dict): report returned by runProjectScheduled
+        solution (str): path to solution file
+        project (str): path to project file
+        lineCount (int): number of requested lines
+
+    Returns:
+        dict : timings, throughput, failures, files and peak memory
+        (bytes) of every worker
+    """
+    done = report['batches']
+    seconds = report['seconds']
+    finished = sum(len(b['lines']) for b in done)
+    rows = sum(b.get('rows', 0) for b in done)
+    memory = {}
+    for b in done + report['failed']:
+        if b.get('peakMemory') is not None:
+            memory[str(b['worker'])] = max(memory.get(str(b['worker']), 0),
+                                           b['peakMemory'])
+    batchSeconds = [b['seconds'] for b in done]
+    return {
+        'solution': solution, 'project': project,
+        'lines': lineCount, 'finishedLines': finished,
+        'failedLines': sum(len(b['lines']) for b in report['failed']),
+        'rows': rows, 'seconds': seconds,
+        'linesPerSecond': finished / seconds if seconds > 0 else None,
+        'rowsPerSecond': rows / seconds if seconds > 0 else None,
+        'batches': len(done),
+        'batchSeconds': {'min': min(batchSeconds, default=None),
+                         'max': max(batchSeconds, default=None),
+                         'total': sum(batchSeconds)},
+        'peakMemoryPerWorker': memory,
+        'failed': [{'batch': b['batch'], 'lines': b['lines'],
+                    'error': b['error'].strip().splitlines()[-1]}
+                   for b in report['failed']],
+        'files': [f for b in done for f in b['files']],
+    }
+
+
+# Helper Functions
+
+class _Progress:
+    """Prints finished lines, lines/s and rows/s to stderr."""
+
+    def __init__(self, total):
+        self.total = total
+        self.start = time.perf_counter()
+
+    def __call__(self, record, report):
+        done = sum(len(b['lines']) for b in report['batches'] + report['failed'])
+        rows = sum(b.get('rows', 0) for b in report['batches'])
+        seconds = max(time.perf_counter() - self.start, 1e-9)
+        sys.stderr.write('\r%d/%d lines  %.1f lines/s  %.0f rows/s  %d failed  %.0fs'
+                         % (done, self.total, done / seconds, rows / seconds,
+                            len(report['failed']), seconds))
+        sys.stderr.flush()
+
+    def finish(self):
+        sys.stderr.write('\n')
+
+def _number(text):
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+
+if __name__ == '__main__':
+    sys.exit(main())
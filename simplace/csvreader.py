@@ -0,0 +1,334 @@
+"""
+Read Simplace csv output files into one columnar table.
+
+Simplace csv outputs have a header line with the variable names, optionally
+a line with the units, and ';' separated values with dates written as
+dd.MM.yyyy. The reader maps each file into memory, finds the line breaks
+and separators with numpy, gathers the cells column by column without
+splitting lines in python and converts whole columns to typed numpy arrays
+(int, float, datetime64[D] or str). Many files are read in parallel worker
+processes and joined into a ResultTable with the file (or project line) as
+key. Converted files can be cached as .npz next to the outputs, so reading
+them again only loads the binary arrays.
+
+**Example** - *Reading the yearly outputs of a project run:*
+
+    >>> import simplace
+    >>> files = simplace.findOutputFiles(sp, '**/*_YearOut.csv')
+    >>> table = simplace.readOutputFiles(files, key=r'_(\\d+)_YearOut',
+    ...                                  keyName='projectline', cache=True)
+    >>> print(table.group('17')['Yield'][:2])
+    [ 7012.3  6844.1]
+
+"""
+
+import concurrent.futures
+import glob
+import hashlib
+import mmap
+import multiprocessing
+import os
+import re
+
+import numpy
+
+import simplace
+
+
+def readOutputFile(path, separator=';', units='auto', dtypes=None):
+    """
+    Read a single Simplace csv output file.
+
+    Args:
+        path (str): path to the csv file
+        separator (str): column separator
+        units (str or bool): whether the second line contains units; 'auto'
+            detects a units line if none of its fields is a number
+        dtypes (dict): column names as keys, numpy dtypes as values to
+            override the detected types (optional)
+
+    Returns:
+        tuple : list of names, list of units and dictionary with the column
+        names as keys and numpy arrays as values
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return [], [], {}
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        return _parse(data, separator, units, dtypes)
+    finally:
+        try:
+            data.close()
+        except BufferError:
+            # a traceback still references the numpy view of the map, the
+            # map is closed when it is released
+            pass
+
+def readOutputFiles(files, key=None, keyName='file', workers=None, cache=None,
+                    separator=';', units='auto', dtypes=None):
+    """
+    Read many Simplace csv output files in parallel into one table.
+
+    Args:
+        files (list or str): paths of the csv files or a glob pattern
+        key (str or function): regular expression applied to the file name
+            (the first group, or the whole match, is the key) or function
+            mapping the path to the key (default file name)
+        keyName (str): name of the key column
+        workers (int): maximal number of worker processes (default number
+            of cpus, 1 to read in the calling process). Small sets of files
+            are read in the calling process, as starting the workers takes
+            longer than reading them
+        cache (bool or str): cache converted files as .npz; True stores
+            them in a directory .simplace-cache next to each file, a string
+            is used as cache directory (optional)
+        separator (str): column separator
+        units (str or bool): whether the files contain a units line
+        dtypes (dict): column names as keys, numpy dtypes as values
+
+    Returns:
+        ResultTable : table with the additional key column
+    """
+    if isinstance(files, str):
+        files = sorted(glob.glob(files, recursive=True))
+    files = [os.path.abspath(f) for f in files]
+    args = [(f, separator, units, dtypes, cache) for f in files]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(files) // _FILES_PER_WORKER)
+    if workers <= 1:
+        parts = [_readCached(*a) for a in args]
+    else:
+        context = multiprocessing.get_context('spawn')
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers, mp_context=context) as pool:
+            parts = list(pool.map(_readCached, *zip(*args),
+                                  chunksize=max(1, len(args) // (4 * workers))))
+    keys = [_key(f, key) for f in files]
+    tables = []
+    for k, (names, unitRow, columns) in zip(keys, parts):
+        n = len(next(iter(columns.values()))) if len(columns) > 0 else 0
+        types = {name: _simplaceType(columns[name]) for name in names}
+        tables.append(simplace.ResultTable(columns, [k], [0, n], keyName,
+                                           types, dict(zip(names, unitRow))))
+    if len(tables) > 0:
+        reference = set(tables[0].names())
+        for f, t in zip(files, tables):
+            if set(t.names()) != reference:
+                raise ValueError('Columns of %s differ from %s' % (f, files[0]))
+    return simplace.ResultTable.concat(tables, keyName)
+
+def findOutputFiles(simplaceInstance, pattern='**/*.csv'):
+    """
+    Find csv output files in the output directory of Simplace.
+
+    Args:
+        simplaceInstance: handle to the SimplaceWrapper object returned by
+            initSimplace
+        pattern (str): glob pattern relative to the output directory
+
+    Returns:
+        list : sorted paths of the files
+    """
+    outputDir = simplace.getSimplaceDirectories(simplaceInstance)['_OUTPUTDIR_']
+    return sorted(glob.glob(os.path.join(outputDir, pattern), recursive=True))
+
+
+# Helper Functions
+
+_FILES_PER_WORKER = 16
+_GATHER_BYTES = 2 ** 20
+_WIDE_CELL = 16
+_DATE = re.compile(r'^\d{2}\.\d{2}\.\d{4}')
+_ISODATE = re.compile(r'^\d{4}-\d{2}-\d{2}')
+
+def _lines(buf):
+    if len(buf) == 0:
+        return numpy.zeros(0, dtype=numpy.intp), numpy.zeros(0, dtype=numpy.intp)
+    breaks = numpy.flatnonzero(buf == ord('\n'))
+    starts = numpy.r_[0, breaks + 1]
+    ends = numpy.r_[breaks, len(buf)]
+    ends = ends - ((ends > starts) & (buf[numpy.maximum(ends - 1, 0)] == ord('\r')))
+    filled = numpy.flatnonzero(ends > starts)
+    last = filled[-1] + 1 if len(filled) > 0 else 0
+    return starts[:last], ends[:last]
+
+def _parse(data, separator, units, dtypes):
+    buf = numpy.frombuffer(data, dtype=numpy.uint8)
+    starts, ends = _lines(buf)
+    if len(starts) == 0:
+        return [], [], {}
+    line = lambda i: data[starts[i]:ends[i]].decode('utf-8', errors='replace')
+    names = [s.strip() for s in line(0).split(separator)]
+    first = 1
+    unitRow = [''] * len(names)
+    if len(starts) > 1 and (units is True or
+                            (units == 'auto' and _isUnitsLine(line(1), separator))):
+        unitRow = [s.strip() for s in line(1).split(separator)]
+        unitRow = (unitRow + [''] * len(names))[:len(names)]
+        first = 2
+    cells = _cells(data, buf, starts[first:], ends[first:], separator,
+                   len(names))
+    if cells is None:
+        body = [line(i) for i in range(first, len(starts))]
+        matrix = numpy.array([(l.split(separator) + [''] * len(names))[:len(names)]
+                              for l in body], dtype=str).reshape(len(body), len(names))
+        cells = [matrix[:, i] for i in range(len(names))]
+    dtypes = dtypes or {}
+    columns = {}
+    for name, col in zip(names, cells):
+        col = numpy.char.strip(col)
+        if name in dtypes:
+            columns[name] = _convertAs(col, numpy.dtype(dtypes[name]))
+        else:
+            columns[name] = _convert(col)
+    return names, unitRow, columns
+
+def _cells(data, buf, starts, ends, separator, columns):
+    # One string array per column for lines with exactly the expected
+    # number of fields; None if a line differs (split in python then)
+    sep = separator.encode()
+    if len(sep) != 1 or len(starts) == 0:
+        if len(starts) > 0:
+            return None
+        return [numpy.zeros(0, dtype=str) for _ in range(columns)]
+    positions = numpy.flatnonzero(buf == sep[0])
+    lo = numpy.searchsorted(positions, starts)
+    hi = numpy.searchsorted(positions, ends)
+    if numpy.any(hi - lo != columns - 1):
+        return None
+    positions = positions[lo[0]:hi[-1]].reshape(len(starts), columns - 1)
+    firsts = numpy.column_stack([starts, positions + 1])
+    stops = numpy.column_stack([positions, ends])
+    return [_column(data, buf, firsts[:, i], stops[:, i])
+            for i in range(columns)]
+
+def _column(data, buf, first, stop):
+    # Gathers the bytes of the cells of one column into a matrix as wide as
+    # the column's widest cell, in row chunks of bounded size. A column
+    # with a few very wide cells is sliced in python instead.
+    length = stop - first
+    width = max(int(length.max()), 1)
+    if width > _WIDE_CELL * max(float(numpy.median(length)), 8.0):
+        cells = numpy.array([data[a:b] for a, b in zip(first, stop)],
+                            dtype='S%d' % width)
+    else:
+        cells = numpy.empty(len(first), dtype='S%d' % width)
+        chars = cells.view(numpy.uint8).reshape(len(first), width)
+        offsets = numpy.arange(width)
+        rows = max(_GATHER_BYTES // width, 1)
+        for r in range(0, len(first), rows):
+            f, n = first[r:r + rows], length[r:r + rows]
+            index = numpy.minimum(f[:, None] + offsets, len(buf) - 1)
+            chars[r:r + rows] = numpy.where(offsets < n[:, None], buf[index], 0)
+    try:
+        return cells.astype(str)
+    except UnicodeDecodeError:
+        return numpy.char.decode(cells, 'utf-8', errors='replace')
+
+def _isUnitsLine(line, separator):
+    for s in line.split(separator):
+        s = s.strip()
+        if s == '':
+            continue
+        try:
+            float(s)
+            return False
+        except ValueError:
+            if _DATE.match(s) or _ISODATE.match(s):
+                return False
+    return True
+
+def _convert(col):
+    if len(col) == 0:
+        return col.astype(float)
+    present = col[col != '']
+    if len(present) == 0:
+        return numpy.full(len(col), numpy.nan)
+    if len(present) == len(col):
+        try:
+            return col.astype(numpy.int64)
+        except ValueError:
+            pass
+    try:
+        return numpy.where(col == '', 'nan', col).astype(float)
+    except ValueError:
+        pass
+    sample = present[0]
+    if _DATE.match(sample) or _ISODATE.match(sample):
+        try:
+            return _toDates(col)
+        except ValueError:
+            pass
+    return col
+
+def _convertAs(col, dtype):
+    if dtype.kind == 'M':
+        return _toDates(col)
+    elif dtype.kind == 'f':
+        return numpy.where(col == '', 'nan', col).astype(dtype)
+    return col.astype(dtype)
+
+def _toDates(col):
+    b = col.astype('S10')
+    chars = b.view('S1').reshape(len(b), 10)
+    empty = col == ''
+    dotted = chars[:, 2] == b'.'
+    iso = chars.copy()
+    iso[dotted] = chars[dotted][:, [6, 7, 8, 9, 5, 3, 4, 2, 0, 1]]
+    iso[:, 4] = b'-'
+    iso[:, 7] = b'-'
+    iso[empty] = numpy.frombuffer(b'NaT'.ljust(10, b' '), dtype='S1')
+    text = numpy.char.strip(iso.view('S10').ravel().astype(str))
+    return text.astype('datetime64[D]')
+
+def _simplaceType(col):
+    kind = col.dtype.kind
+    if kind == 'M':
+        return 'DATE'
+    elif kind in 'iu':
+        return 'INT'
+    elif kind == 'b':
+        return 'BOOLEAN'
+    elif kind == 'f':
+        return 'DOUBLE'
+    return 'CHAR'
+
+def _key(path, key):
+    name = os.path.basename(path)
+    if key is None:
+        return name
+    elif callable(key):
+        return key(path)
+    m = re.search(key, name)
+    if m is None:
+        return name
+    return m.group(1) if m.groups() else m.group(0)
+
+def _cachePath(path, cache):
+    st = os.stat(path)
+    h = hashlib.sha1(('%s|%d|%d' % (path, st.st_size, st.st_mtime_ns))
+                     .encode()).hexdigest()[:16]
+    directory = cache if isinstance(cache, str) else \
+        os.path.join(os.path.dirname(path), '.simplace-cache')
+    return os.path.join(directory, '%s.%s.npz' % (os.path.basename(path), h))
+
+def _readCached(path, separator, units, dtypes, cache):
+    if not cache:
+        return readOutputFile(path, separator, units, dtypes)
+    cachePath = _cachePath(path, cache)
+    if os.path.exists(cachePath):
+        with numpy.load(cachePath) as data:
+            names = [str(s) for s in data['__names__']]
+            unitRow = [str(s) for s in data['__units__']]
+            return names, unitRow, {n: data['c%d' % i]
+                                    for i, n in enumerate(names)}
+    names, unitRow, columns = readOutputFile(path, separator, units, dtypes)
+    os.makedirs(os.path.dirname(cachePath), exist_ok=True)
+    tmp = cachePath + '.%d.tmp.npz' % os.getpid()
+    numpy.savez(tmp, __names__=numpy.array(names, dtype=str),
+                __units__=numpy.array(unitRow, dtype=str),
+                **{'c%d' % i: columns[n] for i, n in enumerate(names)})
+    os.replace(tmp, cachePath)
+    return names, unitRow, columns
@@ -0,0 +1,585 @@
+"""
+Distribute Simplace work units over several processes and nodes.
+
+A coordinator splits the work into units - chunks of project lines or
+batches of simulation parameters - and submits them to a broker. Workers on
+any node pull units from the broker, run them in their own java virtual
+machine, send heartbeats while running and publish the converted memory
+outputs. The coordinator retries failed or abandoned units, merges the
+outputs and reports the throughput of the whole cluster.
+
+The broker is pluggable. SQLiteBroker keeps the queue in a SQLite file, which
+works for several processes on one machine and on filesystems with working
+file locks. Payloads are stored as json and results as npz data without
+pickled objects, so a queue file can't be used to run code on the nodes.
+Units belong to a job, a coordinator created again with the same job id
+collects the units submitted before.
+
+**Example** - *Coordinator and workers:*
+
+    >>> import simplace
+    >>> broker = simplace.SQLiteBroker('/shared/queue.sqlite')
+    >>> co = simplace.Coordinator(broker, job='NRW')
+    >>> co.submitLines('/sol/Maize.sol.xml', '/proj/NRW.proj.xml', '1-4000',
+    ...                chunkSize=100, outputs=['YearOut'])
+    >>> # on every node: python -m simplace.distributed /shared/queue.sqlite
+    >>> co.wait()
+    >>> result = co.collect('YearOut')
+    >>> print(co.report()['rowsPerSecond'])
+    1520.3
+
+"""
+
+import abc
+import io
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+
+import numpy
+
+import simplace
+
+
+class Broker(abc.ABC):
+    """Interface of a task queue for work units.
+
+    Tasks have the states 'pending', 'running', 'done' and 'failed'.
+    Payloads are dictionaries of json values and numpy arrays, results are
+    dictionaries of output names and columns (dictionaries of numpy
+    arrays), see encodePayload and encodeResult.
+    """
+
+    @abc.abstractmethod
+    def submit(self, kind, payload, job=None):
+        """Add a task of a job and return its id."""
+
+    @abc.abstractmethod
+    def jobTasks(self, job):
+        """Get the ids of the tasks of a job."""
+
+    @abc.abstractmethod
+    def claim(self, worker):
+        """Take the oldest pending task. Returns (id, kind, payload) or None."""
+
+    @abc.abstractmethod
+    def heartbeat(self, taskId, worker):
+        """Signal that the worker is still running the task."""
+
+    @abc.abstractmethod
+    def complete(self, taskId, worker, result, rows, seconds):
+        """Store the result of a finished task."""
+
+    @abc.abstractmethod
+    def fail(self, taskId, worker, error, seconds):
+        """Mark a task as failed."""
+
+    @abc.abstractmethod
+    def requeue(self, leaseSeconds, maxAttempts, job=None):
+        """
+        Put failed tasks and running tasks without recent heartbeat back to
+        pending, unless they reached maxAttempts. Only tasks of the job are
+        considered if a job is given. Returns number of tasks.
+        """
+
+    @abc.abstractmethod
+    def counts(self, job=None):
+        """Get the number of tasks (of the job) per state as dictionary."""
+
+    @abc.abstractmethod
+    def tasks(self):
+        """Get a list of dictionaries describing every task (without result)."""
+
+    @abc.abstractmethod
+    def result(self, taskId):
+        """Get the result of a finished task."""
+
+
+class SQLiteBroker(Broker):
+    """Task queue stored in a SQLite database file.
+
+    Args:
+        path (str): database file, shared by coordinator and workers
+        timeout (float): seconds to wait for a database lock
+    """
+
+    def __init__(self, path, timeout=60.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        db = self._db()
+        db.execute('CREATE TABLE IF NOT EXISTS task ('
+                   'id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT, '
+                   'payload BLOB, status TEXT, attempts INTEGER, '
+                   'worker TEXT, heartbeat REAL, submitted REAL, '
+                   'started REAL, finished REAL, seconds REAL, rows INTEGER, '
+                   'error TEXT, result BLOB)')
+        columns = [row[1] for row in db.execute('PRAGMA table_info(task)')]
+        if 'job' not in columns:
+            db.execute('ALTER TABLE task ADD COLUMN job TEXT')
+        db.execute('CREATE INDEX IF NOT EXISTS task_status ON task (status, id)')
+        db.execute('CREATE INDEX IF NOT EXISTS task_job ON task (job, id)')
+        db.commit()
+
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=self.timeout,
+                                 isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            self._local.db = db
+        return db
+
+    def submit(self, kind, payload, job=None):
+        cur = self._db().execute(
+            'INSERT INTO task (kind, payload, status, attempts, submitted, '
+            'job) VALUES (?, ?, ?, 0, ?, ?)',
+            (kind, encodePayload(payload), 'pending', time.time(), job))
+        return cur.lastrowid
+
+    def jobTasks(self, job):
+        rows = self._db().execute('SELECT id FROM task WHERE job=? '
+                                  'ORDER BY id', (job,)).fetchall()
+        return [row[0] for row in rows]
+
+    def claim(self, worker):
+        db = self._db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            row = db.execute('SELECT id, kind, payload FROM task WHERE '
+                             'status=? ORDER BY id LIMIT 1',
+                             ('pending',)).fetchone()
+            if row is not None:
+                now = time.time()
+                db.execute('UPDATE task SET status=?, worker=?, started=?, '
+                           'heartbeat=?, attempts=attempts+1 WHERE id=?',
+                           ('running', worker, now, now, row[0]))
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        if row is None:
+            return None
+        return row[0], row[1], decodePayload(row[2])
+
+    def heartbeat(self, taskId, worker):
+        self._db().execute('UPDATE task SET heartbeat=? WHERE id=? AND '
+                           'worker=? AND status=?',
+                           (time.time(), taskId, worker, 'running'))
+
+    def complete(self, taskId, worker, result, rows, seconds):
+        self._db().execute(
+            'UPDATE task SET status=?, finished=?, seconds=?, rows=?, '
+            'result=?, error=NULL WHERE id=? AND worker=?',
+            ('done', time.time(), seconds, rows, encodeResult(result),
+             taskId, worker))
+
+    def fail(self, taskId, worker, error, seconds):
+        self._db().execute(
+            'UPDATE task SET status=?, finished=?, seconds=?, error=? '
+            'WHERE id=? AND worker=?',
+            ('failed', time.time(), seconds, error, taskId, worker))
+
+    def requeue(self, leaseSeconds, maxAttempts, job=None):
+        db = self._db()
+        limit = time.time() - leaseSeconds
+        scope, args = _jobScope(job)
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute('UPDATE task SET status=?, error=? WHERE status=? '
+                       'AND heartbeat<?' + scope,
+                       ('failed', 'heartbeat lost', 'running', limit) + args)
+            n = db.execute('UPDATE task SET status=?, worker=NULL '
+                           'WHERE status=? AND attempts<?' + scope,
+                           ('pending', 'failed', maxAttempts) + args).rowcount
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        return n
+
+    def counts(self, job=None):
+        scope, args = _jobScope(job)
+        rows = self._db().execute('SELECT status, COUNT(*) FROM task '
+                                  'WHERE 1=1' + scope + ' GROUP BY status',
+                                  args).fetchall()
+        counts = {'pending': 0, 'running': 0, 'done': 0, 'failed': 0}
+        counts.update(dict(rows))
+        return counts
+
+    def tasks(self):
+        cur = self._db().execute('SELECT id, kind, job, status, attempts, '
+                                 'worker, submitted, started, finished, '
+                                 'seconds, rows, error FROM task ORDER BY id')
+        names = [d[0] for d in cur.description]
+        return [dict(zip(names, row)) for row in cur.fetchall()]
+
+    def result(self, taskId):
+        row = self._db().execute('SELECT result FROM task WHERE id=?',
+                                 (taskId,)).fetchone()
+        return None if row is None or row[0] is None else decodeResult(row[0])
+
+
+class Coordinator:
+    """Submits work units, supervises them and merges their results.
+
+    Args:
+        broker (Broker): task queue shared with the workers
+        leaseSeconds (float): a running unit without heartbeat for that
+            long is considered abandoned
+        maxAttempts (int): how often a unit is tried before it is given up
+        job (str): id of the job the units belong to. Pass the id of an
+            earlier coordinator to wait for and collect its units (default
+            a new unique id)
+    """
+
+    def __init__(self, broker, leaseSeconds=120.0, maxAttempts=3, job=None):
+        self.broker = broker
+        self.leaseSeconds = leaseSeconds
+        self.maxAttempts = maxAttempts
+        self.job = job if job is not None else uuid.uuid4().hex
+
+    def submitLines(self, solution, project, lines, chunkSize=100,
+                    parameters=None, outputs=None):
+        """
+        Submit project lines as chunks.
+
+        Args:
+            solution (str): path to solution file (as seen by the workers)
+            project (str): path to project file (as seen by the workers)
+            lines (str): line specification, e.g. "1-400,500" or list
+            chunkSize (int): number of lines per unit
+            parameters (dict): parameters passed to openProject (optional)
+            outputs (list): names of memory outputs to collect (optional)
+
+        Returns:
+            list : ids of the submitted units
+        """
+        lines = simplace.projectLinesToList(lines)
+        return [self.broker.submit('lines', {
+                    'solution': solution, 'project': project,
+                    'lines': simplace.projectLinesToString(lines[i:i + chunkSize]),
+                    'parameters': parameters, 'outputs': outputs or []},
+                    self.job)
+                for i in range(0, len(lines), chunkSize)]
+
+    def submitSimulations(self, solution, parameterlist, batchSize=50,
+                          outputs=None, project=None, parameters=None):
+        """
+        Submit simulations with different parameters as batches.
+
+        Args:
+            solution (str): path to solution file (as seen by the workers)
+            parameterlist (list): list of parameter dictionaries, one for
+                every simulation
+            batchSize (int): number of simulations per unit
+            outputs (list): names of memory outputs to collect
+            project (str): path to project file (optional)
+            parameters (dict): parameters passed to openProject (optional)
+
+        Returns:
+            list : ids of the submitted units
+        """
+        return [self.broker.submit('simulations', {
+                    'solution': solution, 'project': project,
+                    'parameters': parameters, 'outputs': outputs or [],
+                    'offset': i,
+                    'parameterlist': parameterlist[i:i + batchSize]},
+                    self.job)
+                for i in range(0, len(parameterlist), batchSize)]
+
+    def wait(self, pollInterval=2.0, timeout=None, verbose=True):
+        """
+        Wait until all units are finished or finally failed.
+
+        Retries failed and abandoned units while waiting.
+
+        Args:
+            pollInterval (float): seconds between checks
+            timeout (float): maximal seconds to wait (optional)
+            verbose (bool): print progress and throughput
+
+        Returns:
+            dict : number of units per state
+        """
+        started = time.time()
+        while True:
+            self.broker.requeue(self.leaseSeconds, self.maxAttempts, self.job)
+            counts = self.broker.counts(self.job)
+            if verbose:
+                r = self.report()
+                print('pending %d, running %d, done %d, failed %d - '
+                      '%.1f units/s, %.1f rows/s'
+                      % (counts['pending'], counts['running'], counts['done'],
+                         counts['failed'], r['unitsPerSecond'],
+                         r['rowsPerSecond']))
+            if counts['pending'] == 0 and counts['running'] == 0:
+                return counts
+            if timeout is not None and time.time() - started > timeout:
+                return counts
+            time.sleep(pollInterval)
+
+    def collect(self, output):
+        """
+        Merge one memory output of all finished units.
+
+        Units are merged in submission order. Outputs of simulation batches
+        get an additional column 'simulationindex' with the position of the
+        simulation in the submitted parameter list.
+
+        Args:
+            output (str): name of the memory output
+
+        Returns:
+            dict : column names as keys, concatenated numpy arrays as values
+        """
+        ids = self._idSet()
+        parts = []
+        for task in self.broker.tasks():
+            if task['status'] == 'done' and task['id'] in ids:
+                result = self.broker.result(task['id'])
+                if output in result and len(result[output]) > 0:
+                    parts.append(result[output])
+        if len(parts) == 0:
+            return {}
+        return {name: numpy.concatenate([p[name] for p in parts])
+                for name in parts[0]}
+
+    def report(self):
+        """
+        Get throughput and state of the submitted units.
+
+        Returns:
+            dict : with keys 'units', 'done', 'failed', 'seconds',
+            'unitsPerSecond', 'rowsPerSecond' and 'workers' (units and busy
+            seconds per worker)
+        """
+        ids = self._idSet()
+        tasks = [t for t in self.broker.tasks() if t['id'] in ids]
+        done = [t for t in tasks if t['status'] == 'done']
+        failed = [t for t in tasks if t['status'] == 'failed'
+                  and t['attempts'] >= self.maxAttempts]
+        start = min([t['submitted'] for t in tasks], default=None)
+        seconds = time.time() - start if start is not None else 0.0
+        workers = {}
+        for t in done:
+            w = workers.setdefault(t['worker'], {'units': 0, 'seconds': 0.0})
+            w['units'] += 1
+            w['seconds'] += t['seconds'] or 0.0
+        rows = sum(t['rows'] or 0 for t in done)
+        return {'units': len(tasks), 'done': len(done), 'failed': len(failed),
+                'seconds': seconds,
+                'unitsPerSecond': len(done) / seconds if seconds > 0 else 0.0,
+                'rowsPerSecond': rows / seconds if seconds > 0 else 0.0,
+                'workers': workers}
+
+    def _idSet(self):
+        return set(self.broker.jobTasks(self.job))
+
+
+def runWorker(broker, initArgs=None, workerId=None, idleTimeout=None,
+              pollInterval=1.0, heartbeatInterval=10.0, slotCount=None):
+    """
+    Pull and run work units until the queue stays empty.
+
+    The java virtual machine is started when the first unit arrives.
+
+    Args:
+        broker (Broker): task queue shared with the coordinator
+        initArgs (dict): keyword arguments passed to initSimplace
+        workerId (str): name of the worker (default host:pid)
+        idleTimeout (float): stop after that many seconds without work
+            (default: run forever)
+        pollInterval (float): seconds between polls of an empty queue
+        heartbeatInterval (float): seconds between heartbeats
+        slotCount (int): number of cores used for project runs (optional)
+
+    Returns:
+        int : number of units processed
+    """
+    if workerId is None:
+        workerId = '%s:%d' % (socket.gethostname(), os.getpid())
+    sh = None
+    processed = 0
+    idleSince = time.time()
+    while True:
+        task = broker.claim(workerId)
+        if task is None:
+            if idleTimeout is not None and time.time() - idleSince > idleTimeout:
+                return processed
+            time.sleep(pollInterval)
+            continue
+        if sh is None:
+            sh = simplace.initSimplace(**(initArgs or {}))
+            if slotCount is not None:
+                simplace.setSlotCount(slotCount)
+        taskId, kind, payload = task
+        stop = threading.Event()
+        beat = threading.Thread(target=_heartbeat, daemon=True,
+                                args=(broker, taskId, workerId, stop,
+                                      heartbeatInterval))
+        beat.start()
+        start = time.perf_counter()
+        try:
+            result = _runUnit(sh, kind, payload)
+            rows = sum(_rowCount(columns) for columns in result.values())
+            broker.complete(taskId, workerId, result, rows,
+                            time.perf_counter() - start)
+        except Exception:
+            broker.fail(taskId, workerId, traceback.format_exc(),
+                        time.perf_counter() - start)
+        finally:
+            stop.set()
+            beat.join()
+        processed += 1
+        idleSince = time.time()
+
+
+def encodePayload(payload):
+    """
+    Encode a task payload as json.
+
+    Args:
+        payload: json values, numpy arrays and numpy scalars
+
+    Returns:
+        str : json text
+    """
+    return json.dumps(payload, default=_jsonDefault)
+
+def decodePayload(text):
+    """Decode a payload encoded by encodePayload."""
+    return json.loads(text, object_hook=_jsonObject)
+
+def encodeResult(result):
+    """
+    Encode the result of a task as npz data.
+
+    Args:
+        result (dict): output names as keys, dictionaries of column names
+            and numpy arrays (not of dtype object) as values
+
+    Returns:
+        bytes : npz data
+    """
+    layout = []
+    arrays = {}
+    for output, columns in result.items():
+        names = []
+        for name, values in columns.items():
+            values = numpy.asarray(values)
+            if values.dtype.kind == 'O':
+                raise ValueError('Column %s of %s has no numeric, boolean, '
+                                 'date or string type' % (name, output))
+            arrays['a%d' % len(arrays)] = values
+            names.append(name)
+        layout.append([output, names])
+    buffer = io.BytesIO()
+    numpy.savez(buffer, __layout__=numpy.array(json.dumps(layout)), **arrays)
+    return buffer.getvalue()
+
+def decodeResult(data):
+    """Decode a result encoded by encodeResult."""
+    with numpy.load(io.BytesIO(data), allow_pickle=False) as npz:
+        layout = json.loads(str(npz['__layout__']))
+        result = {}
+        i = 0
+        for output, names in layout:
+            result[output] = {}
+            for name in names:
+                result[output][name] = npz['a%d' % i]
+                i += 1
+    return result
+
+
+# Helper Functions
+
+def _jsonDefault(obj):
+    if isinstance(obj, numpy.ndarray):
+        if obj.dtype.kind not in 'biufU':
+            raise TypeError('Arrays of type %s are not supported' % obj.dtype)
+        return {'__ndarray__': obj.tolist(), 'dtype': obj.dtype.str}
+    elif isinstance(obj, numpy.generic):
+        return obj.item()
+    raise TypeError('Object of type %s is not supported in payloads'
+                    % type(obj).__name__)
+
+def _jsonObject(obj):
+    if '__ndarray__' in obj:
+        return numpy.array(obj['__ndarray__'], dtype=obj['dtype'])
+    return obj
+
+def _jobScope(job):
+    if job is None:
+        return '', ()
+    return ' AND job=?', (job,)
+
+def _heartbeat(broker, taskId, workerId, stop, interval):
+    while not stop.wait(interval):
+        broker.heartbeat(taskId, workerId)
+
+def _toColumns(data):
+    return {k: numpy.asarray(v) for k, v in data.items()}
+
+def _rowCount(columns):
+    return len(next(iter(columns.values()))) if len(columns) > 0 else 0
+
+def _runUnit(sh, kind, payload):
+    if kind == 'lines':
+        data = simplace.runProjectLines(sh, payload['solution'],
+                                        payload['project'], payload['lines'],
+                                        payload['parameters'],
+                                        payload['outputs'])
+        return {output: _toColumns(d) for output, d in data.items()}
+    elif kind == 'simulations':
+        simplace.openProject(sh, payload['solution'], payload['project'],
+                             payload['parameters'])
+        try:
+            ids = [simplace.createSimulation(sh, par)
+                   for par in payload['parameterlist']]
+            simplace.runSimulations(sh)
+            result = {}
+            for output in payload['outputs']:
+                parts = []
+                for i, simid in enumerate(ids):
+                    columns = _toColumns(simplace.resultToList(
+                        simplace.getResult(sh, output, simid)))
+                    columns['simulationindex'] = numpy.full(
+                        _rowCount(columns), payload['offset'] + i)
+                    parts.append(columns)
+                result[output] = {name: numpy.concatenate([p[name] for p in parts])
+                                  for name in parts[0]}
+            return result
+        finally:
+            simplace.closeProject(sh)
+    else:
+        raise ValueError('Unknown kind of work unit: %s' % kind)
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Run Simplace work units from a SQLite broker.')
+    parser.add_argument('broker', help='path to the SQLite queue')
+    parser.add_argument('--install-dir', default=None)
+    parser.add_argument('--work-dir', default=None)
+    parser.add_argument('--output-dir', default=None)
+    parser.add_argument('--slots', type=int, default=None)
+    parser.add_argument('--idle-timeout', type=float, default=None)
+    parser.add_argument('--java', action='append', default=[],
+                        help='java parameter, can be given several times')
+    args = parser.parse_args(argv)
+    initArgs = {'installDir': args.install_dir, 'workDir': args.work_dir,
+                'outputDir': args.output_dir, 'javaParameters': args.java}
+    n = runWorker(SQLiteBroker(args.broker), initArgs,
+                  idleTimeout=args.idle_timeout, slotCount=args.slots)
+    print('processed %d work units' % n)
+
+
+if __name__ == '__main__':
+    main()
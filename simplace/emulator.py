@@ -0,0 +1,297 @@
+"""
+Fast surrogate models of scalar simulation outputs.
+
+An Emulator samples the parameter space with a latin hypercube, runs the
+samples through createSimulation and runSimulations and fits a gaussian
+process (pure numpy) to scalar outputs, e.g. the final yield. Afterwards a
+query costs one kernel evaluation against the training points instead of a
+simulation. Every prediction comes with a standard deviation. Queries
+outside the trained parameter bounds or with a standard deviation above a
+threshold are answered by a real simulation, which can be added to the
+training data.
+
+**Example** - *Emulating the final yield:*
+
+    >>> import simplace
+    >>> simplace.openProject(sp, '/sol/Maize.sol.xml')
+    >>> em = simplace.Emulator(sp, {'vLUE':(2.5,3.5), 'vSowingDay':(90,140)},
+    ...                        {'Yield':('YearOut', 'Yield')})
+    >>> em.fit(200)
+    >>> print(em.query({'vLUE':3.1, 'vSowingDay':110}, maxStd={'Yield':50}))
+    {'Yield': 7023.4, 'Yield_std': 12.9, 'source': 'emulator'}
+
+"""
+
+import numpy
+
+import simplace
+
+_REDUCERS = {'last': lambda v: v[-1], 'first': lambda v: v[0],
+             'sum': numpy.sum, 'mean': numpy.mean, 'max': numpy.max,
+             'min': numpy.min}
+
+
+class GaussianProcess:
+    """Gaussian process regression with squared exponential kernel.
+
+    The length scale and noise are selected from a grid by the log marginal
+    likelihood. Inputs should be scaled to the unit cube.
+
+    Args:
+        lengthScales (list): candidate length scales
+        noises (list): candidate noise variances (relative to the
+            normalised output)
+    """
+
+    def __init__(self, lengthScales=None, noises=None):
+        self.lengthScales = lengthScales if lengthScales is not None \
+            else numpy.logspace(-1.3, 0.5, 12)
+        self.noises = noises if noises is not None else [1e-8, 1e-4, 1e-2]
+        self.lengthScale = None
+        self.noise = None
+
+    def fit(self, X, y):
+        """
+        Fit the process to training data.
+
+        Args:
+            X (numpy.ndarray): inputs (n x d)
+            y (numpy.ndarray): outputs (n)
+        """
+        self.X = numpy.atleast_2d(numpy.asarray(X, dtype=float))
+        y = numpy.asarray(y, dtype=float).ravel()
+        self._mean = y.mean()
+        self._scale = y.std() if y.std() > 0 else 1.0
+        z = (y - self._mean) / self._scale
+        distances = _squaredDistances(self.X, self.X)
+        best = None
+        for ls in self.lengthScales:
+            for noise in self.noises:
+                K = numpy.exp(-0.5 * distances / ls ** 2)
+                K[numpy.diag_indices_from(K)] += noise
+                try:
+                    L = numpy.linalg.cholesky(K)
+                except numpy.linalg.LinAlgError:
+                    continue
+                a = numpy.linalg.solve(L.T, numpy.linalg.solve(L, z))
+                likelihood = -0.5 * z @ a - numpy.log(numpy.diag(L)).sum()
+                if best is None or likelihood > best[0]:
+                    best = (likelihood, ls, noise, L, a)
+        if best is None:
+            raise ValueError('Gaussian process could not be fitted')
+        _, self.lengthScale, self.noise, L, self._alpha = best
+        inverseL = numpy.linalg.inv(L)
+        self._inverse = inverseL.T @ inverseL
+        return self
+
+    def predict(self, X):
+        """
+        Predict outputs.
+
+        Args:
+            X (numpy.ndarray): inputs (m x d)
+
+        Returns:
+            tuple : predicted means and standard deviations (m)
+        """
+        X = numpy.atleast_2d(numpy.asarray(X, dtype=float))
+        k = numpy.exp(-0.5 * _squaredDistances(X, self.X) / self.lengthScale ** 2)
+        mean = k @ self._alpha
+        variance = 1.0 - numpy.einsum('ij,jk,ik->i', k, self._inverse, k)
+        std = numpy.sqrt(numpy.maximum(variance, 0.0))
+        return mean * self._scale + self._mean, std * self._scale
+
+    def leaveOneOutErrors(self):
+        """Get the leave-one-out residuals of the training points."""
+        return self._alpha / numpy.diag(self._inverse) * self._scale
+
+
+class Emulator:
+    """Surrogate of scalar outputs of the currently opened project.
+
+    Args:
+        simplaceInstance: handle to the SimplaceWrapper object returned by
+            initSimplace (solution must be opened)
+        bounds (dict): parameter names as keys, (low, high) as values
+        targets (dict): names as keys, (output, variable) or (output,
+            variable, reducer) as values. The reducer ('last', 'first',
+            'sum', 'mean', 'max' or 'min', default 'last') turns the output
+            column of a simulation into a scalar
+        fixed (dict): parameters passed unchanged to every simulation
+    """
+
+    def __init__(self, simplaceInstance, bounds, targets, fixed=None):
+        self._sh = simplaceInstance
+        self.names = list(bounds)
+        self.low = numpy.array([bounds[n][0] for n in self.names], dtype=float)
+        self.high = numpy.array([bounds[n][1] for n in self.names], dtype=float)
+        self.targets = {k: tuple(v) + ('last',) * (3 - len(v))
+                        for k, v in targets.items()}
+        self.fixed = fixed or {}
+        self.X = numpy.zeros((0, len(self.names)))
+        self.Y = {k: numpy.zeros(0) for k in self.targets}
+        self.models = {}
+
+    def fit(self, samples=100, seed=None, batchSize=100):
+        """
+        Run a latin hypercube sample and fit the surrogates.
+
+        Args:
+            samples (int): number of simulations
+            seed (int): seed of the random generator
+            batchSize (int): number of simulations queued at once
+
+        Returns:
+            dict : leave-one-out root mean squared error of every target
+        """
+        rng = numpy.random.default_rng(seed)
+        unit = latinHypercube(samples, len(self.names), rng)
+        X = self.low + unit * (self.high - self.low)
+        for i in range(0, samples, batchSize):
+            self.add(X[i:i + batchSize], self.simulate(X[i:i + batchSize]))
+        return self.refit()
+
+    def add(self, X, values):
+        """
+        Add simulated points to the training data (without refitting).
+
+        Args:
+            X (numpy.ndarray): parameter values (n x d)
+            values (dict): target names as keys, arrays (n) as values
+        """
+        self.X = numpy.vstack([self.X, numpy.atleast_2d(X)])
+        for k in self.targets:
+            self.Y[k] = numpy.r_[self.Y[k], values[k]]
+
+    def refit(self):
+        """
+        Fit the surrogates to the current training data.
+
+        Returns:
+            dict : leave-one-out root mean squared error of every target
+        """
+        unit = self._toUnit(self.X)
+        errors = {}
+        for k in self.targets:
+            self.models[k] = GaussianProcess().fit(unit, self.Y[k])
+            errors[k] = float(numpy.sqrt(numpy.mean(
+                self.models[k].leaveOneOutErrors() ** 2)))
+        self.errors = errors
+        return errors
+
+    def predict(self, parameters):
+        """
+        Predict the targets with the surrogates.
+
+        Args:
+            parameters (dict or numpy.ndarray): parameter values (dict of
+                scalars or arrays, or array n x d in the order of bounds)
+
+        Returns:
+            dict : target means and standard deviations (target_std) as
+            arrays
+        """
+        unit = self._toUnit(self._toArray(parameters))
+        out = {}
+        for k, model in self.models.items():
+            out[k], out[k + '_std'] = model.predict(unit)
+        return out
+
+    def query(self, parameters, maxStd=None, learn=False):
+        """
+        Answer a query by the surrogate or, if needed, by a simulation.
+
+        A simulation is run if the parameters are outside the bounds or
+        the standard deviation of a target exceeds maxStd.
+
+        Args:
+            parameters (dict): parameter names as keys, scalars as values
+            maxStd (dict): target names as keys, maximal standard deviation
+                as values (optional)
+            learn (bool): add simulated points to the training data and
+                refit
+
+        Returns:
+            dict : target values, their standard deviations (0 for
+            simulations) and 'source' ('emulator' or 'simulation')
+        """
+        x = self._toArray(parameters)
+        inside = numpy.all((x >= self.low) & (x <= self.high))
+        if inside and len(self.models) > 0:
+            pred = self.predict(x)
+            if all(pred[k + '_std'][0] <= s for k, s in (maxStd or {}).items()):
+                out = {k: float(v[0]) for k, v in pred.items()}
+                out['source'] = 'emulator'
+                return out
+        values = self.simulate(x)
+        if learn:
+            self.add(x, values)
+            self.refit()
+        out = {}
+        for k in self.targets:
+            out[k] = float(values[k][0])
+            out[k + '_std'] = 0.0
+        out['source'] = 'simulation'
+        return out
+
+    def simulate(self, X):
+        """
+        Run simulations and reduce their outputs to the targets.
+
+        Args:
+            X (numpy.ndarray): parameter values (n x d)
+
+        Returns:
+            dict : target names as keys, arrays (n) as values
+        """
+        ids = []
+        for row in numpy.atleast_2d(X):
+            parameters = dict(self.fixed)
+            parameters.update(zip(self.names, [float(v) for v in row]))
+            ids.append(simplace.createSimulation(self._sh, parameters))
+        simplace.runSimulations(self._sh)
+        values = {k: numpy.empty(len(ids)) for k in self.targets}
+        for i, simid in enumerate(ids):
+            results = {}
+            for k, (output, variable, reducer) in self.targets.items():
+                if output not in results:
+                    results[output] = simplace.resultToList(
+                        simplace.getResult(self._sh, output, simid))
+                values[k][i] = _REDUCERS[reducer](
+                    numpy.asarray(results[output][variable], dtype=float))
+        return values
+
+    def _toArray(self, parameters):
+        if isinstance(parameters, dict):
+            columns = [numpy.atleast_1d(numpy.asarray(parameters[n], dtype=float))
+                       for n in self.names]
+            return numpy.stack(columns, axis=1)
+        return numpy.atleast_2d(numpy.asarray(parameters, dtype=float))
+
+    def _toUnit(self, X):
+        return (X - self.low) / (self.high - self.low)
+
+
+def latinHypercube(n, d, seed=None):
+    """
+    Draw a latin hypercube sample in the unit cube.
+
+    Args:
+        n (int): number of points
+        d (int): number of dimensions
+        seed (int or numpy.random.Generator): random generator or seed
+
+    Returns:
+        numpy.ndarray : points (n x d)
+    """
+    rng = numpy.random.default_rng(seed)
+    strata = numpy.stack([rng.permutation(n) for _ in range(d)], axis=1)
+    return (strata + rng.random((n, d))) / n
+
+
+# Helper Functions
+
+def _squaredDistances(A, B):
+    d = (A * A).sum(axis=1)[:, None] + (B * B).sum(axis=1)[None, :] \
+        - 2 * A @ B.T
+    return numpy.maximum(d, 0.0)
@@ -0,0 +1,272 @@
+"""
+Run Simplace on raster cells and write the outputs as raster stacks.
+
+Each cell of a raster corresponds to one project line. The cells are run in
+chunks of project lines, and the yearly memory outputs are scattered directly
+into preallocated numpy arrays with the dimensions year x row x col, one for
+every variable. The arrays can be backed by .npy files, so that grids larger
+than the memory are written chunk by chunk.
+
+**Example** - *Running a masked grid:*
+
+    >>> import numpy, simplace
+    >>> sp = simplace.initSimplace('/ws/','/runs/simulation/','/out/')
+    >>> mask = numpy.load('/data/cropland.npy')
+    >>> grid = simplace.GridRunner(mask)
+    >>> result = grid.run(sp, '/sol/Maize.sol.xml', '/proj/Grid.proj.xml',
+    ...                   'YearOut', ['Yield'], range(1990, 2021),
+    ...                   lineColumn='projectline', outputDir='/out/maps')
+    >>> print(result['Yield'].shape)
+    (31, 720, 1440)
+
+"""
+
+import os
+import shutil
+import tempfile
+
+import numpy
+
+import simplace
+
+
+class GridResult:
+    """Raster stacks (year x row x col) for each variable.
+
+    Args:
+        variables (dict): variable names as keys, arrays as values
+        years (list): years of the first axis
+        mask (numpy.ndarray): boolean mask of the simulated cells
+    """
+
+    def __init__(self, variables, years, mask):
+        self.variables = variables
+        self.years = list(years)
+        self.mask = mask
+
+    def __getitem__(self, name):
+        return self.variables[name]
+
+    def keys(self):
+        """Get the variable names."""
+        return list(self.variables.keys())
+
+    def save(self, directory):
+        """
+        Save every variable as .npy file (name.npy) in the directory.
+
+        Args:
+            directory (str): target directory
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name, arr in self.variables.items():
+            path = os.path.join(directory, name + '.npy')
+            if isinstance(arr, numpy.memmap) and \
+                    os.path.abspath(arr.filename) == os.path.abspath(path):
+                arr.flush()
+            else:
+                numpy.save(path, arr)
+
+    def toNetCDF(self, path, fillValue=numpy.nan):
+        """
+        Write all variables to a NetCDF file, chunked by year.
+
+        Requires the optional package netCDF4.
+
+        Args:
+            path (str): NetCDF file
+            fillValue (float): value of missing cells
+        """
+        try:
+            import netCDF4
+        except ImportError:
+            raise ImportError('Writing NetCDF files requires the package netCDF4')
+        nyears = len(self.years)
+        nrows, ncols = self.mask.shape
+        with netCDF4.Dataset(path, 'w') as ds:
+            ds.createDimension('year', nyears)
+            ds.createDimension('row', nrows)
+            ds.createDimension('col', ncols)
+            ds.createVariable('year', 'i4', ('year',))[:] = self.years
+            for name, arr in self.variables.items():
+                var = ds.createVariable(name.replace('/', '_'), arr.dtype,
+                                        ('year', 'row', 'col'),
+                                        zlib=True, chunksizes=(1, nrows, ncols),
+                                        fill_value=fillValue)
+                for y in range(nyears):
+                    var[y] = arr[y]
+
+
+class GridRunner:
+    """Maps raster cells to project lines and runs them chunkwise.
+
+    Args:
+        mask (numpy.ndarray): 2d boolean array, True for cells to simulate
+        cellLines (numpy.ndarray): 2d integer array with the project line of
+            every cell (optional). If not given, the masked cells are
+            numbered row by row starting with firstLine
+        firstLine (int): line number of the first cell if cellLines is not
+            given
+    """
+
+    def __init__(self, mask, cellLines=None, firstLine=1):
+        self.mask = numpy.asarray(mask, dtype=bool)
+        rows, cols = numpy.nonzero(self.mask)
+        if cellLines is None:
+            lines = numpy.arange(firstLine, firstLine + len(rows))
+        else:
+            lines = numpy.asarray(cellLines)[rows, cols].astype(numpy.int64)
+        self.lines = lines
+        self._minLine = int(lines.min()) if len(lines) > 0 else 0
+        size = int(lines.max()) - self._minLine + 1 if len(lines) > 0 else 0
+        self._row = numpy.full(size, -1, dtype=numpy.int64)
+        self._col = numpy.full(size, -1, dtype=numpy.int64)
+        self._row[lines - self._minLine] = rows
+        self._col[lines - self._minLine] = cols
+
+    def allocate(self, variables, years, outputDir=None, dtype=numpy.float32):
+        """
+        Allocate empty (NaN) raster stacks for the variables.
+
+        Args:
+            variables (list): variable names
+            years (list): consecutive years
+            outputDir (str): if given, the stacks are .npy files in this
+                directory, mapped into memory (optional)
+            dtype: numpy data type of the stacks
+
+        Returns:
+            GridResult : the empty raster stacks
+        """
+        shape = (len(years),) + self.mask.shape
+        stacks = {}
+        for name in variables:
+            if outputDir is None:
+                stacks[name] = numpy.full(shape, numpy.nan, dtype=dtype)
+            else:
+                os.makedirs(outputDir, exist_ok=True)
+                arr = numpy.lib.format.open_memmap(
+                    os.path.join(outputDir, name + '.npy'), mode='w+',
+                    dtype=dtype, shape=shape)
+                arr[:] = numpy.nan
+                stacks[name] = arr
+        return GridResult(stacks, years, self.mask)
+
+    def scatter(self, result, columns, lineColumn, yearColumn='CURRENT.YEAR'):
+        """
+        Write output rows into the raster stacks.
+
+        Args:
+            result (GridResult): raster stacks from allocate()
+            columns (dict): output columns (as returned by resultToList)
+            lineColumn (str): output column holding the project line
+            yearColumn (str): output column holding the year
+        """
+        if len(columns) == 0:
+            return
+        line = numpy.asarray(columns[lineColumn]).astype(numpy.int64) - self._minLine
+        year = numpy.asarray(columns[yearColumn]).astype(numpy.int64) - result.years[0]
+        valid = (line >= 0) & (line < len(self._row)) & \
+                (year >= 0) & (year < len(result.years))
+        line = line[valid]
+        row = self._row[line]
+        col = self._col[line]
+        cell = row >= 0
+        year = year[valid][cell]
+        row = row[cell]
+        col = col[cell]
+        for name, stack in result.variables.items():
+            values = numpy.asarray(columns[name])[valid][cell]
+            stack[year, row, col] = values
+
+    def run(self, simplaceInstance, solution, project, output, variables,
+            years, lineColumn, yearColumn='CURRENT.YEAR', chunkSize=1000,
+            parameters=None, outputDir=None, dtype=numpy.float32,
+            verbose=False):
+        """
+        Run all cells chunkwise in one Simplace instance.
+
+        The project lines of a chunk run in parallel on the slots set by
+        setSlotCount.
+
+        Args:
+            simplaceInstance: handle to the SimplaceWrapper object returned by
+                initSimplace
+            solution (str): path to solution file
+            project (str): path to project file
+            output (str): name of the yearly memory output
+            variables (list): output variables to map
+            years (list): consecutive years
+            lineColumn (str): output column holding the project line
+            yearColumn (str): output column holding the year
+            chunkSize (int): number of cells per run
+            parameters (dict): parameters passed to openProject (optional)
+            outputDir (str): directory for memory mapped .npy stacks
+                (optional)
+            dtype: numpy data type of the stacks
+
+        Returns:
+            GridResult : raster stacks for each variable
+        """
+        result = self.allocate(variables, years, outputDir, dtype)
+        lines = numpy.sort(self.lines)
+        for start in range(0, len(lines), chunkSize):
+            chunk = lines[start:start + chunkSize]
+            data = simplace.runProjectLines(simplaceInstance, solution,
+                                            project, chunk.tolist(),
+                                            parameters, [output])
+            self.scatter(result, data[output], lineColumn, yearColumn)
+            if verbose:
+                print('%d of %d cells done' % (start + len(chunk), len(lines)))
+        if outputDir is not None:
+            result.save(outputDir)
+        return result
+
+    def runParallel(self, solution, project, output, variables, years,
+                    lineColumn, yearColumn='CURRENT.YEAR', workers=None,
+                    initArgs=None, costDatabase=None, parameters=None,
+                    outputDir=None, dtype=numpy.float32, verbose=False):
+        """
+        Run all cells on several worker processes (see runProjectScheduled).
+
+        Args:
+            solution (str): path to solution file
+            project (str): path to project file
+            output (str): name of the yearly memory output
+            variables (list): output variables to map
+            years (list): consecutive years
+            lineColumn (str): output column holding the project line
+            yearColumn (str): output column holding the year
+            workers (int): number of worker processes
+            initArgs (dict): keyword arguments passed to initSimplace
+            costDatabase (str): SQLite file with learned line runtimes
+                (optional)
+            parameters (dict): parameters passed to openProject (optional)
+            outputDir (str): directory for memory mapped .npy stacks
+                (optional)
+            dtype: numpy data type of the stacks
+
+        Returns:
+            GridResult : raster stacks for each variable
+        """
+        result = self.allocate(variables, years, outputDir, dtype)
+        tmp = tempfile.mkdtemp(prefix='simplace_grid_')
+        try:
+            report = simplace.runProjectScheduled(
+                solution, project, self.lines.tolist(), workers=workers,
+                costDatabase=costDatabase, initArgs=initArgs,
+                parameters=parameters, outputs=[output], resultDir=tmp,
+                verbose=verbose)
+            if len(report['failed']) > 0:
+                raise RuntimeError('%d batches failed, first error:\n%s'
+                                   % (len(report['failed']),
+                                      report['failed'][0]['error']))
+            for batch in report['batches']:
+                for path in batch['files']:
+                    with numpy.load(path) as columns:
+                        self.scatter(result, columns, lineColumn, yearColumn)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        if outputDir is not None:
+            result.save(outputDir)
+        return result
@@ -0,0 +1,347 @@
+"""
+Record Simplace outputs once and replay them for tests and benchmarks.
+
+Results and varmaps from a real Simplace run are stored as compact .npz
+fixtures. Fixture objects implement getHeaderStrings, getTypeStrings,
+getHeaderUnits and getDataObjects like the java objects, so the conversion
+functions (resultToList, varmapToList, resultToTable, StepReader ...) can be
+checked and timed without Simplace or a java virtual machine. Timings can
+be compared against a stored baseline to detect slowdowns.
+
+**Example** - *Recording fixtures and checking them later:*
+
+    >>> import simplace, simplace.harness as h
+    >>> h.recordResult(simplace.getResult(sp, 'YearOut', simid), 'year.npz')
+    >>> h.recordVarmap(simplace.stepSimulation(sp), 'step.npz')
+
+    $ python -m simplace.harness fixtures/ --baseline fixtures/baseline.json
+
+"""
+
+import glob
+import json
+import os
+import sys
+import time
+import warnings
+
+import numpy
+
+import simplace
+
+_NUMERIC = {'DOUBLE': numpy.float64, 'INT': numpy.int64, 'BOOLEAN': bool}
+
+
+class _Number(float):
+    """Stand-in for java.lang.Double/Integer."""
+
+    def doubleValue(self):
+        return float(self)
+
+    def intValue(self):
+        return int(self)
+
+
+class _Boolean(int):
+    """Stand-in for java.lang.Boolean."""
+
+    def booleanValue(self):
+        return bool(self)
+
+    def doubleValue(self):
+        return float(self)
+
+
+class FixtureResult:
+    """Replays a recorded result (or varmap) like the java object.
+
+    Args:
+        path (str): fixture file written by recordResult or recordVarmap
+    """
+
+    def __init__(self, path):
+        with numpy.load(path) as data:
+            self.kind = str(data['kind'])
+            self.names = [str(s) for s in data['names']]
+            self.types = [str(s) for s in data['types']]
+            self.units = [str(s) for s in data['units']]
+            self.raw = [_unpack(data, i, t) for i, t in enumerate(self.types)]
+        self.path = path
+        self._objects = [_box(col, t) for col, t in zip(self.raw, self.types)]
+
+    def getHeaderStrings(self):
+        return list(self.names)
+
+    def getTypeStrings(self):
+        return list(self.types)
+
+    def getHeaderUnits(self):
+        return list(self.units)
+
+    def getDataObjects(self, start=None, end=None):
+        if self.kind == 'varmap':
+            return [col[0] for col in self._objects]
+        if start is None:
+            return [list(col) for col in self._objects]
+        return [col[start:end + 1] for col in self._objects]
+
+    def expected(self):
+        """
+        Get the values the conversion functions should return.
+
+        Returns:
+            dict : variable names as keys, values like resultToList (or
+            varmapToList for varmaps)
+        """
+        out = {}
+        for name, t, col in zip(self.names, self.types, self.raw):
+            if t == 'DATE':
+                col = [None if s is None else s[:10] for s in col]
+            if self.kind == 'varmap':
+                col = col[0]
+            out[name] = col
+        return out
+
+
+def recordResult(result, path):
+    """
+    Store a result as fixture.
+
+    Args:
+        result: handle to simulation result (as returned by getResult())
+        path (str): fixture file (.npz)
+    """
+    _record(result, result.getDataObjects(), 'result', path)
+
+def recordVarmap(varmap, path):
+    """
+    Store a varmap as fixture.
+
+    Args:
+        varmap: handle to simulation varmap (as returned by stepSimulation())
+        path (str): fixture file (.npz)
+    """
+    _record(varmap, [[o] for o in varmap.getDataObjects()], 'varmap', path)
+
+def checkFixture(fixture):
+    """
+    Compare the conversion functions with the recorded values.
+
+    Args:
+        fixture (str or FixtureResult): fixture file or loaded fixture
+
+    Returns:
+        list : descriptions of the mismatches, empty if everything matches
+    """
+    if isinstance(fixture, str):
+        fixture = FixtureResult(fixture)
+    expected = fixture.expected()
+    name = os.path.basename(fixture.path)
+    errors = []
+    candidates = {}
+    for func, convert in _defaultFunctions(fixture.kind).items():
+        try:
+            candidates[func] = convert(fixture)
+        except Exception as e:
+            errors.append('%s: %s failed (%s)' % (name, func, e))
+    for func, values in candidates.items():
+        for n, t in zip(fixture.names, fixture.types):
+            if not _equal(values.get(n), expected[n], t):
+                errors.append('%s: %s differs for %s (%s)' % (name, func, n, t))
+    return errors
+
+def benchmark(fixtures, functions=None, repeat=5):
+    """
+    Time conversion functions on fixtures.
+
+    Args:
+        fixtures (list): fixture files
+        functions (dict): names as keys, functions taking a fixture as
+            values (default resultToList/resultToTable for results and
+            varmapToList/StepReader for varmaps, which time the converters
+            _objectArrayToDataNew and _objectToDataNew)
+        repeat (int): number of repetitions, the fastest one is reported
+
+    Returns:
+        dict : keys 'function:fixture', best seconds as values
+    """
+    timings = {}
+    for path in fixtures:
+        fixture = FixtureResult(path)
+        funcs = functions or _defaultFunctions(fixture.kind)
+        for fname, func in funcs.items():
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                func(fixture)
+                seconds = time.perf_counter() - start
+                best = seconds if best is None else min(best, seconds)
+            timings['%s:%s' % (fname, os.path.basename(path))] = best
+    return timings
+
+def saveBaseline(timings, path):
+    """
+    Store timings as baseline (json).
+
+    Args:
+        timings (dict): timings as returned by benchmark()
+        path (str): baseline file
+    """
+    with open(path, 'w') as f:
+        json.dump(timings, f, indent=1, sort_keys=True)
+
+def compareBaseline(timings, path, tolerance=0.25, minSeconds=1e-4):
+    """
+    Compare timings with a stored baseline and warn about slowdowns.
+
+    Args:
+        timings (dict): timings as returned by benchmark()
+        path (str): baseline file
+        tolerance (float): allowed relative slowdown
+        minSeconds (float): timings below this are ignored as too noisy
+
+    Returns:
+        list : descriptions of the slowdowns
+    """
+    with open(path) as f:
+        baseline = json.load(f)
+    alerts = []
+    for key, seconds in sorted(timings.items()):
+        base = baseline.get(key)
+        if base is None or max(base, seconds) < minSeconds:
+            continue
+        if seconds > base * (1 + tolerance):
+            alerts.append('%s: %.3g s instead of %.3g s (+%.0f%%)'
+                          % (key, seconds, base, 100 * (seconds / base - 1)))
+    for a in alerts:
+        warnings.warn('Slowdown ' + a)
+    return alerts
+
+
+# Helper Functions
+
+def _defaultFunctions(kind):
+    if kind == 'varmap':
+        return {'varmapToList': simplace.varmapToList,
+                'StepReader': _readStep}
+    return {'resultToList': simplace.resultToList,
+            'resultToTable': lambda r: simplace.resultToTable(r).toDict()}
+
+def _readStep(varmap):
+    reader = simplace.StepReader(None)
+    reader.read(varmap)
+    return reader.values()
+
+def _record(source, obj, kind, path):
+    types = [str(s) for s in source.getTypeStrings()]
+    data = {'kind': numpy.array(kind),
+            'names': numpy.array([str(s) for s in source.getHeaderStrings()]),
+            'types': numpy.array(types),
+            'units': numpy.array([str(s) for s in source.getHeaderUnits()])}
+    for i, (col, t) in enumerate(zip(obj, types)):
+        data.update(_pack(i, col, t))
+    numpy.savez_compressed(path, **data)
+
+def _pack(i, col, t):
+    values = list(col)
+    mask = numpy.array([v is None for v in values], dtype=bool)
+    if t in _NUMERIC:
+        conv = [0 if v is None else
+                (bool(v.booleanValue()) if t == 'BOOLEAN' else
+                 v.intValue() if t == 'INT' else v.doubleValue())
+                for v in values]
+        return {'c%d' % i: numpy.array(conv, dtype=_NUMERIC[t]),
+                'm%d' % i: mask}
+    if t in ['DOUBLEARRAY', 'INTARRAY', 'CHARARRAY']:
+        rows = [[] if v is None else list(v) for v in values]
+        flat = [x for r in rows for x in r]
+        if t == 'CHARARRAY':
+            flat = numpy.array([str(x) for x in flat], dtype=str)
+        else:
+            flat = numpy.array([float(x) for x in flat],
+                               dtype=numpy.float64 if t == 'DOUBLEARRAY'
+                               else numpy.int64)
+        return {'c%d' % i: flat, 'm%d' % i: mask,
+                'l%d' % i: numpy.array([len(r) for r in rows], dtype=numpy.int64)}
+    return {'c%d' % i: numpy.array(['' if v is None else str(v)
+                                    for v in values], dtype=str),
+            'm%d' % i: mask}
+
+def _unpack(data, i, t):
+    values = data['c%d' % i]
+    mask = data['m%d' % i]
+    if 'l%d' % i in data:
+        bounds = numpy.r_[0, numpy.cumsum(data['l%d' % i])]
+        values = [values[a:b] if t != 'CHARARRAY' else [str(s) for s in values[a:b]]
+                  for a, b in zip(bounds[:-1], bounds[1:])]
+    elif t in _NUMERIC:
+        values = values.tolist()
+    else:
+        values = [str(s) for s in values]
+    return [None if m else v for v, m in zip(values, mask)]
+
+def _box(col, t):
+    if t == 'BOOLEAN':
+        return [None if v is None else _Boolean(v) for v in col]
+    elif t in _NUMERIC:
+        return [None if v is None else _Number(v) for v in col]
+    return col
+
+def _equal(actual, expected, t):
+    if t in _NUMERIC:
+        a = numpy.asarray(actual, dtype=float)
+        e = numpy.asarray([numpy.nan if v is None else v for v in
+                           numpy.atleast_1d(numpy.array(expected, dtype=object))],
+                          dtype=float)
+        return a.size == e.size and numpy.allclose(a.ravel(), e, equal_nan=True)
+    if t in ['DOUBLEARRAY', 'INTARRAY']:
+        if isinstance(expected, numpy.ndarray) or expected is None:
+            return numpy.allclose(numpy.asarray(actual, dtype=float),
+                                  numpy.asarray(expected, dtype=float))
+        return len(actual) == len(expected) and all(
+            numpy.allclose(numpy.asarray(a, dtype=float),
+                           numpy.asarray(e, dtype=float))
+            for a, e in zip(actual, expected))
+    if t == 'DATE' and isinstance(actual, numpy.ndarray) and \
+            actual.dtype.kind == 'M':
+        actual = [str(s) for s in numpy.atleast_1d(actual)]
+    if isinstance(actual, numpy.ndarray):
+        actual = actual.tolist()
+    if isinstance(expected, list) and not isinstance(actual, list):
+        actual = [actual] if len(expected) == 1 else actual
+    return [str(x) for x in numpy.atleast_1d(numpy.array(actual, dtype=object))] \
+        == [str(x) for x in numpy.atleast_1d(numpy.array(expected, dtype=object))]
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Check and time Simplace conversions on recorded fixtures.')
+    parser.add_argument('fixtures', help='directory with .npz fixtures')
+    parser.add_argument('--baseline', default=None, help='baseline json file')
+    parser.add_argument('--update', action='store_true',
+                        help='write the timings as new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    paths = sorted(glob.glob(os.path.join(args.fixtures, '*.npz')))
+    errors = [e for p in paths for e in checkFixture(p)]
+    for e in errors:
+        print('MISMATCH ' + e)
+    timings = benchmark(paths, repeat=args.repeat)
+    for key, seconds in sorted(timings.items()):
+        print('%-60s %10.6f s' % (key, seconds))
+    alerts = []
+    if args.baseline is not None:
+        if args.update or not os.path.exists(args.baseline):
+            saveBaseline(timings, args.baseline)
+        else:
+            alerts = compareBaseline(timings, args.baseline, args.tolerance)
+            for a in alerts:
+                print('SLOWDOWN ' + a)
+    return 1 if len(errors) > 0 or len(alerts) > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,331 @@
+"""
+Rerun only the project lines whose inputs have changed.
+
+Every line of the project data file is hashed together with the solution
+file, the project file and the parameters. The outputs of each line are
+kept in a SQLite store with the hash they were computed for. On the next
+run only lines with a new hash (changed or added lines, or a changed
+solution) are simulated, all other outputs come from the store.
+
+The outputs of one run have to be split into the lines they belong to.
+This needs a column in the project data that identifies a line (keyColumn)
+and an output column with the same values (outputKeyColumn). Without a
+key column every changed line is run on its own.
+
+**Example** - *Rerunning a project after editing some soil rows:*
+
+    >>> import simplace
+    >>> inc = simplace.IncrementalProject('/out/incremental.sqlite',
+    ...     '/sol/Maize.sol.xml', '/proj/NRW.proj.xml', '/data/NRW_proj.csv',
+    ...     keyColumn='SiteID')
+    >>> print(inc.changedLines(['YearOut']))
+    [17, 233]
+    >>> tables = inc.run(sp, ['YearOut'])
+    >>> print(inc.report)
+    {'lines': 4000, 'run': 2, 'reused': 3998, 'seconds': 3.1}
+
+"""
+
+import hashlib
+import io
+import os
+import sqlite3
+import time
+
+import numpy
+
+import simplace
+
+
+class IncrementalProject:
+    """Per line output store of a project.
+
+    Args:
+        store (str): SQLite database file for the outputs
+        solution (str): path to solution file
+        project (str): path to project file
+        projectData (str): path to the project data file (csv with header,
+            line 1 is the first row after the header)
+        keyColumn (str): column of the project data identifying a line
+            (optional)
+        outputKeyColumn (str): output column with the values of keyColumn
+            (default keyColumn)
+        parameters (dict): parameters passed to openProject (optional)
+        separator (str): column separator of the project data file
+        workDir (str): work directory of Simplace, relative paths of the
+            solution, project and project data are resolved against it like
+            openProject does (default the work directory of the instance
+            passed to run)
+    """
+
+    def __init__(self, store, solution, project, projectData, keyColumn=None,
+                 outputKeyColumn=None, parameters=None, separator=';',
+                 workDir=None):
+        if os.path.dirname(store) != '':
+            os.makedirs(os.path.dirname(store), exist_ok=True)
+        self.solution = solution
+        self.project = project
+        self.projectData = projectData
+        self.keyColumn = keyColumn
+        self.outputKeyColumn = outputKeyColumn or keyColumn
+        self.parameters = parameters
+        self.separator = separator
+        self.workDir = workDir
+        self.report = {}
+        self._db = sqlite3.connect(store)
+        self._db.execute('CREATE TABLE IF NOT EXISTS lineoutput '
+                         '(key TEXT, output TEXT, hash TEXT, data BLOB, '
+                         'PRIMARY KEY (key, output))')
+        self._db.commit()
+
+    def close(self):
+        """Close the store."""
+        self._db.close()
+
+    def lineHashes(self, lines=None):
+        """
+        Hash the project data lines together with solution, project and
+        parameters.
+
+        Args:
+            lines (str or list): line specification (default all lines)
+
+        Returns:
+            dict : line numbers as keys, (key, hash) tuples as values
+        """
+        header, rows = self._readProjectData()
+        index = header.index(self.keyColumn) if self.keyColumn else None
+        common = hashlib.sha1()
+        for path in [self.solution, self.project]:
+            if path is not None:
+                common.update(_fileHash(self._resolve(path)).encode())
+        _hashParameters(common, self.parameters or {})
+        common.update(self.separator.join(header).encode())
+        if lines is None:
+            lines = range(1, len(rows) + 1)
+        else:
+            lines = simplace.projectLinesToList(lines)
+        out = {}
+        for line in lines:
+            row = rows[line - 1]
+            key = row.split(self.separator)[index].strip() \
+                if index is not None else str(line)
+            h = common.copy()
+            h.update(row.encode())
+            out[line] = (key, h.hexdigest())
+        return out
+
+    def changedLines(self, outputs, lines=None):
+        """
+        Get the lines without stored outputs for their current hash.
+
+        Args:
+            outputs (list): names of memory outputs
+            lines (str or list): line specification (default all lines)
+
+        Returns:
+            list : line numbers that have to be run
+        """
+        return self._changed(self.lineHashes(lines), outputs)
+
+    def run(self, simplaceInstance, outputs, lines=None, expand=True):
+        """
+        Run the changed lines and merge their outputs with the stored ones.
+
+        Args:
+            simplaceInstance: handle to the SimplaceWrapper object returned by
+                initSimplace
+            outputs (list): names of memory outputs
+            lines (str or list): line specification (default all lines)
+            expand (bool): whether array values should be expanded
+
+        Returns:
+            dict : output names as keys, ResultTable objects with the key
+            column 'projectline' (the values of keyColumn or the line
+            numbers) as values
+        """
+        start = time.perf_counter()
+        if self.workDir is None:
+            self.workDir = simplace.getSimplaceDirectories(
+                simplaceInstance)['_WORKDIR_']
+        hashes = self.lineHashes(lines)
+        changed = self._changed(hashes, outputs)
+        if self.keyColumn is None:
+            batches = [[line] for line in changed]
+        else:
+            batches = [changed] if len(changed) > 0 else []
+        for batch in batches:
+            tables = self._runLines(simplaceInstance, batch, outputs, expand)
+            keys = {hashes[line][0]: hashes[line][1] for line in batch}
+            for output, table in tables.items():
+                self._store(output, table, keys, batch)
+            self._db.commit()
+        result = {output: simplace.ResultTable.concat(
+                      [self._load(key, output) for key, _ in hashes.values()],
+                      'projectline')
+                  for output in outputs}
+        self.report = {'lines': len(hashes), 'run': len(changed),
+                       'reused': len(hashes) - len(changed),
+                       'seconds': time.perf_counter() - start}
+        return result
+
+    def _changed(self, hashes, outputs):
+        stored = {}
+        for key, output, h in self._db.execute(
+                'SELECT key, output, hash FROM lineoutput'):
+            stored[(key, output)] = h
+        return [line for line, (key, h) in hashes.items()
+                if any(stored.get((key, o)) != h for o in outputs)]
+
+    def _resolve(self, path):
+        if not os.path.exists(path) and self.workDir is not None:
+            resolved = os.path.join(self.workDir, path.lstrip("\\/"))
+            if os.path.exists(resolved):
+                return resolved
+        return path
+
+    def _readProjectData(self):
+        with open(self._resolve(self.projectData)) as f:
+            content = [l.rstrip('\r\n') for l in f]
+        while len(content) > 0 and content[-1].strip() == '':
+            content.pop()
+        header = [s.strip() for s in content[0].split(self.separator)]
+        return header, content[1:]
+
+    def _runLines(self, simplaceInstance, batch, outputs, expand):
+        simplace.setProjectLines(simplaceInstance, batch)
+        simplace.openProject(simplaceInstance, self.solution, self.project,
+                             self.parameters)
+        try:
+            simplace.runProject(simplaceInstance)
+            return {output: simplace.resultToTable(
+                        simplace.getResult(simplaceInstance, output),
+                        None, 'projectline', expand)
+                    for output in outputs}
+        finally:
+            simplace.closeProject(simplaceInstance)
+
+    def _store(self, output, table, keys, batch):
+        columns = {n: c for n, c in table.columns.items()
+                   if n != 'projectline'}
+        if self.keyColumn is None:
+            parts = {k: columns for k in keys}
+        else:
+            lineKeys = numpy.array([_normalizeKey(v) for v in
+                                    columns[self.outputKeyColumn]])
+            parts = {k: {n: c[lineKeys == k] for n, c in columns.items()}
+                     for k in keys}
+        for key, part in parts.items():
+            arrays = {}
+            for i, c in enumerate(part.values()):
+                arrays.update(_packColumn(i, c))
+            buffer = io.BytesIO()
+            numpy.savez(buffer, __names__=numpy.array(list(part), dtype=str),
+                        **arrays)
+            self._db.execute('INSERT OR REPLACE INTO lineoutput '
+                             'VALUES (?, ?, ?, ?)',
+                             (key, output, keys[key], buffer.getvalue()))
+
+    def _load(self, key, output):
+        row = self._db.execute('SELECT data FROM lineoutput WHERE key=? '
+                               'AND output=?', (key, output)).fetchone()
+        if row is None:
+            return None
+        with numpy.load(io.BytesIO(row[0]), allow_pickle=False) as data:
+            names = [str(s) for s in data['__names__']]
+            columns = {n: _unpackColumn(data, i) for i, n in enumerate(names)}
+        n = len(columns[names[0]]) if len(names) > 0 else 0
+        return simplace.ResultTable(columns, [key], [0, n], 'projectline')
+
+
+def runProjectIncremental(simplaceInstance, solution, project, projectData,
+                          outputs, store, lines=None, parameters=None,
+                          keyColumn=None, outputKeyColumn=None):
+    """
+    Run only the changed project lines and merge their outputs with the
+    stored outputs of the unchanged lines.
+
+    Args:
+        simplaceInstance: handle to the SimplaceWrapper object returned by
+            initSimplace
+        solution (str): path to solution file
+        project (str): path to project file
+        projectData (str): path to the project data file
+        outputs (list): names of memory outputs
+        store (str): SQLite database file for the outputs
+        lines (str or list): line specification (default all lines)
+        parameters (dict): parameters passed to openProject (optional)
+        keyColumn (str): column of the project data identifying a line
+        outputKeyColumn (str): output column with the values of keyColumn
+
+    Returns:
+        dict : output names as keys, ResultTable objects as values
+    """
+    inc = IncrementalProject(store, solution, project, projectData,
+                             keyColumn, outputKeyColumn, parameters)
+    try:
+        return inc.run(simplaceInstance, outputs, lines)
+    finally:
+        inc.close()
+
+
+# Helper Functions
+
+def _fileHash(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def _hashParameters(h, parameters):
+    for name in sorted(parameters.keys()):
+        value = parameters[name]
+        h.update(repr(name).encode())
+        if isinstance(value, (list, tuple)):
+            array = numpy.asarray(value)
+            if array.dtype.kind in 'biufU':
+                value = array
+        if isinstance(value, numpy.ndarray) and value.dtype.kind == 'O':
+            value = value.tolist()
+        if isinstance(value, numpy.ndarray):
+            h.update(('%s%s' % (value.dtype.str, value.shape)).encode())
+            h.update(numpy.ascontiguousarray(value).tobytes())
+        else:
+            h.update(('%s:%r' % (type(value).__name__, value)).encode())
+
+def _packColumn(i, values):
+    # Columns of arrays (object arrays, e.g. not expanded array values) are
+    # stored as flat values, row lengths and a mask of missing rows, so the
+    # store can be read without unpickling
+    values = numpy.asarray(values)
+    if values.dtype.kind != 'O':
+        return {'c%d' % i: values}
+    mask = numpy.array([v is None for v in values], dtype=bool)
+    try:
+        rows = [[] if v is None else list(v) for v in values]
+    except TypeError:
+        raise ValueError('Column %d contains values that are not arrays' % i)
+    flat = numpy.array([x for r in rows for x in r])
+    if flat.dtype.kind == 'O':
+        flat = flat.astype(str)
+    return {'c%d' % i: flat, 'm%d' % i: mask,
+            'l%d' % i: numpy.array([len(r) for r in rows], dtype=numpy.int64)}
+
+def _unpackColumn(data, i):
+    values = data['c%d' % i]
+    if 'l%d' % i not in data:
+        return values
+    bounds = numpy.r_[0, numpy.cumsum(data['l%d' % i])]
+    out = numpy.empty(len(bounds) - 1, dtype=object)
+    for j, (a, b, missing) in enumerate(zip(bounds[:-1], bounds[1:],
+                                            data['m%d' % i])):
+        if not missing:
+            out[j] = values[a:b].tolist() if values.dtype.kind == 'U' \
+                else values[a:b]
+    return out
+
+def _normalizeKey(value):
+    if isinstance(value, (float, numpy.floating)) and float(value).is_integer():
+        return str(int(value))
+    return str(value).strip()
@@ -0,0 +1,240 @@
+"""
+Write input tables from numpy arrays once as csv files on a tmpfs.
+
+Simplace reads its input data through file based data sources, there is no
+hook to pass tables from python directly. A TmpfsCsvWriter writes every
+registered table exactly once as csv file to a memory backed directory
+(/dev/shm if available). Simplace still reads and parses these csv files,
+only the disk is avoided. Tables with identical content are written only
+once, independent of their names. The file paths are passed to the
+simulations as parameters, or the directory is used as data directory of
+Simplace, so all queued simulations share the same files.
+
+**Example** - *Climate ensemble without temporary files on disk:*
+
+    >>> import simplace
+    >>> reg = simplace.TmpfsCsvWriter()
+    >>> names = reg.registerEnsemble('weather', dates,
+    ...                              {'TMIN':tmin, 'TMAX':tmax, 'RAIN':rain})
+    >>> simplace.openProject(sp, '/sol/MaizeEnsemble.sol.xml')
+    >>> for n in names:
+    ...     simplace.createSimulation(sp, reg.parameters({'vWeatherFile':n}))
+    >>> simplace.runSimulations(sp)
+    >>> reg.clear()
+
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+import numpy
+
+import simplace
+
+
+class TmpfsCsvWriter:
+    """Csv files of input tables on a tmpfs, shared by all simulations.
+
+    Args:
+        root (str): directory for the tables (default new directory in
+            /dev/shm, or the temporary directory if /dev/shm doesn't exist)
+        separator (str): column separator of the csv files
+        dateFormat (str): strftime like format of the date column, only
+            %d, %m and %Y are supported
+        floatFormat (str): format of the numeric values (default '%.17g',
+            which keeps float64 values exactly)
+    """
+
+    def __init__(self, root=None, separator=';', dateFormat='%d.%m.%Y',
+                 floatFormat='%.17g'):
+        if root is None:
+            base = '/dev/shm' if os.access('/dev/shm', os.W_OK) else None
+            root = tempfile.mkdtemp(prefix='simplace-inputs-', dir=base)
+            self._ownsRoot = True
+        else:
+            os.makedirs(root, exist_ok=True)
+            self._ownsRoot = False
+        self.root = os.path.abspath(root)
+        self.separator = separator
+        self.dateFormat = dateFormat
+        self.floatFormat = floatFormat
+        self._names = {}
+        self._references = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.clear()
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def __len__(self):
+        return len(self._names)
+
+    def register(self, name, columns, dateColumn=None):
+        """
+        Register a table under a name.
+
+        Args:
+            name (str): resource name
+            columns (dict): column names as keys, 1d arrays of equal length
+                as values. Columns of datetime64 dtype are written in
+                dateFormat
+            dateColumn (str): name of a column with date strings
+                ('YYYY-MM-DD') to be written in dateFormat (optional)
+
+        Returns:
+            str : path of the materialised file
+        """
+        names = list(columns)
+        arrays = [numpy.asarray(columns[n]) for n in names]
+        if len(set(len(a) for a in arrays)) > 1:
+            raise ValueError('All columns need the same length')
+        if dateColumn is not None:
+            i = names.index(dateColumn)
+            arrays[i] = arrays[i].astype('datetime64[D]')
+        digest = self._hash(names, arrays)
+        if self._names.get(name) == digest:
+            return self.path(name)
+        self.remove(name)
+        path = os.path.join(self.root, digest + '.csv')
+        if digest not in self._references:
+            self._write(path, names, arrays)
+            self._references[digest] = 0
+        self._references[digest] += 1
+        self._names[name] = digest
+        return path
+
+    def registerEnsemble(self, prefix, dates, variables, dateColumn='DATE'):
+        """
+        Register the members of an ensemble sharing one date column.
+
+        Args:
+            prefix (str): members are named prefix_0, prefix_1 ...
+            dates (numpy.ndarray): dates (datetime64 or 'YYYY-MM-DD')
+            variables (dict): variable names as keys, 2d arrays (members x
+                dates) as values
+            dateColumn (str): name of the date column
+
+        Returns:
+            list : names of the registered members
+        """
+        dates = numpy.asarray(dates).astype('datetime64[D]')
+        stacks = {k: numpy.atleast_2d(v) for k, v in variables.items()}
+        members = max(len(v) for v in stacks.values())
+        names = []
+        for m in range(members):
+            columns = {dateColumn: dates}
+            columns.update({k: v[m if len(v) > 1 else 0]
+                            for k, v in stacks.items()})
+            name = '%s_%d' % (prefix, m)
+            self.register(name, columns)
+            names.append(name)
+        return names
+
+    def path(self, name):
+        """Get the absolute path of a registered table."""
+        return os.path.join(self.root, self._names[name] + '.csv')
+
+    def filename(self, name):
+        """Get the file name of a table relative to the registry root."""
+        return self._names[name] + '.csv'
+
+    def parameters(self, mapping, relative=False):
+        """
+        Build simulation parameters pointing to registered tables.
+
+        Args:
+            mapping (dict): Simplace SimVariable names as keys, names of
+                registered tables as values
+            relative (bool): use file names relative to the registry root,
+                e.g. when the registry is the data directory
+
+        Returns:
+            dict : parameters for openProject or createSimulation
+        """
+        get = self.filename if relative else self.path
+        return {var: get(name) for var, name in mapping.items()}
+
+    @contextmanager
+    def asDataDir(self, simplaceInstance):
+        """
+        Use the registry root as data directory of Simplace temporarily.
+
+        Args:
+            simplaceInstance: handle to the SimplaceWrapper object returned by
+                initSimplace
+        """
+        previous = simplace.getSimplaceDirectories(simplaceInstance)['_DATADIR_']
+        simplace.setSimplaceDirectories(simplaceInstance,
+                                        dataDir=self.root + os.sep)
+        try:
+            yield self
+        finally:
+            simplace.setSimplaceDirectories(simplaceInstance, dataDir=previous)
+
+    def remove(self, name):
+        """Unregister a table, its file is deleted when no name refers to it."""
+        digest = self._names.pop(name, None)
+        if digest is None:
+            return
+        self._references[digest] -= 1
+        if self._references[digest] == 0:
+            del self._references[digest]
+            try:
+                os.remove(os.path.join(self.root, digest + '.csv'))
+            except OSError:
+                pass
+
+    def clear(self):
+        """Unregister all tables and delete their files."""
+        for name in list(self._names):
+            self.remove(name)
+        if self._ownsRoot:
+            shutil.rmtree(self.root, ignore_errors=True)
+
+    def _hash(self, names, arrays):
+        h = hashlib.blake2b(digest_size=16)
+        h.update(repr((names, self.separator, self.dateFormat,
+                       self.floatFormat)).encode())
+        for a in arrays:
+            h.update(str(a.dtype).encode())
+            if a.dtype.kind in 'OU':
+                h.update('\x00'.join(str(x) for x in a).encode())
+            else:
+                h.update(numpy.ascontiguousarray(a).tobytes())
+        return h.hexdigest()
+
+    def _write(self, path, names, arrays):
+        cells = [self._format(a) for a in arrays]
+        lines = [self.separator.join(names)]
+        lines.extend(self.separator.join(row) for row in zip(*cells))
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write('\n'.join(lines))
+            f.write('\n')
+        os.replace(tmp, path)
+
+    def _format(self, a):
+        if a.dtype.kind == 'M':
+            return _formatDates(a.astype('datetime64[D]'), self.dateFormat)
+        elif a.dtype.kind in 'iub':
+            return [str(int(x)) for x in a]
+        elif a.dtype.kind == 'f':
+            return list(numpy.char.mod(self.floatFormat, a))
+        return [str(x) for x in a]
+
+
+# Helper Functions
+
+def _formatDates(dates, dateFormat):
+    pieces = re.split('(%[Ymd])', dateFormat)
+    fields = {'%Y': slice(0, 4), '%m': slice(5, 7), '%d': slice(8, 10)}
+    return [''.join(s[fields[p]] if p in fields else p for p in pieces)
+            for s in dates.astype(str)]
@@ -0,0 +1,185 @@
+"""
+Size the java virtual machine for the workload and report its statistics.
+
+The heap size, the garbage collector and the number of parallel garbage
+collector threads are derived from the memory and cpu quota available to the
+process (respecting cgroup limits of containers and batch systems), the
+number of slots and the number of project lines.
+
+**Example** - *Initialising Simplace with tuned java parameters:*
+
+    >>> import simplace
+    >>> sp = simplace.initSimplace('/ws/','/runs/simulation/','/out/',
+    ...         autoJava={'slotCount':4, 'projectLines':2000})
+    >>> simplace.setSlotCount(4)
+    >>> before = simplace.getJvmStatistics()
+    >>> simplace.runProject(sp)
+    >>> stats = simplace.jvmStatisticsDelta(before, simplace.getJvmStatistics())
+    >>> print(stats['gcSeconds'], stats['heapUsed'])
+    1.27 812646400
+
+"""
+
+import os
+
+import jpype
+
+_MB = 1024 * 1024
+
+
+def availableMemory():
+    """
+    Get the memory available to the process.
+
+    Returns:
+        int : memory in bytes (minimum of physical memory and cgroup limit),
+        None if it can't be determined
+    """
+    limits = []
+    try:
+        limits.append(os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES'))
+    except (AttributeError, ValueError, OSError):
+        pass
+    for path in ['/sys/fs/cgroup/memory.max',
+                 '/sys/fs/cgroup/memory/memory.limit_in_bytes']:
+        value = _readFile(path)
+        if value is not None and value.isdigit():
+            limits.append(int(value))
+    limits = [l for l in limits if 0 < l < 2**60]
+    return min(limits) if len(limits) > 0 else None
+
+def availableCpus():
+    """
+    Get the number of cpus available to the process.
+
+    Returns:
+        int : number of cpus (respecting cpu affinity and cgroup quota)
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = None
+    value = _readFile('/sys/fs/cgroup/cpu.max')
+    if value is not None and not value.startswith('max'):
+        q, p = value.split()[:2]
+        quota = int(q) / int(p)
+    else:
+        q = _readFile('/sys/fs/cgroup/cpu/cpu.cfs_quota_us')
+        p = _readFile('/sys/fs/cgroup/cpu/cpu.cfs_period_us')
+        if q is not None and p is not None and int(q) > 0:
+            quota = int(q) / int(p)
+    if quota is not None:
+        cpus = min(cpus, max(1, int(quota + 0.5)))
+    return cpus
+
+def autoJavaParameters(slotCount=None, projectLines=None,
+                       memoryOutputs=True, memoryPerLine=2 * _MB,
+                       memoryPerSlot=256 * _MB, baseMemory=512 * _MB,
+                       memoryFraction=0.75):
+    """
+    Derive heap size and garbage collector settings from the workload.
+
+    The heap is estimated from a base amount, the memory per slot and, if
+    memory outputs are used, the memory per project line. It is capped by
+    the fraction of the available memory.
+
+    Args:
+        slotCount (int): number of slots (cores) used to run projects
+        projectLines (int): number of project lines run in one project
+        memoryOutputs (bool): whether the solution keeps memory outputs
+        memoryPerLine (int): estimated bytes of memory output per line
+        memoryPerSlot (int): estimated bytes needed for every slot
+        baseMemory (int): bytes needed by Simplace itself
+        memoryFraction (float): maximal fraction of the available memory
+            used for the heap
+
+    Returns:
+        list : java parameters, e.g. ['-Xmx4096m', '-XX:+UseG1GC',
+        '-XX:ParallelGCThreads=4']
+    """
+    cpus = availableCpus()
+    slots = min(slotCount, cpus) if slotCount is not None else cpus
+    need = baseMemory + slots * memoryPerSlot
+    if memoryOutputs and projectLines is not None:
+        need += projectLines * memoryPerLine
+    memory = availableMemory()
+    heap = need if memory is None else min(need, int(memory * memoryFraction))
+    heap = max(heap, 256 * _MB)
+
+    if cpus == 1 or heap <= 512 * _MB:
+        gc = '-XX:+UseSerialGC'
+    elif heap < 4096 * _MB:
+        gc = '-XX:+UseParallelGC'
+    else:
+        gc = '-XX:+UseG1GC'
+    params = ['-Xmx%dm' % (heap // _MB), gc]
+    if gc != '-XX:+UseSerialGC':
+        params.append('-XX:ParallelGCThreads=%d' % max(1, slots))
+    return params
+
+def getJvmStatistics():
+    """
+    Get garbage collection and heap statistics of the running java vm.
+
+    Returns:
+        dict : with keys 'gcCount', 'gcSeconds' (summed over all
+        collectors), 'collectors' (count and seconds per collector),
+        'heapUsed', 'heapCommitted', 'heapMax', 'heapAfterGc' (heap used
+        after the last collection of each pool, in bytes) and
+        'uptimeSeconds'
+    """
+    mf = jpype.JClass('java.lang.management.ManagementFactory')
+    collectors = {}
+    for gc in mf.getGarbageCollectorMXBeans():
+        collectors[str(gc.getName())] = (int(gc.getCollectionCount()),
+                                         int(gc.getCollectionTime()) / 1000.0)
+    heap = mf.getMemoryMXBean().getHeapMemoryUsage()
+    afterGc = 0
+    for pool in mf.getMemoryPoolMXBeans():
+        usage = pool.getCollectionUsage()
+        if str(pool.getType().name()) == 'HEAP' and usage is not None:
+            afterGc += int(usage.getUsed())
+    return {
+        'gcCount': sum(c for c, _ in collectors.values()),
+        'gcSeconds': sum(s for _, s in collectors.values()),
+        'collectors': collectors,
+        'heapUsed': int(heap.getUsed()),
+        'heapCommitted': int(heap.getCommitted()),
+        'heapMax': int(heap.getMax()),
+        'heapAfterGc': afterGc,
+        'uptimeSeconds': int(mf.getRuntimeMXBean().getUptime()) / 1000.0}
+
+def jvmStatisticsDelta(before, after):
+    """
+    Get the statistics of a run from the statistics before and after it.
+
+    Garbage collection counts and times are differences, heap values are
+    the ones after the run.
+
+    Args:
+        before (dict): statistics from getJvmStatistics() before the run
+        after (dict): statistics from getJvmStatistics() after the run
+
+    Returns:
+        dict : statistics of the run, same keys as getJvmStatistics()
+    """
+    delta = dict(after)
+    delta['gcCount'] = after['gcCount'] - before['gcCount']
+    delta['gcSeconds'] = after['gcSeconds'] - before['gcSeconds']
+    delta['collectors'] = {
+        name: (c - before['collectors'].get(name, (0, 0))[0],
+               s - before['collectors'].get(name, (0, 0))[1])
+        for name, (c, s) in after['collectors'].items()}
+    delta['uptimeSeconds'] = after['uptimeSeconds'] - before['uptimeSeconds']
+    return delta
+
+
+# Helper Functions
+
+def _readFile(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
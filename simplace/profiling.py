@@ -0,0 +1,206 @@
+"""
+Sample where Simplace spends the simulation time.
+
+A Profiler samples the java stacks of the threads running Simplace at a fixed
+interval while a project or simulations run. The samples are attributed to
+the innermost SimComponent class on the stack, which gives the share of the
+runtime of every component. The full stacks are available in the collapsed
+format used by flame graph tools.
+
+**Example** - *Profiling a project run:*
+
+    >>> import simplace
+    >>> sp = simplace.initSimplace('/ws/','/runs/simulation/','/out/')
+    >>> simplace.openProject(sp, '/sol/Maize.sol.xml', '/proj/NRW.proj.xml')
+    >>> prof = simplace.Profiler(interval=0.01)
+    >>> simplace.runProject(sp, profiler=prof)
+    >>> print(prof.componentTable()[:3])
+    >>> prof.writeCollapsed('/out/maize.collapsed')
+
+"""
+
+import threading
+import time
+
+import jpype
+import numpy
+
+import simplace
+
+
+class Profiler:
+    """Samples java stacks of running Simplace threads.
+
+    Can be used as context manager or passed to runProject/runSimulations.
+    Samples of several runs are accumulated. The thread that started the
+    profiler is left out while other Simplace threads run, as it only
+    waits for them. The seconds of a sample are split evenly among the
+    sampled threads, so the component seconds add up to the wall time.
+
+    Args:
+        interval (float): seconds between two samples
+        componentPrefixes (list): class name prefixes of SimComponents
+        threadPrefix (str): only threads with a frame of a class starting with
+            this prefix are sampled
+        maxDepth (int): maximal number of frames kept per stack
+    """
+
+    def __init__(self, interval=0.02,
+                 componentPrefixes=('net.simplace.sim.components.',),
+                 threadPrefix='net.simplace.', maxDepth=64):
+        self.interval = interval
+        self.componentPrefixes = tuple(componentPrefixes)
+        self.threadPrefix = threadPrefix
+        self.maxDepth = maxDepth
+        self.stacks = {}
+        self.components = {}
+        self.componentSeconds = {}
+        self.lines = []
+        self.samples = 0
+        self.seconds = 0.0
+        self._stop = None
+        self._thread = None
+        self._start = None
+        self._caller = None
+
+    def start(self):
+        """Start sampling in a background thread."""
+        if jpype.isJVMStarted():
+            JThread = jpype.JClass('java.lang.Thread')
+            self._caller = JThread.currentThread().getId()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._start = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling (does nothing if the profiler isn't running)."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.seconds += time.perf_counter() - self._start
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def componentTable(self):
+        """
+        Get the sampled time of every component, largest first.
+
+        Returns:
+            numpy.ndarray : structured array with the fields 'component',
+            'samples', 'seconds' and 'fraction'. The seconds are the measured
+            wall times between a sample and the previous one, divided by the
+            number of threads in the sample and summed over the samples of
+            the component. Samples outside of any component are counted as
+            '(framework)'
+        """
+        total = max(sum(self.components.values()), 1)
+        rows = sorted(self.components.items(), key=lambda z: -z[1])
+        table = numpy.zeros(len(rows), dtype=[
+            ('component', 'U%d' % max([len(r[0]) for r in rows] + [1])),
+            ('samples', 'i8'), ('seconds', 'f8'), ('fraction', 'f8')])
+        for i, (name, count) in enumerate(rows):
+            table[i] = (name, count, self.componentSeconds.get(name, 0.0),
+                        count / total)
+        return table
+
+    def lineTable(self):
+        """
+        Get the wall time of the project lines run by profileProjectLines.
+
+        Returns:
+            numpy.ndarray : structured array with the fields 'line' and
+            'seconds'
+        """
+        return numpy.array(self.lines, dtype=[('line', 'i8'), ('seconds', 'f8')])
+
+    def writeCollapsed(self, path):
+        """
+        Write the sampled stacks in collapsed format (frame;frame;frame count).
+
+        Args:
+            path (str): output file, can be used e.g. with flamegraph.pl
+        """
+        with open(path, 'w') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write('%s %d\n' % (stack, count))
+
+    def _run(self):
+        try:
+            JThread = jpype.JClass('java.lang.Thread')
+            last = time.perf_counter()
+            while not self._stop.wait(self.interval):
+                now = time.perf_counter()
+                self._sample(JThread.getAllStackTraces(), now - last)
+                last = now
+        finally:
+            if jpype.isThreadAttachedToJVM():
+                jpype.detachThreadFromJVM()
+
+    def _sample(self, traces, seconds):
+        threads = []
+        for entry in traces.entrySet():
+            frames = entry.getValue()
+            if len(frames) == 0:
+                continue
+            names = [str(el.getClassName()) + '.' + str(el.getMethodName())
+                     for el in frames[:self.maxDepth]]
+            if any(n.startswith(self.threadPrefix) for n in names):
+                threads.append((entry.getKey().getId(), names))
+        if len(threads) > 1:
+            threads = [t for t in threads if t[0] != self._caller]
+        if len(threads) == 0:
+            return
+        seconds = seconds / len(threads)
+        for _, names in threads:
+            component = '(framework)'
+            for n in names:
+                if n.startswith(self.componentPrefixes):
+                    component = n.rsplit('.', 1)[0]
+                    break
+            stack = ';'.join(reversed(names))
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+            self.components[component] = self.components.get(component, 0) + 1
+            self.componentSeconds[component] = \
+                self.componentSeconds.get(component, 0.0) + seconds
+            self.samples += 1
+
+
+def profileProjectLines(simplaceInstance, solution, project, lines,
+                        profiler=None, parameters=None):
+    """
+    Run project lines one by one and record the wall time of each line.
+
+    The line times are not measured by Simplace: every line is opened and
+    run on its own and timed in python, so the times contain the
+    preparation of the session and differ from the share of the line in a
+    run of all lines together.
+
+    Args:
+        simplaceInstance: handle to the SimplaceWrapper object returned by
+            initSimplace
+        solution (str): path to solution file
+        project (str): path to project file
+        lines (str): line specification, e.g. "1-40,50" or list of lines
+        profiler (Profiler): profiler to use (optional, a new one is created)
+        parameters (dict): parameters passed to openProject (optional)
+
+    Returns:
+        Profiler : profiler with component and line timings
+    """
+    if profiler is None:
+        profiler = Profiler()
+    for line in simplace.projectLinesToList(lines):
+        start = time.perf_counter()
+        with profiler:
+            simplace.runProjectLines(simplaceInstance, solution, project,
+                                     [line], parameters)
+        profiler.lines.append((line, time.perf_counter() - start))
+    return profiler
@@ -0,0 +1,347 @@
+"""
+Run project lines dynamically on several Simplace worker processes.
+
+Project lines are handed out in small batches to worker processes, each
+running its own java virtual machine. The runtimes of the lines are learned
+from previous runs and stored in a small SQLite database, so that the longest
+lines are scheduled first and the batches get smaller towards the end of the
+run.
+
+**Example** - *Running a project on four workers:*
+
+    >>> import simplace
+    >>> report = simplace.runProjectScheduled(
+    ...     '/sol/Maize.sol.xml', '/proj/NRW.proj.xml', '1-4000',
+    ...     workers=4, costDatabase='/out/linecosts.sqlite',
+    ...     initArgs={'installDir':'/ws/', 'outputDir':'/out/'})
+    >>> print(report['seconds'], len(report['failed']))
+    1830.2 0
+
+"""
+
+import multiprocessing
+import os
+import queue
+import sqlite3
+import sys
+import time
+import traceback
+
+import numpy
+
+import simplace
+
+
+class LineCostModel:
+    """Runtimes of project lines, learned from previous runs.
+
+    Args:
+        path (str): SQLite database file. If not given, the model is kept
+            in memory only
+        key (str): identifies the solution/project the lines belong to
+        alpha (float): weight of a new measurement when it is blended with
+            the stored runtime
+    """
+
+    def __init__(self, path=None, key='', alpha=0.5):
+        if path is None:
+            path = ':memory:'
+        elif os.path.dirname(path) != '':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.key = key
+        self.alpha = alpha
+        self._db = sqlite3.connect(path)
+        self._db.execute('CREATE TABLE IF NOT EXISTS linecost '
+                         '(key TEXT, line INTEGER, seconds REAL, '
+                         'runs INTEGER, PRIMARY KEY (key, line))')
+        self._db.commit()
+
+    def close(self):
+        """Close the database."""
+        self._db.close()
+
+    def known(self):
+        """Get all stored runtimes as dictionary line -> seconds."""
+        rows = self._db.execute('SELECT line, seconds FROM linecost '
+                                'WHERE key=?', (self.key,))
+        return dict(rows.fetchall())
+
+    def predict(self, lines):
+        """
+        Predict the runtime of project lines.
+
+        Lines without a stored runtime get the median of the known lines
+        (or 1.0 if nothing is known yet).
+
+        Args:
+            lines (list): list of line numbers
+
+        Returns:
+            list : predicted seconds for each line
+        """
+        known = self.known()
+        if len(known) > 0:
+            values = sorted(known.values())
+            default = values[len(values) // 2]
+        else:
+            default = 1.0
+        return [known.get(line, default) for line in lines]
+
+    def update(self, lines, seconds):
+        """
+        Store the measured runtime of a batch of lines.
+
+        The batch time is apportioned to the lines according to their
+        predicted share and blended with the stored runtimes.
+
+        Args:
+            lines (list): line numbers of the batch
+            seconds (float): measured wall time of the batch
+        """
+        predicted = self.predict(lines)
+        total = sum(predicted)
+        known = self.known()
+        rows = []
+        for line, p in zip(lines, predicted):
+            observed = seconds * p / total if total > 0 else seconds / len(lines)
+            if line in known:
+                observed = self.alpha * observed + (1 - self.alpha) * known[line]
+            rows.append((self.key, line, observed, self.key, line))
+        self._db.executemany(
+            'INSERT OR REPLACE INTO linecost VALUES (?, ?, ?, '
+            'COALESCE((SELECT runs FROM linecost WHERE key=? AND line=?), 0) + 1)',
+            rows)
+        self._db.commit()
+
+
+def planBatches(lines, costs, workers, minBatchSize=1, maxBatchSize=None):
+    """
+    Split project lines into batches, longest lines first.
+
+    The lines are sorted by decreasing cost. Each batch is filled until it
+    reaches a target cost, which is a fraction of the remaining cost per
+    worker, so the batches become smaller towards the end of the run.
+
+    Args:
+        lines (list): line numbers
+        costs (list): predicted cost of every line
+        workers (int): number of workers
+        minBatchSize (int): minimal number of lines per batch
+        maxBatchSize (int): maximal number of lines per batch (optional)
+
+    Returns:
+        list : list of batches, each a list of line numbers
+    """
+    order = sorted(zip(costs, lines), key=lambda z: (-z[0], z[1]))
+    remaining = float(sum(costs))
+    batches = []
+    i = 0
+    while i < len(order):
+        target = remaining / (2 * workers)
+        batch = []
+        cost = 0.0
+        while i < len(order) and (len(batch) < minBatchSize or cost < target):
+            if maxBatchSize is not None and len(batch) >= maxBatchSize:
+                break
+            cost += order[i][0]
+            batch.append(order[i][1])
+            i += 1
+        remaining -= cost
+        batches.append(batch)
+    return batches
+
+
+def runProjectScheduled(solution, project, lines, workers=None,
+                        costDatabase=None, initArgs=None, parameters=None,
+                        slotCount=1, outputs=None, resultDir=None,
+                        minBatchSize=1, maxBatchSize=None, verbose=False,
+                        format='npz', progress=None):
+    """
+    Run project lines on several worker processes with dynamic batches.
+
+    Every worker starts its own java virtual machine and pulls the next
+    batch of lines when it has finished the previous one.
+
+    Args:
+        solution (str): path to solution file
+        project (str): path to project file
+        lines (str): line specification, e.g. "1-400,500" or list of lines
+        workers (int): number of worker processes (default number of cpus)
+        costDatabase (str): SQLite file where line runtimes are stored
+            (optional, without it nothing is learned across runs)
+        initArgs (dict): keyword arguments passed to initSimplace
+        parameters (dict): parameters passed to openProject (optional)
+        slotCount (int): number of cores each worker uses
+        outputs (list): names of memory outputs that are saved for every
+            batch as .npz file in resultDir (optional)
+        resultDir (str): directory for the memory outputs
+        minBatchSize (int): minimal number of lines per batch
+        maxBatchSize (int): maximal number of lines per batch (optional)
+        verbose (bool): print progress messages
+        format (str): file format of the outputs, 'npz' or 'parquet'
+            (requires the optional package pyarrow)
+        progress (function): called with the record of every finished
+            batch and the report so far (optional)
+
+    Returns:
+        dict : run report with the keys 'seconds' (wall time), 'batches'
+        (list with lines, worker, seconds, rows, peak memory and files of
+        each batch) and 'failed' (batches that raised an error, were
+        running in a crashed worker or couldn't be run because all workers
+        terminated)
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if outputs is not None and resultDir is None:
+        raise ValueError('resultDir is required when outputs are given')
+    if format not in _FORMATS:
+        raise ValueError('format must be one of ' + ', '.join(_FORMATS))
+    lines = simplace.projectLinesToList(lines)
+    model = LineCostModel(costDatabase, _projectKey(solution, project))
+    batches = planBatches(lines, model.predict(lines), workers,
+                          minBatchSize, maxBatchSize)
+    config = {'initArgs': initArgs or {}, 'solution': solution,
+              'project': project, 'parameters': parameters,
+              'slotCount': slotCount, 'outputs': outputs,
+              'resultDir': resultDir, 'format': format}
+
+    ctx = multiprocessing.get_context('spawn')
+    tasks = ctx.Queue()
+    results = ctx.Queue()
+    for number, batch in enumerate(batches):
+        tasks.put((number, batch))
+    workers = min(workers, len(batches))
+    for _ in range(workers):
+        tasks.put(None)
+    processes = [ctx.Process(target=_worker, args=(config, tasks, results))
+                 for _ in range(workers)]
+
+    start = time.perf_counter()
+    for p in processes:
+        p.start()
+    report = {'batches': [], 'failed': []}
+    running = {}
+    finished = set()
+    try:
+        while len(finished) < len(batches):
+            try:
+                record = results.get(timeout=1.0)
+            except queue.Empty:
+                for record in _crashedBatches(processes, running):
+                    finished.add(record['batch'])
+                    report['failed'].append(record)
+                    if progress is not None:
+                        progress(record, report)
+                if not any(p.is_alive() for p in processes):
+                    for number, batch in enumerate(batches):
+                        if number not in finished:
+                            report['failed'].append(_failedRecord(
+                                number, batch, None, 'All Simplace workers '
+                                'terminated before the batch was run'))
+                    break
+                continue
+            if 'started' in record:
+                running[record['worker']] = (record['batch'], record['lines'])
+                continue
+            running.pop(record['worker'], None)
+            finished.add(record['batch'])
+            if record['error'] is None:
+                model.update(record['lines'], record['seconds'])
+                report['batches'].append(record)
+            else:
+                report['failed'].append(record)
+            if verbose:
+                print('batch %d (%d lines) finished in %.1fs by worker %d'
+                      % (record['batch'], len(record['lines']),
+                         record['seconds'], record['worker']))
+            if progress is not None:
+                progress(record, report)
+    finally:
+        for p in processes:
+            p.join(timeout=10)
+            if p.is_alive():
+                p.terminate()
+        model.close()
+    report['seconds'] = time.perf_counter() - start
+    return report
+
+
+# Helper Functions
+
+_FORMATS = ['npz', 'parquet']
+
+def _projectKey(solution, project):
+    return os.path.abspath(solution) + '|' + (
+        os.path.abspath(project) if project is not None else '')
+
+def _failedRecord(number, batch, worker, error):
+    return {'batch': number, 'lines': batch, 'worker': worker, 'files': [],
+            'rows': 0, 'error': error, 'seconds': None, 'peakMemory': None}
+
+def _crashedBatches(processes, running):
+    crashed = []
+    for p in processes:
+        if not p.is_alive() and p.pid in running:
+            number, batch = running.pop(p.pid)
+            crashed.append(_failedRecord(
+                number, batch, p.pid, 'Simplace worker terminated with '
+                'exit code %s' % p.exitcode))
+    return crashed
+
+def _runBatch(sh, config, number, batch):
+    data = simplace.runProjectLines(sh, config['solution'], config['project'],
+                                    batch, config['parameters'],
+                                    config['outputs'])
+    files = []
+    rows = 0
+    for output, columns in data.items():
+        path = os.path.join(config['resultDir'], '%s_%06d.%s'
+                            % (output, number, config.get('format', 'npz')))
+        _saveColumns(path, columns)
+        files.append(path)
+        rows += max([len(v) for v in columns.values()] or [0])
+    return files, rows
+
+def _saveColumns(path, data):
+    if path.endswith('.parquet'):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError('Writing parquet files requires the package pyarrow')
+        table = pyarrow.table({k: numpy.asarray(v) for k, v in data.items()})
+        pyarrow.parquet.write_table(table, path)
+    else:
+        numpy.savez(path, **{k: numpy.asarray(v) for k, v in data.items()})
+
+def _peakMemory():
+    try:
+        import resource
+    except ImportError:
+        return None
+    kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return kb * 1024 if sys.platform != 'darwin' else kb
+
+def _worker(config, tasks, results):
+    sh = simplace.initSimplace(**config['initArgs'])
+    simplace.setSlotCount(config['slotCount'])
+    if config['resultDir'] is not None:
+        os.makedirs(config['resultDir'], exist_ok=True)
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        number, batch = task
+        results.put({'started': True, 'batch': number, 'lines': batch,
+                     'worker': os.getpid()})
+        start = time.perf_counter()
+        record = {'batch': number, 'lines': batch, 'worker': os.getpid(),
+                  'files': [], 'rows': 0, 'error': None}
+        try:
+            record['files'], record['rows'] = _runBatch(sh, config, number,
+                                                        batch)
+        except Exception:
+            record['error'] = traceback.format_exc()
+        record['seconds'] = time.perf_counter() - start
+        record['peakMemory'] = _peakMemory()
+        results.put(record)
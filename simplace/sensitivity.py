@@ -0,0 +1,311 @@
+"""
+Sobol and Morris sensitivity indices updated batch by batch.
+
+The estimators only keep running means and variances, so the outputs of a
+batch of simulations can be discarded as soon as the batch has been added.
+Memory doesn't grow with the number of samples. Confidence intervals are
+computed by Poisson bootstrap: every replicate weights each sample with a
+Poisson(1) distributed count, which can be drawn without knowing the total
+sample size in advance.
+
+Sobol indices use the Saltelli estimator for the first order and the Jansen
+estimator for the total order indices. Morris statistics are the mean (mu),
+mean of absolute values (mu*) and standard deviation (sigma) of the
+elementary effects.
+
+**Example** - *Sobol indices of the yield:*
+
+    >>> import simplace, simplace.sensitivity as sa
+    >>> bounds = {'vLUE':(2.5,3.5), 'vTBase':(6,10)}
+    >>> sobol = sa.SobolAccumulator(list(bounds))
+    >>> for batch in range(100):
+    ...     A, B, AB = sa.saltelliSample(bounds, 1000)
+    ...     fA, fB = evaluate(A), evaluate(B)
+    ...     fAB = numpy.stack([evaluate(ab) for ab in AB], axis=1)
+    ...     sobol.update(fA, fB, fAB)
+    >>> print(sobol.indices()['ST'])
+    [ 0.81  0.22]
+
+"""
+
+import numpy
+
+
+class SobolAccumulator:
+    """First and total order Sobol indices from streamed samples.
+
+    Args:
+        names (list): names of the parameters
+        bootstrap (int): number of bootstrap replicates for the confidence
+            intervals (0 for none)
+        seed (int): seed of the random generator for the bootstrap weights
+    """
+
+    def __init__(self, names, bootstrap=200, seed=None):
+        self.names = list(names)
+        self.bootstrap = bootstrap
+        self._rng = numpy.random.default_rng(seed)
+        k = len(self.names)
+        self._variance = _Moments(bootstrap + 1, 1)
+        self._first = _Moments(bootstrap + 1, k)
+        self._total = _Moments(bootstrap + 1, k)
+
+    @property
+    def samples(self):
+        """Number of base samples added so far."""
+        return int(self._first.weight[0])
+
+    def update(self, fA, fB, fAB):
+        """
+        Add a batch of model outputs.
+
+        Args:
+            fA (numpy.ndarray): outputs for the rows of sample matrix A (n)
+            fB (numpy.ndarray): outputs for the rows of sample matrix B (n)
+            fAB (numpy.ndarray): outputs for the matrices A with column i
+                taken from B (n x k)
+        """
+        fA = numpy.asarray(fA, dtype=float).ravel()
+        fB = numpy.asarray(fB, dtype=float).ravel()
+        fAB = numpy.asarray(fAB, dtype=float).reshape(len(fA), -1)
+        if fAB.shape[1] != len(self.names):
+            raise ValueError('fAB needs one column per parameter')
+        weights = _weights(self._rng, self.bootstrap, len(fA))
+        self._variance.update(numpy.r_[fA, fB][:, None],
+                              numpy.concatenate([weights, weights], axis=1))
+        self._first.update(fB[:, None] * (fAB - fA[:, None]), weights)
+        self._total.update((fA[:, None] - fAB) ** 2, weights)
+
+    def merge(self, other):
+        """Add the samples of another accumulator (e.g. from another worker)."""
+        self._variance.merge(other._variance)
+        self._first.merge(other._first)
+        self._total.merge(other._total)
+
+    def indices(self, confidence=0.95):
+        """
+        Get the current estimates.
+
+        Args:
+            confidence (float): level of the bootstrap confidence intervals
+
+        Returns:
+            dict : arrays 'S1' and 'ST' (one value per parameter) and the
+            bounds of their confidence intervals 'S1_low', 'S1_high',
+            'ST_low' and 'ST_high'
+        """
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            v = self._variance.variance()
+            s1 = self._first.mean / v
+            st = self._total.mean / (2 * v)
+        return _withIntervals({'S1': s1, 'ST': st}, confidence)
+
+
+class MorrisAccumulator:
+    """Morris statistics of streamed elementary effects.
+
+    Args:
+        names (list): names of the parameters
+        bootstrap (int): number of bootstrap replicates for the confidence
+            intervals (0 for none)
+        seed (int): seed of the random generator for the bootstrap weights
+    """
+
+    def __init__(self, names, bootstrap=200, seed=None):
+        self.names = list(names)
+        self.bootstrap = bootstrap
+        self._rng = numpy.random.default_rng(seed)
+        k = len(self.names)
+        self._effects = _Moments(bootstrap + 1, k)
+        self._absolute = _Moments(bootstrap + 1, k)
+
+    @property
+    def samples(self):
+        """Number of trajectories added so far."""
+        return int(self._effects.weight[0])
+
+    def update(self, effects):
+        """
+        Add a batch of elementary effects.
+
+        Args:
+            effects (numpy.ndarray): elementary effects (trajectories x
+                parameters), e.g. from elementaryEffects()
+        """
+        effects = numpy.asarray(effects, dtype=float).reshape(
+            -1, len(self.names))
+        weights = _weights(self._rng, self.bootstrap, len(effects))
+        self._effects.update(effects, weights)
+        self._absolute.update(numpy.abs(effects), weights)
+
+    def merge(self, other):
+        """Add the trajectories of another accumulator."""
+        self._effects.merge(other._effects)
+        self._absolute.merge(other._absolute)
+
+    def indices(self, confidence=0.95):
+        """
+        Get the current estimates.
+
+        Args:
+            confidence (float): level of the bootstrap confidence intervals
+
+        Returns:
+            dict : arrays 'mu', 'mu_star' and 'sigma' (one value per
+            parameter) and the bounds of their confidence intervals (suffix
+            '_low' and '_high')
+        """
+        return _withIntervals({'mu': self._effects.mean,
+                               'mu_star': self._absolute.mean,
+                               'sigma': numpy.sqrt(self._effects.variance(1))},
+                              confidence)
+
+
+def saltelliSample(bounds, n, seed=None):
+    """
+    Draw a batch of samples for the Sobol estimators.
+
+    Args:
+        bounds (dict): parameter names as keys, (low, high) as values
+        n (int): number of base samples
+        seed (int or numpy.random.Generator): random generator or seed
+
+    Returns:
+        tuple : matrices A and B (n x k) and AB (k x n x k), where AB[i] is
+        A with column i taken from B
+    """
+    rng = numpy.random.default_rng(seed)
+    k = len(bounds)
+    A = scaleSample(rng.random((n, k)), bounds)
+    B = scaleSample(rng.random((n, k)), bounds)
+    AB = numpy.repeat(A[None, :, :], k, axis=0)
+    for i in range(k):
+        AB[i, :, i] = B[:, i]
+    return A, B, AB
+
+def morrisSample(bounds, trajectories, levels=4, seed=None):
+    """
+    Draw Morris trajectories (one-at-a-time steps through a grid).
+
+    Args:
+        bounds (dict): parameter names as keys, (low, high) as values
+        trajectories (int): number of trajectories
+        levels (int): number of grid levels per parameter
+        seed (int or numpy.random.Generator): random generator or seed
+
+    Returns:
+        numpy.ndarray : points (trajectories x k+1 x k) in parameter space
+    """
+    rng = numpy.random.default_rng(seed)
+    k = len(bounds)
+    delta = levels / (2.0 * (levels - 1))
+    grid = numpy.arange(levels) / (levels - 1.0)
+    points = numpy.empty((trajectories, k + 1, k))
+    points[:, 0, :] = rng.choice(grid, size=(trajectories, k))
+    for t in range(trajectories):
+        x = points[t, 0].copy()
+        for j, i in enumerate(rng.permutation(k)):
+            x[i] = x[i] + delta if x[i] + delta <= 1.0 else x[i] - delta
+            points[t, j + 1] = x
+    return scaleSample(points, bounds)
+
+def elementaryEffects(points, outputs, bounds):
+    """
+    Compute the elementary effects of Morris trajectories.
+
+    Args:
+        points (numpy.ndarray): trajectories as returned by morrisSample
+        outputs (numpy.ndarray): model output for every point
+            (trajectories x k+1)
+        bounds (dict): parameter bounds used for the sample, effects are
+            computed for the parameters scaled to [0, 1]
+
+    Returns:
+        numpy.ndarray : elementary effects (trajectories x k)
+    """
+    low, high = _bounds(bounds)
+    unit = (numpy.asarray(points, dtype=float) - low) / (high - low)
+    outputs = numpy.asarray(outputs, dtype=float)
+    steps = numpy.diff(unit, axis=1)
+    changed = numpy.argmax(numpy.abs(steps), axis=2)
+    delta = numpy.take_along_axis(steps, changed[:, :, None], axis=2)[:, :, 0]
+    effects = numpy.empty(changed.shape)
+    rows = numpy.arange(len(changed))[:, None]
+    effects[rows, changed] = numpy.diff(outputs, axis=1) / delta
+    return effects
+
+def scaleSample(unit, bounds):
+    """
+    Scale a sample from the unit cube to the parameter bounds.
+
+    Args:
+        unit (numpy.ndarray): values in [0, 1], last axis are the parameters
+        bounds (dict): parameter names as keys, (low, high) as values
+
+    Returns:
+        numpy.ndarray : scaled values
+    """
+    low, high = _bounds(bounds)
+    return low + numpy.asarray(unit) * (high - low)
+
+
+# Helper Functions
+
+class _Moments:
+    """Weighted running mean and sum of squared deviations per replicate."""
+
+    def __init__(self, replicates, k):
+        self.weight = numpy.zeros(replicates)
+        self.mean = numpy.zeros((replicates, k))
+        self.m2 = numpy.zeros((replicates, k))
+
+    def update(self, values, weights):
+        center = values.mean(axis=0)
+        d = values - center
+        w = weights.sum(axis=1)
+        s1 = weights @ d
+        s2 = weights @ (d * d)
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            mean = numpy.where(w[:, None] > 0, center + s1 / w[:, None], 0.0)
+            m2 = numpy.where(w[:, None] > 0, s2 - s1 * s1 / w[:, None], 0.0)
+        self._combine(w, mean, m2)
+
+    def merge(self, other):
+        self._combine(other.weight, other.mean, other.m2)
+
+    def _combine(self, w, mean, m2):
+        total = self.weight + w
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            f = numpy.where(total > 0, w / total, 0.0)[:, None]
+        delta = mean - self.mean
+        self.mean = self.mean + delta * f
+        self.m2 = self.m2 + m2 + delta * delta * self.weight[:, None] * f
+        self.weight = total
+
+    def variance(self, ddof=0):
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            return self.m2 / (self.weight[:, None] - ddof)
+
+def _weights(rng, bootstrap, n):
+    weights = numpy.ones((bootstrap + 1, n))
+    if bootstrap > 0:
+        weights[1:] = rng.poisson(1.0, size=(bootstrap, n))
+    return weights
+
+def _withIntervals(estimates, confidence):
+    alpha = 100 * (1 - confidence) / 2
+    out = {}
+    for name, values in estimates.items():
+        out[name] = values[0]
+        if len(values) > 1:
+            low, high = numpy.nanpercentile(values[1:], [alpha, 100 - alpha],
+                                            axis=0)
+        else:
+            low = high = numpy.full_like(values[0], numpy.nan)
+        out[name + '_low'] = low
+        out[name + '_high'] = high
+    return out
+
+def _bounds(bounds):
+    b = numpy.asarray(list(bounds.values()), dtype=float)
+    return b[:, 0], b[:, 1]
@@ -27,15 +27,55 @@ framework http://www.simplace.net/
 
 """
 
-import jpype
 import os
-import numpy
+import hashlib
+import collections
+import importlib
+
+__all__ = [
+    'initSimplace', 'shutDown', 'initSimplaceDefault',
+    'openProject', 'closeProject',
+    'setProjectLines', 'projectLinesToList', 'projectLinesToString',
+    'runProject', 'runProjectLines',
+    'ParameterTemplate', 'createSimulation', 'getSimulationIDs',
+    'setSimulationValues', 'setAllSimulationValues',
+    'runSimulations', 'stepSimulation', 'stepAllSimulations',
+    'getResult', 'resultToList', 'varmapToList',
+    'getUnitsOfResult', 'getDatatypesOfResult',
+    'setSimplaceDirectories', 'getSimplaceDirectories',
+    'setSlotCount', 'setLogLevel', 'setParameterCacheSize', 'setCheckLevel',
+    'findSimplaceInstallations', 'findFirstSimplaceInstallation',
+]
+
+
+class LazyModule:
+    """Module that is imported on the first access of one of its attributes.
+
+    Args:
+        name (str): name of the module, e.g. 'numpy'
+    """
+
+    def __init__(self, name):
+        self.__dict__['_lazyName'] = name
+
+    def __getattr__(self, attribute):
+        module = importlib.import_module(self._lazyName)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attribute)
+
+    def __repr__(self):
+        return '<lazy module %r>' % self._lazyName
+
+
+jpype = LazyModule('jpype')
+numpy = LazyModule('numpy')
 
 # Initialisation
 
 def initSimplace (installDir = None, workDir = None, outputDir = None,
                   projectsDir = None, dataDir = None,
-                  additionalClasspathList=[], javaParameters=None):
+                  additionalClasspathList=[], javaParameters=None,
+                  autoJava=None):
     """Initialisation of Simplace
 
     Start the java virtual machine and initialize
@@ -51,6 +91,13 @@ def initSimplace (installDir = None, workDir = None, outputDir = None,
         additionalClasspathList (list): List with addtional classpaths
         javaParameters (str[]): Parameter list passed to the java virtual
             machine
+        autoJava (dict): if given, heap size and garbage collector are
+            derived from the workload, e.g. {'slotCount':4,
+            'projectLines':2000}. Keys are the arguments of
+            jvm.autoJavaParameters, True uses the defaults. The derived
+            heap size is left out if javaParameters contain -Xmx, the
+            derived garbage collector if they select one with
+            -XX:+Use...GC (optional)
 
     Returns:
         SimplaceWrapper : A reference to an instance of SimplaceWrapper
@@ -92,6 +139,11 @@ def initSimplace (installDir = None, workDir = None, outputDir = None,
         javaParameters=[]
     if isinstance(javaParameters,str):
         javaParameters=[javaParameters]
+    if autoJava:
+        from simplace import jvm
+        hints = autoJava if isinstance(autoJava, dict) else {}
+        javaParameters = _mergeJavaParameters(
+            jvm.autoJavaParameters(**hints), javaParameters)
 
     jpype.startJVM(*javaParameters, jvmpath=jpype.getDefaultJVMPath(), classpath=allcplist, ignoreUnrecognized=True, convertStrings=False)
     Wrapper = jpype.JClass('net.simplace.sim.wrapper.SimplaceWrapper')
@@ -106,6 +158,8 @@ def shutDown(simplaceInstance):
         simplaceInstance: handle to the SimplaceWrapper object returned by
             initSimplace
     """
+    for state in (_sessions, _directories, _projectLines):
+        state.pop(simplaceInstance, None)
     simplaceInstance.shutDown()
     jpype.java.lang.System.exit(0)
 
@@ -145,10 +199,20 @@ def initSimplaceDefault(setting="run"):
 
 # Open and close Project
 
-def openProject(simplaceInstance,solution, project=None, parameters=None):
+def openProject(simplaceInstance,solution, project=None, parameters=None,
+                reuse=False):
     """
     Initialises a project from the solution and optional project file.
 
+    If reuse is True and the same solution and project (same path,
+    modification time and content) with the same project lines are still
+    open, the prepared session is kept. Queued simulations and results of
+    earlier runs are cleared and changed parameters are applied to the
+    simulations created afterwards by createSimulation. For projects, if
+    parameters were removed or if the Simplace version can't clear the
+    queue or the results, the session is prepared again. Don't call
+    closeProject between reused openProject calls.
+
     Args:
         simplaceInstance : handle to the SimplaceWrapper object returned by
             initSimplace
@@ -156,9 +220,14 @@ def openProject(simplaceInstance,solution, project=None, parameters=None):
         project (str): path (abs. or rel. to workDir) to project file (optional)
         parameters (dict): key-value pairs where the key has to match the
             Simplace SimVariable name (optional)
+        reuse (bool): keep the prepared session if solution and project
+            are unchanged (optional)
 
     """
-    dirs = getSimplaceDirectories(simplaceInstance)
+    dirs = _directories.get(simplaceInstance)
+    if dirs is None:
+        dirs = getSimplaceDirectories(simplaceInstance)
+        _directories[simplaceInstance] = dirs
 
     if not os.path.exists(solution):
         newsolution = os.path.join(dirs['_WORKDIR_'], solution.lstrip("\\/"))
@@ -169,8 +238,32 @@ def openProject(simplaceInstance,solution, project=None, parameters=None):
         if os.path.exists(newproject):
             project = newproject
 
+    if reuse:
+        fingerprint = (_fileFingerprint(solution), _fileFingerprint(project),
+                       _projectLines.get(simplaceInstance))
+        values = {} if parameters is None else {k: parameters[k]
+                                                for k in parameters.keys()}
+        session = _sessions.get(simplaceInstance)
+        if session is not None and session['fingerprint'] == fingerprint \
+                and set(session['parameters']).issubset(values):
+            changed = {k: v for k, v in values.items()
+                       if k not in session['parameters']
+                       or not _sameValue(session['parameters'][k], v)}
+            if (project is None or len(changed) == 0) \
+                    and _clearSession(simplaceInstance, session):
+                session['overrides'] = changed
+                return
+    else:
+        fingerprint = None
+        values = None
+
+    _sessions.pop(simplaceInstance, None)
     par = _parameterListToArray(parameters)
     simplaceInstance.prepareSession(project, solution, par)
+    if reuse:
+        _sessions[simplaceInstance] = {'fingerprint': fingerprint,
+                                       'parameters': values, 'overrides': {},
+                                       'results': False}
 
 def closeProject(simplaceInstance):
     """
@@ -180,6 +273,8 @@ def closeProject(simplaceInstance):
         simplaceInstance: handle to the SimplaceWrapper object returned by
             initSimplace
     """
+    _sessions.pop(simplaceInstance, None)
+    _directories.pop(simplaceInstance, None)
     simplaceInstance.shutDown()
 
 
@@ -195,23 +290,184 @@ def setProjectLines(simplaceInstance, lines):
         lines (str): a string with line specifications, e.g. "3-10,15,30-33"
             or a list of linenumbers [1,2,9,11]
     """
-    if type(lines) is list :
-        lines = ','.join([str(i) for i in lines])
+    if type(lines) is not str :
+        lines = projectLinesToString(lines)
+    _projectLines[simplaceInstance] = lines
     simplaceInstance.setProjectLines(lines)
 
-def runProject(simplaceInstance):
+def projectLinesToList(lines):
+    """
+    Expand a line specification to a sorted list of line numbers.
+
+    Args:
+        lines (str): a string with line specifications, e.g. "3-10,15,30-33"
+            or a list of linenumbers [1,2,9,11]
+
+    Returns:
+        list : sorted list of unique line numbers
+    """
+    if type(lines) is not str :
+        return sorted(set(int(i) for i in lines))
+    numbers = set()
+    for part in lines.split(','):
+        part = part.strip()
+        if part == '':
+            continue
+        if '-' in part:
+            first, last = part.split('-', 1)
+            numbers.update(range(int(first), int(last) + 1))
+        else:
+            numbers.add(int(part))
+    return sorted(numbers)
+
+def projectLinesToString(lines):
+    """
+    Compress line numbers to a line specification with ranges.
+
+    Args:
+        lines (list): list of line numbers, e.g. [3,4,5,6,15]
+
+    Returns:
+        str : line specification, e.g. "3-6,15"
+    """
+    numbers = projectLinesToList(lines)
+    parts = []
+    i = 0
+    while i < len(numbers):
+        j = i
+        while j + 1 < len(numbers) and numbers[j + 1] == numbers[j] + 1:
+            j += 1
+        if j > i:
+            parts.append('%d-%d' % (numbers[i], numbers[j]))
+        else:
+            parts.append(str(numbers[i]))
+        i = j + 1
+    return ','.join(parts)
+
+def runProject(simplaceInstance, profiler=None):
     """
     Run the project.
 
     Args:
         simplaceInstance: handle to the SimplaceWrapper object returned by
             initSimplace
+        profiler (Profiler): samples the component timings during the run
+            (optional)
+    """
+    _sessionHasResults(simplaceInstance)
+    if profiler is not None:
+        with profiler:
+            simplaceInstance.run()
+    else:
+        simplaceInstance.run()
+
+def runProjectLines(simplaceInstance, solution, project, lines,
+                    parameters=None, outputs=None):
+    """
+    Run selected lines of a project and fetch its memory outputs.
+
+    Sets the project lines, opens the project, runs it and closes it
+    afterwards, so that the memory of the outputs is released again.
+
+    Args:
+        simplaceInstance: handle to the SimplaceWrapper object returned by
+            initSimplace
+        solution (str): path to solution file
+        project (str): path to project file
+        lines (str): line specification, e.g. "3-10,15" or list of lines
+        parameters (dict): key-value pairs where the key has to match the
+            Simplace SimVariable name (optional)
+        outputs (list): names of memory outputs to fetch (optional)
+
+    Returns:
+        dict : memory output names as keys, converted results (as returned
+        by resultToList) as values
     """
-    simplaceInstance.run()
+    setProjectLines(simplaceInstance, lines)
+    try:
+        openProject(simplaceInstance, solution, project, parameters)
+        runProject(simplaceInstance)
+        return {output: resultToList(getResult(simplaceInstance, output))
+                for output in (outputs or [])}
+    finally:
+        closeProject(simplaceInstance)
 
 
 # Creating, configuring and running simulations
 
+class ParameterTemplate:
+    """
+    Parameters converted once to java and updated value by value.
+
+    Can be passed everywhere a parameter dictionary is accepted. When only
+    some parameters change between simulations, update() converts just the
+    changed values, the other converted values are reused. The java
+    parameter array is built once; every simulation gets a shallow copy of
+    it, in which only the rows of changed parameters are new. Arrays of
+    unchanged parameters are shared between the simulations.
+
+    Args:
+        parameters (dict): key-value pairs where the key has to match the
+            Simplace SimVariable name
+
+    **Example** - *Sweeping one parameter:*
+
+        >>> tpl = simplace.ParameterTemplate({'vLUE':3.2,'vSLA':0.023,
+        ...                                   'vTable':numpy.arange(2000.0)})
+        >>> for lue in [2.8, 3.0, 3.2]:
+        ...     tpl.update({'vLUE':lue})
+        ...     simplace.createSimulation(sp, tpl)
+    """
+
+    def __init__(self, parameters):
+        self._index = {k: i for i, k in enumerate(parameters.keys())}
+        self._values = [_copyValue(v) for v in parameters.values()]
+        self._array = jpype.JArray(jpype.java.lang.Object, 2)(
+            [[k, _getScalarOrList(v)] for k, v in parameters.items()])
+
+    def keys(self):
+        """Get the parameter names."""
+        return list(self._index.keys())
+
+    def __getitem__(self, key):
+        return self._values[self._index[key]]
+
+    def __len__(self):
+        return len(self._index)
+
+    def set(self, key, value):
+        """
+        Set the value of a parameter, if it differs from the actual value.
+
+        Args:
+            key (str): name of a parameter of the template
+            value: new value
+        """
+        if key not in self._index:
+            raise KeyError('Parameter %s is not part of the template' % key)
+        i = self._index[key]
+        if _sameValue(self._values[i], value):
+            return
+        self._array[i] = jpype.JArray(jpype.java.lang.Object, 1)(
+            [self._array[i][0], _getScalarOrList(value)])
+        self._values[i] = _copyValue(value)
+
+    def update(self, parameters):
+        """
+        Set the values of several parameters.
+
+        Args:
+            parameters (dict): key-value pairs, keys have to be part of the
+                template
+        """
+        for k, v in parameters.items():
+            self.set(k, v)
+
+    def toArray(self):
+        """Get a shallow copy of the java parameter array."""
+        return self._array.clone()
+
+
 def createSimulation(simplaceInstance, parameters = None, queue=True):
     """
     Create a single simulation and set initial parameters.
@@ -220,7 +476,7 @@ def createSimulation(simplaceInstance, parameters = None, queue=True):
         simplaceInstance :  handle to the SimplaceWrapper object returned by
             initSimplace
         parameters (dict): key-value pairs where the key has to match the
-            Simplace SimVariable name (optional)
+            Simplace SimVariable name or a ParameterTemplate (optional)
         queue (bool): if true add the simulation to the queue of simulations,
             else empty the queue before adding the simulation
 
@@ -228,6 +484,11 @@ def createSimulation(simplaceInstance, parameters = None, queue=True):
         str : id of the created simulation
 
     """
+    session = _sessions.get(simplaceInstance)
+    if session is not None and len(session['overrides']) > 0:
+        values = {} if parameters is None else {k: parameters[k]
+                                                for k in parameters.keys()}
+        parameters = dict(session['overrides'], **values)
     par = _parameterListToArray(parameters)
     simplaceInstance.createSimulation(par)
     return str(getSimulationIDs(simplaceInstance)[-1])
@@ -270,7 +531,8 @@ def setAllSimulationValues(simplaceInstance, parameterlist):
     """
     simplaceInstance.setAllSimulationValues(_parameterListsToArray(parameterlist))
 
-def runSimulations(simplaceInstance, selectsimulation = False):
+def runSimulations(simplaceInstance, selectsimulation = False,
+                   profiler = None):
     """
     Run created simulations.
 
@@ -279,8 +541,15 @@ def runSimulations(simplaceInstance, selectsimulation = False):
             initSimplace
         selectsimulation (bool): if true, it keeps a selected simulation
             (not yet usable)
+        profiler (Profiler): samples the component timings during the run
+            (optional)
     """
-    simplaceInstance.runSimulations(selectsimulation)
+    _sessionHasResults(simplaceInstance)
+    if profiler is not None:
+        with profiler:
+            simplaceInstance.runSimulations(selectsimulation)
+    else:
+        simplaceInstance.runSimulations(selectsimulation)
 
 def stepSimulation(simplaceInstance, count=1, parameters=None, varFilter=None,
                    simulationnumber=0):
@@ -302,6 +571,7 @@ def stepSimulation(simplaceInstance, count=1, parameters=None, varFilter=None,
         VarMap : handle to simulation variables (possibly filtered). To access
         the variables, convert the result by varmapToList
     """
+    _sessionHasResults(simplaceInstance)
     par = _parameterListToArray(parameters)
     return simplaceInstance.stepSpecific(simulationnumber, par, varFilter,count)
 
@@ -323,6 +593,7 @@ def stepAllSimulations(simplaceInstance, count=1, parameterlist=None, varFilter=
         To access the variables, convert the items by varmapToList
 
     """
+    _sessionHasResults(simplaceInstance)
     par = _parameterListsToArray(parameterlist)
     return simplaceInstance.stepAll(par,varFilter,count)
 
@@ -445,6 +716,7 @@ def setSimplaceDirectories(simplaceInstance,
         projectsDir (str): path to projects directory
         dataDir (str): path to data directory
     """
+    _directories.pop(simplaceInstance, None)
     simplaceInstance.setDirectories(workDir, outputDir, projectsDir, dataDir)
 
 def getSimplaceDirectories(simplaceInstance):
@@ -482,6 +754,23 @@ def setLogLevel(level):
     LOGL = jpype.JClass('net.simplace.core.logging.Logger$LOGLEVEL')
     LOG.setLogLevel(LOGL.valueOf(level))
 
+def setParameterCacheSize(size):
+    """
+    Set how many converted parameter arrays are kept for reuse.
+
+    Large numpy arrays passed as parameters (e.g. interpolation tables) are
+    converted only once to java arrays. When an identical array is passed
+    again, every simulation gets a copy of the cached java array (made
+    within java), so changes of one simulation don't leak into others.
+
+    Args:
+        size (int): maximal number of cached arrays, 0 disables the cache
+    """
+    global _parameterCacheSize
+    _parameterCacheSize = size
+    while len(_parameterCache) > size:
+        _parameterCache.popitem(last=False)
+
 def setCheckLevel(simplaceInstance, level):
     """
     Set the checklevel of the solution. OFF does no checks,
@@ -569,6 +858,56 @@ def findFirstSimplaceInstallation(directories=[],
 
 # Helper Functions
 
+_sessions = {}
+_directories = {}
+_projectLines = {}
+_fileHashes = {}
+
+def _mergeJavaParameters(auto, explicit):
+    def isGc(p):
+        return p.startswith('-XX:+Use') and p.endswith('GC')
+    hasHeap = any(p.startswith('-Xmx') for p in explicit)
+    hasGc = any(isGc(p) for p in explicit)
+    hasThreads = any(p.startswith('-XX:ParallelGCThreads') for p in explicit)
+    kept = [p for p in auto
+            if not (hasHeap and p.startswith('-Xmx'))
+            and not (hasGc and (isGc(p) or p.startswith('-XX:ParallelGCThreads')))
+            and not (hasThreads and p.startswith('-XX:ParallelGCThreads'))]
+    return kept + list(explicit)
+
+def _fileFingerprint(path):
+    if path is None:
+        return None
+    st = os.stat(path)
+    path = os.path.abspath(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _fileHashes.get(path)
+    if cached is None or cached[0] != stamp:
+        h = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        cached = (stamp, h.hexdigest())
+        _fileHashes[path] = cached
+    return (path, cached[1])
+
+def _sessionHasResults(simplaceInstance):
+    session = _sessions.get(simplaceInstance)
+    if session is not None:
+        session['results'] = True
+
+def _clearSession(simplaceInstance, session):
+    if len(simplaceInstance.getSimulationIDs()) > 0:
+        if not hasattr(simplaceInstance, 'resetSimulationQueue'):
+            return False
+        simplaceInstance.resetSimulationQueue()
+    if session['results']:
+        if not hasattr(simplaceInstance, 'clearResults'):
+            return False
+        simplaceInstance.clearResults()
+        session['results'] = False
+    return True
+
 
 def _objectArrayToData(obj, simplaceType, expand = True, legacy = False):
     if legacy:
@@ -647,6 +986,8 @@ def _objectToDataNew(obj, simplaceType, expand = True):
 def _parameterListToArray(parameter):
     if parameter is None:
         return None
+    elif isinstance(parameter, ParameterTemplate):
+        return parameter.toArray()
     else:
         return jpype.JArray(jpype.java.lang.Object, 2)(
           [[k, _getScalarOrList(v)] for k, v in parameter.items()])
@@ -656,18 +997,78 @@ def _parameterListsToArray(parameterlist):
         return None
     else:
         return jpype.JArray(jpype.java.lang.Object, 3)(
-          [[[k, _getScalarOrList(v)] for k, v in par.items()]
-           for par in parameterlist])
+          [_parameterListToArray(par) for par in parameterlist])
 
+def _copyValue(value):
+    if isinstance(value, (list, numpy.ndarray)):
+        return value.copy()
+    else:
+        return value
+
+def _sameValue(old, new):
+    if type(old) is not type(new):
+        return False
+    elif isinstance(old, numpy.ndarray):
+        return old.dtype == new.dtype and numpy.array_equal(old, new)
+    else:
+        try:
+            return bool(old == new)
+        except ValueError:
+            return False
+
+
+_parameterCache = collections.OrderedDict()
+_parameterCacheSize = 64
+_parameterCacheMinLength = 16
 
 def _getScalarOrList(obj):
-    if type(obj) is list:
-        if all(type(a) is int for a in obj) :
+    if type(obj) is list or type(obj) is tuple:
+        if len(obj) == 0:
             return jpype.JArray(jpype.JInt, 1)(obj)
-        else:
+        arr = numpy.asarray(obj)
+        if arr.dtype.kind not in 'biuf':
             return jpype.JArray(jpype.JDouble, 1)(obj)
+        return _numpyToJava(arr)
+    elif isinstance(obj, numpy.ndarray):
+        if obj.ndim == 0:
+            return _getScalarOrList(obj[()])
+        return _numpyToJava(obj)
+    elif isinstance(obj, (bool, numpy.bool_)):
+        return jpype.java.lang.Boolean(bool(obj))
+    elif type(obj) is int or isinstance(obj, numpy.integer):
+        return jpype.java.lang.Integer(int(obj))
+    elif isinstance(obj, numpy.floating):
+        return jpype.java.lang.Double(float(obj))
     else:
-        if type(obj) is int :
-            return jpype.java.lang.Integer(obj)
-        else:
-            return obj
\ No newline at end of file
+        return obj
+
+def _numpyToJava(arr):
+    kind = arr.dtype.kind
+    if kind == 'b':
+        jtype, dtype = jpype.JBoolean, numpy.bool_
+    elif kind in 'iu':
+        if arr.size > 0 and (arr.min() < -2**31 or arr.max() >= 2**31):
+            raise OverflowError('Integer parameter values exceed java int')
+        jtype, dtype = jpype.JInt, numpy.int32
+    elif kind == 'f':
+        jtype, dtype = jpype.JDouble, numpy.float64
+    else:
+        return jpype.JArray(jpype.JDouble, max(arr.ndim, 1))(arr.tolist())
+    arr = numpy.ascontiguousarray(arr, dtype=dtype)
+    if arr.size < _parameterCacheMinLength or _parameterCacheSize <= 0:
+        return jpype.JArray(jtype, arr.ndim)(arr)
+    key = (arr.dtype.str, arr.shape, hashlib.blake2b(arr).digest())
+    jarr = _parameterCache.get(key)
+    if jarr is None:
+        jarr = jpype.JArray(jtype, arr.ndim)(arr)
+        _parameterCache[key] = jarr
+        if len(_parameterCache) > _parameterCacheSize:
+            _parameterCache.popitem(last=False)
+    else:
+        _parameterCache.move_to_end(key)
+    return _cloneJavaArray(jarr)
+
+def _cloneJavaArray(jarr):
+    if len(jarr) == 0 or not isinstance(jarr[0], jpype.JArray):
+        return jarr.clone()
+    return type(jarr)([_cloneJavaArray(row) for row in jarr])
\ No newline at end of file
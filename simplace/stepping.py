@@ -0,0 +1,360 @@
+"""
+Read the variables of stepwise run simulations into numpy arrays.
+
+The names and datatypes of a varmap don't change between the steps of a
+simulation run with a fixed variable filter. A StepReader resolves them
+once and afterwards decodes every new varmap directly into a row of
+preallocated numpy arrays.
+
+**Example** - *Stepping a simulation day by day:*
+
+    >>> import simplace
+    >>> simplace.openProject(sp, '/sol/Maize.sol.xml')
+    >>> simplace.createSimulation(sp)
+    >>> reader = simplace.StepReader(sp, ['CURRENT.DATE', 'LAI', 'Yield'])
+    >>> for day in range(200):
+    ...     reader.step()
+    ...     if reader.value('LAI') > 5.0:
+    ...         break
+    >>> print(reader.trajectory()['Yield'][-1])
+    512.3
+
+**Example** - *Stepping an ensemble until harvest or crop failure:*
+
+    >>> ens = simplace.EnsembleStepper(sp, 100,
+    ...     [lambda v: v['DevStage'] >= 2.0, lambda v: v['Biomass'] < 0],
+    ...     ['CURRENT.DATE', 'DevStage', 'Biomass'], maxSteps=365)
+    >>> trajectories = ens.run()
+    >>> print(ens.stopStep[:3])
+    [214 198 -1]
+
+"""
+
+import jpype
+import numpy
+
+import simplace
+
+_NUMERIC = ['DOUBLE', 'INT', 'BOOLEAN']
+
+
+class VarmapLayout:
+    """Names, datatypes and converters of a varmap, resolved once.
+
+    Args:
+        varmap: handle to a varmap (as returned by stepSimulation())
+    """
+
+    def __init__(self, varmap):
+        self.names = [str(s) for s in varmap.getHeaderStrings()]
+        self.types = [str(s) for s in varmap.getTypeStrings()]
+        self.index = {n: i for i, n in enumerate(self.names)}
+        self.numeric = [i for i, t in enumerate(self.types) if t in _NUMERIC]
+        self.isBoolean = [self.types[i] == 'BOOLEAN' for i in self.numeric]
+        self.dates = [i for i, t in enumerate(self.types) if t == 'DATE']
+        self.others = [i for i, t in enumerate(self.types)
+                       if t not in _NUMERIC and t != 'DATE']
+        self.slot = {}
+        for j, i in enumerate(self.numeric):
+            self.slot[i] = ('numeric', j)
+        for j, i in enumerate(self.dates):
+            self.slot[i] = ('date', j)
+        for j, i in enumerate(self.others):
+            self.slot[i] = ('other', j)
+
+    def decode(self, varmap, numeric, dates, others):
+        """
+        Decode the values of a varmap into preallocated rows.
+
+        Args:
+            varmap: handle to a varmap with this layout
+            numeric (numpy.ndarray): float row for the numeric variables
+            dates (numpy.ndarray): datetime64[D] row for the date variables
+            others (list): list for the remaining variables
+        """
+        obj = varmap.getDataObjects()
+        if len(obj) != len(self.names):
+            raise ValueError('Varmap layout changed between steps')
+        numeric[:] = [numpy.nan if v is None else
+                      (1.0 if v.booleanValue() else 0.0) if b else
+                      v.doubleValue()
+                      for v, b in zip([obj[i] for i in self.numeric],
+                                      self.isBoolean)]
+        dates[:] = [numpy.datetime64('NaT') if obj[i] is None else
+                    str(obj[i])[:10] for i in self.dates]
+        others[:] = [_convertOther(obj[i], self.types[i]) for i in self.others]
+
+    def columns(self, numeric, dates, others):
+        """
+        Build a dictionary of columns from filled row buffers.
+
+        Args:
+            numeric (numpy.ndarray): 2d float array (steps x variables)
+            dates (numpy.ndarray): 2d datetime64[D] array
+            others (list): list of rows for the remaining variables
+
+        Returns:
+            dict : variable names as keys, numpy arrays as values
+        """
+        out = {}
+        for i, name in enumerate(self.names):
+            kind, j = self.slot[i]
+            if kind == 'numeric':
+                col = numeric[:, j]
+                if self.types[i] == 'INT':
+                    col = col.astype(numpy.int64)
+                elif self.types[i] == 'BOOLEAN':
+                    col = col.astype(bool)
+                out[name] = col
+            elif kind == 'date':
+                out[name] = dates[:, j]
+            else:
+                col = numpy.empty(len(others), dtype=object)
+                for r, row in enumerate(others):
+                    col[r] = row[j]
+                out[name] = col
+        return out
+
+
+class StepReader:
+    """Steps a simulation and collects its variables in numpy arrays.
+
+    Args:
+        simplaceInstance: handle to the SimplaceWrapper object returned by
+            initSimplace
+        varFilter (list): variable names to read. If not set, all
+            variables are read
+        simulationnumber (int): number of simulation in the queue that
+            should be run stepwise (default first simulation)
+        capacity (int): number of steps preallocated, grows if needed
+    """
+
+    def __init__(self, simplaceInstance, varFilter=None, simulationnumber=0,
+                 capacity=366):
+        self._sh = simplaceInstance
+        self.varFilter = varFilter
+        self.simulationnumber = simulationnumber
+        self.layout = None
+        self.steps = 0
+        self._capacity = capacity
+        self._filter = None
+
+    def step(self, count=1, parameters=None):
+        """
+        Run the simulation count steps and read the values of the last step.
+
+        Args:
+            count (int): number of steps to perform
+            parameters (dict): key-value pairs where the key has to match
+                the Simplace SimVariable name
+
+        Returns:
+            int : number of the row the values were stored in
+        """
+        if self._filter is None and self.varFilter is not None:
+            self._filter = jpype.JArray(jpype.JString)(self.varFilter)
+        varmap = simplace.stepSimulation(self._sh, count, parameters,
+                                         self._filter, self.simulationnumber)
+        return self.read(varmap)
+
+    def read(self, varmap):
+        """
+        Decode a varmap into the next row.
+
+        Args:
+            varmap: handle to a varmap (as returned by stepSimulation())
+
+        Returns:
+            int : number of the row the values were stored in
+        """
+        if self.layout is None:
+            self._allocate(VarmapLayout(varmap))
+        if self.steps == len(self._numeric):
+            self._grow()
+        row = self.steps
+        self.layout.decode(varmap, self._numeric[row], self._dates[row],
+                           self._others[row])
+        self.steps += 1
+        return row
+
+    def value(self, name, row=-1):
+        """
+        Get the value of a variable.
+
+        Args:
+            name (str): variable name
+            row (int): row number (default last step)
+
+        Returns:
+            value of the variable
+        """
+        if row < 0:
+            row += self.steps
+        kind, j = self.layout.slot[self.layout.index[name]]
+        if kind == 'numeric':
+            return self._numeric[row, j]
+        elif kind == 'date':
+            return self._dates[row, j]
+        else:
+            return self._others[row][j]
+
+    def values(self, row=-1):
+        """Get the values of a step as dictionary (like varmapToList)."""
+        return {name: self.value(name, row) for name in self.layout.names}
+
+    def trajectory(self):
+        """
+        Get the values of all read steps.
+
+        Returns:
+            dict : variable names as keys, numpy arrays with one entry per
+            step as values
+        """
+        if self.layout is None:
+            return {}
+        return self.layout.columns(self._numeric[:self.steps],
+                                   self._dates[:self.steps],
+                                   self._others[:self.steps])
+
+    def _allocate(self, layout):
+        self.layout = layout
+        self._numeric = numpy.full((self._capacity, len(layout.numeric)),
+                                   numpy.nan)
+        self._dates = numpy.full((self._capacity, len(layout.dates)),
+                                 numpy.datetime64('NaT'), dtype='datetime64[D]')
+        self._others = [[None] * len(layout.others)
+                        for _ in range(self._capacity)]
+
+    def _grow(self):
+        n = len(self._numeric)
+        self._numeric = numpy.concatenate(
+            [self._numeric, numpy.full_like(self._numeric, numpy.nan)])
+        self._dates = numpy.concatenate(
+            [self._dates, numpy.full_like(self._dates, numpy.datetime64('NaT'))])
+        self._others.extend([[None] * len(self.layout.others)
+                             for _ in range(n)])
+
+
+class EnsembleStepper:
+    """Steps the simulations of the queue until a stop condition holds.
+
+    While all members run, they are advanced together with one
+    stepAllSimulations call per step. Once a member's stop condition holds,
+    only the remaining active members are stepped, one by one with
+    stepSimulation, so stopped members are not advanced past their end.
+    The stop condition is evaluated once per step for all active members
+    at once.
+
+    With stepAllFraction below 1, stepAllSimulations is kept as long as at
+    least that fraction of the members is active. This saves calls, but
+    java keeps stepping the stopped members past their end (their values
+    are no longer read and their trajectories end at the stop step).
+
+    Args:
+        simplaceInstance: handle to the SimplaceWrapper object returned by
+            initSimplace
+        members (int): number of simulations in the queue
+        stop (function or list): predicate(s) called with a dictionary of
+            variable names and numpy arrays (one value per active member),
+            returning a boolean array. A member stops if any predicate is
+            true
+        varFilter (list): variable names to read (should include the
+            variables used by the predicates)
+        maxSteps (int): maximal number of steps per member
+        count (int): number of steps between checks of the stop condition
+        stepAllFraction (float): use stepAllSimulations as long as at least
+            this fraction of the members is active (default 1, only while
+            no member has stopped)
+    """
+
+    def __init__(self, simplaceInstance, members, stop, varFilter=None,
+                 maxSteps=366, count=1, stepAllFraction=1.0):
+        self._sh = simplaceInstance
+        self.members = members
+        self.stop = stop if isinstance(stop, (list, tuple)) else [stop]
+        self.varFilter = varFilter
+        self.maxSteps = maxSteps
+        self.count = count
+        self.stepAllFraction = stepAllFraction
+        self.readers = [StepReader(simplaceInstance, varFilter, i,
+                                   capacity=min(maxSteps, 366))
+                        for i in range(members)]
+        self.stopStep = numpy.full(members, -1, dtype=numpy.int64)
+        self.active = numpy.ones(members, dtype=bool)
+        self._filter = None
+
+    def run(self):
+        """
+        Step until all members have stopped or maxSteps is reached.
+
+        Returns:
+            list : trajectory of every member (see StepReader.trajectory)
+            up to and including its stop step
+        """
+        if self._filter is None and self.varFilter is not None:
+            self._filter = jpype.JArray(jpype.JString)(self.varFilter)
+            for reader in self.readers:
+                reader._filter = self._filter
+        steps = 0
+        while steps < self.maxSteps and self.active.any():
+            live = numpy.flatnonzero(self.active)
+            if len(live) >= self.stepAllFraction * self.members:
+                varmaps = simplace.stepAllSimulations(self._sh, self.count,
+                                                      None, self._filter)
+                for i in live:
+                    self.readers[i].read(varmaps[i])
+            else:
+                for i in live:
+                    self.readers[i].step(self.count)
+            steps += self.count
+            stopped = self._check(live)
+            self.stopStep[live[stopped]] = steps
+            self.active[live[stopped]] = False
+        return self.trajectories()
+
+    def current(self, members=None):
+        """
+        Get the values of the last step.
+
+        Args:
+            members (list): member numbers (default active members)
+
+        Returns:
+            dict : variable names as keys, numpy arrays with one value per
+            member as values
+        """
+        if members is None:
+            members = numpy.flatnonzero(self.active)
+        readers = [self.readers[i] for i in members]
+        layout = readers[0].layout
+        last = [r.steps - 1 for r in readers]
+        numeric = numpy.stack([r._numeric[s] for r, s in zip(readers, last)])
+        dates = numpy.stack([r._dates[s] for r, s in zip(readers, last)])
+        others = [r._others[s] for r, s in zip(readers, last)]
+        return layout.columns(numeric, dates, others)
+
+    def trajectories(self):
+        """Get the trajectory of every member up to its stop step."""
+        return [r.trajectory() for r in self.readers]
+
+    def _check(self, live):
+        values = self.current(live)
+        stopped = numpy.zeros(len(live), dtype=bool)
+        for predicate in self.stop:
+            stopped |= numpy.asarray(predicate(values), dtype=bool)
+        return stopped
+
+
+# Helper Functions
+
+def _convertOther(obj, simplaceType):
+    if obj is None:
+        return None
+    elif simplaceType == 'CHAR':
+        return str(obj)
+    elif simplaceType in ['DOUBLEARRAY', 'INTARRAY']:
+        return numpy.array(obj)
+    elif simplaceType == 'CHARARRAY':
+        return [str(s) for s in obj]
+    else:
+        return obj
@@ -0,0 +1,312 @@
+"""
+Keep the outputs of many simulations in python with little memory.
+
+A CompactResultStore takes the dictionaries returned by resultToList (or
+ResultTable objects) and encodes every column with the smallest type that
+represents it: floats as float32 if the values survive the round trip
+within a tolerance, integral floats and integers as int8/16/32, booleans as
+bits, dates as int32 days since 1970 and strings as codes into a
+dictionary of distinct values. Columns that haven't been accessed for a
+while can additionally be compressed with zlib. Columns are decoded to
+their original representation on access.
+
+**Example** - *Keeping 100000 yearly results:*
+
+    >>> import simplace
+    >>> store = simplace.CompactResultStore(tolerance=1e-5)
+    >>> for simid in ids:
+    ...     store.add(simid, simplace.resultToList(
+    ...         simplace.getResult(sp, 'YearOut', simid)))
+    >>> store.compressCold(maxAge=1000)
+    >>> print(store.get(ids[0])['Yield'][:2])
+    [ 7012.3  6844.1]
+    >>> print(store.memoryReport()['ratio'])
+    0.21
+
+"""
+
+import sys
+import zlib
+
+import numpy
+
+_INTS = [numpy.int8, numpy.int16, numpy.int32, numpy.int64]
+
+
+class CompactColumn:
+    """A column encoded with a compact type, optionally compressed.
+
+    Args:
+        values: numpy array or list (e.g. a value of resultToList)
+        tolerance (float): allowed relative error when floats are stored
+            as float32
+        absTolerance (float): allowed absolute error for float32
+    """
+
+    def __init__(self, values, tolerance=1e-6, absTolerance=0.0):
+        self.originalBytes = _sizeOf(values)
+        self.encoding, self.dtype, self.shape, self._parts = \
+            _encode(values, tolerance, absTolerance)
+        self.compressed = False
+
+    @property
+    def nbytes(self):
+        """Bytes used by the encoded (and possibly compressed) column."""
+        if self.compressed:
+            return sum(len(data) for _, _, data in self._parts.values())
+        return sum(_sizeOf(p) for p in self._parts.values())
+
+    def compress(self, level=6):
+        """Compress the encoded arrays with zlib."""
+        if self.compressed or self.encoding == 'object':
+            return
+        self._parts = {k: (v.dtype.str, v.shape, zlib.compress(
+                              numpy.ascontiguousarray(v).tobytes(), level))
+                       for k, v in self._parts.items()}
+        self.compressed = True
+
+    def decompress(self):
+        """Keep the column uncompressed (but still encoded)."""
+        if self.compressed:
+            self._parts = self._arrays()
+            self.compressed = False
+
+    def decode(self):
+        """
+        Get the values in their original representation.
+
+        Returns:
+            numpy array, or list for lists of strings and dates
+        """
+        return _decode(self.encoding, self.dtype, self.shape, self._arrays())
+
+    def _arrays(self):
+        if not self.compressed:
+            return self._parts
+        return {k: numpy.frombuffer(zlib.decompress(data), dtype=dtype)
+                     .reshape(shape)
+                for k, (dtype, shape, data) in self._parts.items()}
+
+
+class CompactResultStore:
+    """Outputs of many simulations with compactly encoded columns.
+
+    Args:
+        tolerance (float): allowed relative error when floats are stored as
+            float32 (0 to keep only exactly representable values)
+        absTolerance (float): allowed absolute error for float32
+        level (int): zlib compression level for cold columns
+    """
+
+    def __init__(self, tolerance=1e-6, absTolerance=0.0, level=6):
+        self.tolerance = tolerance
+        self.absTolerance = absTolerance
+        self.level = level
+        self._entries = {}
+        self._lastAccess = {}
+        self._clock = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def keys(self):
+        """Get the keys of the stored results."""
+        return list(self._entries)
+
+    def add(self, key, result):
+        """
+        Store a result.
+
+        Args:
+            key: key of the result, e.g. the simulation id
+            result (dict or ResultTable): columns as returned by
+                resultToList, or a ResultTable
+        """
+        columns = result.columns if hasattr(result, 'columns') else result
+        self._entries[key] = {name: CompactColumn(values, self.tolerance,
+                                                  self.absTolerance)
+                              for name, values in columns.items()}
+        self._touch(key, list(columns))
+
+    def get(self, key, names=None):
+        """
+        Get a stored result.
+
+        Args:
+            key: key of the result
+            names (list): names of the columns to decode (default all)
+
+        Returns:
+            dict : column names as keys, decoded values as values
+        """
+        entry = self._entries[key]
+        names = list(entry) if names is None else names
+        self._touch(key, names)
+        return {n: entry[n].decode() for n in names}
+
+    def column(self, key, name):
+        """Get a single decoded column of a stored result."""
+        self._touch(key, [name])
+        return self._entries[key][name].decode()
+
+    def remove(self, key):
+        """Remove a stored result."""
+        entry = self._entries.pop(key)
+        for name in entry:
+            self._lastAccess.pop((key, name), None)
+
+    def compressCold(self, maxAge=0):
+        """
+        Compress columns that haven't been accessed recently.
+
+        Args:
+            maxAge (int): columns accessed within the last maxAge add/get
+                calls stay uncompressed
+
+        Returns:
+            int : number of newly compressed columns
+        """
+        n = 0
+        for (key, name), last in self._lastAccess.items():
+            column = self._entries[key][name]
+            if self._clock - last > maxAge and not column.compressed \
+                    and column.encoding != 'object':
+                column.compress(self.level)
+                n += 1
+        return n
+
+    def memoryReport(self):
+        """
+        Report the memory of the original and the stored columns.
+
+        Returns:
+            dict : 'originalBytes', 'storedBytes', 'savedBytes', 'ratio'
+            (stored / original), 'columns', 'compressed' and the number of
+            columns per encoding ('encodings')
+        """
+        original = stored = compressed = count = 0
+        encodings = {}
+        for entry in self._entries.values():
+            for column in entry.values():
+                original += column.originalBytes
+                stored += column.nbytes
+                compressed += column.compressed
+                count += 1
+                encodings[column.encoding] = encodings.get(column.encoding, 0) + 1
+        return {'originalBytes': original, 'storedBytes': stored,
+                'savedBytes': original - stored,
+                'ratio': stored / original if original > 0 else None,
+                'columns': count, 'compressed': compressed,
+                'encodings': encodings}
+
+    def _touch(self, key, names):
+        self._clock += 1
+        for name in names:
+            self._lastAccess[(key, name)] = self._clock
+
+
+# Helper Functions
+
+def _smallestInt(low, high):
+    for t in _INTS:
+        info = numpy.iinfo(t)
+        if low >= info.min and high <= info.max:
+            return t
+    return numpy.int64
+
+def _encode(values, tolerance, absTolerance):
+    asList = isinstance(values, list)
+    try:
+        arr = numpy.asarray(values)
+    except ValueError:
+        arr = None
+    if arr is None or arr.dtype.kind == 'O':
+        return 'object', None, None, {'values': values}
+    shape = arr.shape
+    kind = arr.dtype.kind
+    if kind == 'b':
+        return 'bits', arr.dtype.str, shape, \
+            {'bits': numpy.packbits(arr.ravel())}
+    elif kind in 'iu':
+        if arr.size == 0:
+            return 'plain', arr.dtype.str, shape, {'values': arr}
+        t = _smallestInt(arr.min(), arr.max())
+        return 'int', arr.dtype.str, shape, {'values': arr.astype(t)}
+    elif kind == 'f':
+        finite = numpy.isfinite(arr)
+        if arr.size > 0 and finite.all() and (arr == numpy.round(arr)).all() \
+                and numpy.abs(arr).max() < 2 ** 31:
+            t = _smallestInt(arr.min(), arr.max())
+            return 'int', arr.dtype.str, shape, {'values': arr.astype(t)}
+        if arr.dtype.itemsize > 4:
+            with numpy.errstate(over='ignore'):
+                small = arr.astype(numpy.float32)
+            if numpy.array_equal(numpy.isfinite(small), finite) and \
+                    numpy.allclose(small, arr, rtol=tolerance,
+                                   atol=absTolerance, equal_nan=True):
+                return 'float32', arr.dtype.str, shape, {'values': small}
+        return 'plain', arr.dtype.str, shape, {'values': arr}
+    elif kind == 'M':
+        days = arr.astype('datetime64[D]')
+        codes = days.astype(numpy.int64)
+        missing = numpy.isnat(days)
+        codes[missing] = numpy.iinfo(numpy.int32).min
+        return 'date', arr.dtype.str, shape, {'days': codes.astype(numpy.int32)}
+    elif kind == 'U':
+        flat = arr.ravel()
+        if flat.size > 0 and _isDateStrings(flat):
+            days = flat.astype('datetime64[D]').astype(numpy.int64)
+            return 'datestring', 'list' if asList else arr.dtype.str, shape, \
+                {'days': days.astype(numpy.int32)}
+        categories, codes = numpy.unique(flat, return_inverse=True)
+        t = _smallestInt(0, max(len(categories) - 1, 0))
+        return 'dictionary', 'list' if asList else arr.dtype.str, shape, \
+            {'categories': categories, 'codes': codes.astype(t)}
+    return 'plain', arr.dtype.str, shape, {'values': arr}
+
+def _decode(encoding, dtype, shape, parts):
+    if encoding == 'object':
+        return parts['values']
+    elif encoding == 'bits':
+        n = int(numpy.prod(shape))
+        return numpy.unpackbits(parts['bits'])[:n].astype(bool).reshape(shape)
+    elif encoding in ('int', 'float32', 'plain'):
+        return parts['values'].astype(numpy.dtype(dtype)).reshape(shape)
+    elif encoding == 'date':
+        days = parts['days'].astype(numpy.int64)
+        out = days.astype('datetime64[D]')
+        out[days == numpy.iinfo(numpy.int32).min] = numpy.datetime64('NaT')
+        return out.astype(numpy.dtype(dtype)).reshape(shape)
+    elif encoding == 'datestring':
+        text = parts['days'].astype(numpy.int64).astype('datetime64[D]') \
+                            .astype(str).reshape(shape)
+        return text.tolist() if dtype == 'list' else text.astype(dtype)
+    elif encoding == 'dictionary':
+        values = parts['categories'][parts['codes']].reshape(shape)
+        return values.tolist() if dtype == 'list' else values.astype(dtype)
+    raise ValueError('Unknown encoding ' + encoding)
+
+def _isDateStrings(flat):
+    if flat.dtype.itemsize != 10 * 4:
+        return False
+    sample = flat[:min(len(flat), 16)]
+    if not all(len(s) == 10 and s[4] == '-' and s[7] == '-' for s in sample):
+        return False
+    try:
+        days = flat.astype('datetime64[D]')
+    except ValueError:
+        return False
+    return not numpy.isnat(days).any() and \
+        numpy.array_equal(days.astype(str), flat)
+
+def _sizeOf(values):
+    if isinstance(values, numpy.ndarray):
+        if values.dtype.kind == 'O':
+            return values.nbytes + sum(_sizeOf(v) for v in values.ravel())
+        return values.nbytes
+    elif isinstance(values, (list, tuple)):
+        return sys.getsizeof(values) + sum(_sizeOf(v) for v in values)
+    return sys.getsizeof(values)
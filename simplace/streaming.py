@@ -0,0 +1,115 @@
+"""
+Consume the outputs of a project while it is still running.
+
+The project lines are run in chunks. After a chunk has finished, its memory
+outputs are converted to columnar tables and the project is closed, which
+releases the outputs on the java side. While the tables of one chunk are
+processed in python, the next chunk already runs in the background. The
+memory needed in the java virtual machine is therefore bounded by the chunk
+size, not by the size of the project.
+
+**Example** - *Writing the yearly output chunk by chunk:*
+
+    >>> import simplace
+    >>> sp = simplace.initSimplace('/ws/','/runs/simulation/','/out/')
+    >>> for lines, tables in simplace.streamProject(sp, '/sol/Maize.sol.xml',
+    ...         '/proj/NRW.proj.xml', '1-40000', ['YearOut'], chunkSize=500):
+    ...     save(lines, tables['YearOut'])
+
+"""
+
+import concurrent.futures
+
+import simplace
+
+
+def streamProject(simplaceInstance, solution, project, lines, outputs,
+                  chunkSize=100, parameters=None, expand=True, prefetch=True):
+    """
+    Run project lines chunkwise and yield the outputs of every chunk.
+
+    Args:
+        simplaceInstance: handle to the SimplaceWrapper object returned by
+            initSimplace
+        solution (str): path to solution file
+        project (str): path to project file
+        lines (str): line specification, e.g. "1-400,500" or list of lines
+        outputs (list): names of memory outputs
+        chunkSize (int): number of project lines per chunk
+        parameters (dict): parameters passed to openProject (optional)
+        expand (bool): whether array values should be expanded or kept as
+            handles to java objects (optional)
+        prefetch (bool): run the next chunk while the current one is
+            processed
+
+    Yields:
+        tuple : line specification of the chunk and a dictionary with the
+        output names as keys and ResultTable objects (key column
+        'projectlines') as values
+    """
+    lines = simplace.projectLinesToList(lines)
+    chunks = [simplace.projectLinesToString(lines[i:i + chunkSize])
+              for i in range(0, len(lines), chunkSize)]
+    if len(chunks) == 0:
+        return
+    args = (simplaceInstance, solution, project, parameters, outputs, expand)
+    if not prefetch:
+        for chunk in chunks:
+            yield chunk, _runChunk(chunk, *args)
+        return
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
+        future = pool.submit(_runChunk, chunks[0], *args)
+        for i, chunk in enumerate(chunks):
+            tables = future.result()
+            if i + 1 < len(chunks):
+                future = pool.submit(_runChunk, chunks[i + 1], *args)
+            yield chunk, tables
+
+def runProjectStreaming(simplaceInstance, solution, project, lines, outputs,
+                        callback, chunkSize=100, parameters=None,
+                        expand=True, prefetch=True):
+    """
+    Run project lines chunkwise and pass the outputs of every chunk to a
+    function.
+
+    Args:
+        simplaceInstance: handle to the SimplaceWrapper object returned by
+            initSimplace
+        solution (str): path to solution file
+        project (str): path to project file
+        lines (str): line specification, e.g. "1-400,500" or list of lines
+        outputs (list): names of memory outputs
+        callback (function): called with the line specification of the
+            chunk and the dictionary of output tables (see streamProject)
+        chunkSize (int): number of project lines per chunk
+        parameters (dict): parameters passed to openProject (optional)
+        expand (bool): whether array values should be expanded (optional)
+        prefetch (bool): run the next chunk while the current one is
+            processed
+
+    Returns:
+        int : number of chunks processed
+    """
+    n = 0
+    for chunk, tables in streamProject(simplaceInstance, solution, project,
+                                       lines, outputs, chunkSize, parameters,
+                                       expand, prefetch):
+        callback(chunk, tables)
+        n += 1
+    return n
+
+
+# Helper Functions
+
+def _runChunk(chunk, simplaceInstance, solution, project, parameters,
+              outputs, expand):
+    simplace.setProjectLines(simplaceInstance, chunk)
+    try:
+        simplace.openProject(simplaceInstance, solution, project, parameters)
+        simplace.runProject(simplaceInstance)
+        return {output: simplace.resultToTable(
+                    simplace.getResult(simplaceInstance, output),
+                    chunk, 'projectlines', expand)
+                for output in outputs}
+    finally:
+        simplace.closeProject(simplaceInstance)
@@ -0,0 +1,298 @@
+"""
+Columnar tables holding the outputs of many simulations.
+
+A ResultTable stores every output variable as one numpy array over all
+simulations, together with a key column (e.g. the simulation id) and an
+offset index. The rows of one simulation are a slice of the columns, so
+accessing them doesn't copy any data.
+
+**Example** - *Fetching the yearly output of all simulations:*
+
+    >>> import simplace
+    >>> ids = [simplace.createSimulation(sp, {'vLUE':v}) for v in [2.8,3.0,3.2]]
+    >>> simplace.runSimulations(sp)
+    >>> table = simplace.getResultTable(sp, 'YearOut', ids)
+    >>> print(len(table), table['simulationid'][:2])
+    93 ['1' '1']
+    >>> print(table.group(ids[1])['BiomassModule.Yield'][:3])
+    [ 790.2  805.4  811.0]
+
+**Example** - *Fetching several outputs of a simulation at once:*
+
+    >>> tables = simplace.getResults(sp, ['DailyOut', 'YearOut'], ids[0],
+    ...                              columns=['CURRENT.DATE', 'LAI', 'Yield'])
+    >>> print(tables['YearOut'].names())
+    ['CURRENT.DATE', 'Yield', 'simulationid']
+
+"""
+
+import numpy
+
+import simplace
+
+
+class ResultTable:
+    """Columns of several simulations with an offset index.
+
+    Args:
+        columns (dict): column names as keys, numpy arrays of equal length
+            as values
+        keys (list): key of every group (simulation) in order
+        offsets (numpy.ndarray): start row of every group, followed by the
+            number of rows (length len(keys)+1)
+        keyName (str): name of the key column
+        types (dict): Simplace datatypes of the columns (optional)
+        units (dict): units of the columns (optional)
+    """
+
+    def __init__(self, columns, keys, offsets, keyName='simulationid',
+                 types=None, units=None):
+        self.columns = columns
+        self.keys = list(keys)
+        self.offsets = numpy.asarray(offsets, dtype=numpy.int64)
+        self.keyName = keyName
+        self.types = types or {}
+        self.units = units or {}
+        self._position = {k: i for i, k in enumerate(self.keys)}
+        if keyName not in columns:
+            self.columns = dict(columns)
+            self.columns[keyName] = numpy.repeat(
+                numpy.array(self.keys), numpy.diff(self.offsets))
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def names(self):
+        """Get the column names."""
+        return list(self.columns.keys())
+
+    def group(self, key):
+        """
+        Get the rows of one group (simulation) without copying.
+
+        Args:
+            key: key of the group, e.g. simulation id
+
+        Returns:
+            dict : column names as keys, array views as values
+        """
+        i = self._position[key]
+        a, b = self.offsets[i], self.offsets[i + 1]
+        return {name: col[a:b] for name, col in self.columns.items()}
+
+    def groups(self):
+        """Iterate over (key, rows) of all groups."""
+        for key in self.keys:
+            yield key, self.group(key)
+
+    def select(self, names):
+        """
+        Get a table with a subset of the columns (without copying).
+
+        Args:
+            names (list): column names
+
+        Returns:
+            ResultTable : table with the selected columns and the key column
+        """
+        columns = {n: self.columns[n] for n in names}
+        columns[self.keyName] = self.columns[self.keyName]
+        return ResultTable(columns, self.keys, self.offsets, self.keyName,
+                           self.types, self.units)
+
+    def toDict(self):
+        """Get the columns as dictionary (like resultToList)."""
+        return dict(self.columns)
+
+    @staticmethod
+    def concat(tables, keyName=None):
+        """
+        Join several tables with the same columns row by row.
+
+        Args:
+            tables (list): list of ResultTable objects
+            keyName (str): name of the key column (default from first table)
+
+        Returns:
+            ResultTable : joined table
+        """
+        tables = [t for t in tables if t is not None]
+        if len(tables) == 0:
+            return ResultTable({}, [], [0], keyName or 'simulationid')
+        keyName = keyName or tables[0].keyName
+        names = [n for n in tables[0].names() if n != keyName]
+        keys = [k for t in tables for k in t.keys]
+        lengths = numpy.concatenate([numpy.diff(t.offsets) for t in tables])
+        offsets = numpy.r_[0, numpy.cumsum(lengths)]
+        columns = {n: _concat([t.columns[n] for t in tables]) for n in names}
+        return ResultTable(columns, keys, offsets, keyName,
+                           tables[0].types, tables[0].units)
+
+
+def getResultTable(simplaceInstance, output, simulations=None, expand=True,
+                   columns=None):
+    """
+    Get an output of several simulations as one columnar table.
+
+    Header, datatypes and units are fetched only once. Every column is
+    converted per simulation and concatenated once at the end.
+
+    Args:
+        simplaceInstance: handle to the SimplaceWrapper object returned by
+            initSimplace
+        output (str): id of the memory output
+        simulations (list): simulation ids (default all ids returned by
+            getSimulationIDs)
+        expand (bool): whether array values should be expanded or kept as
+            handles to java objects (optional)
+        columns (list): names of the columns to convert (default all)
+
+    Returns:
+        ResultTable : table with the additional column 'simulationid'
+    """
+    if simulations is None:
+        simulations = simplace.getSimulationIDs(simplaceInstance)
+    simulations = [str(s) for s in simulations]
+    return _fetchTable(simplaceInstance, output, simulations, columns, expand)
+
+
+def getResults(simplaceInstance, outputs, simulation=None, columns=None,
+               expand=True):
+    """
+    Get several outputs of a simulation as columnar tables in one pass.
+
+    For every output, header, datatypes and data are fetched once and only
+    the requested columns are converted.
+
+    Args:
+        simplaceInstance: handle to the SimplaceWrapper object returned by
+            initSimplace
+        outputs (list): ids of the memory outputs
+        simulation (str or list): simulation id or list of ids (optional)
+        columns (list or dict): names of the columns to convert, either one
+            list for all outputs (names missing in an output are skipped) or
+            a dictionary with a list per output (default all columns)
+        expand (bool): whether array values should be expanded or kept as
+            handles to java objects (optional)
+
+    Returns:
+        dict : output ids as keys, ResultTable objects (key column
+        'simulationid') as values
+    """
+    if isinstance(outputs, str):
+        outputs = [outputs]
+    if isinstance(simulation, (list, tuple)):
+        simulations = [str(s) for s in simulation]
+    else:
+        simulations = [None if simulation is None else str(simulation)]
+    tables = {}
+    for output in outputs:
+        if isinstance(columns, dict):
+            selected, strict = columns.get(output), True
+        else:
+            selected, strict = columns, False
+        tables[output] = _fetchTable(simplaceInstance, output, simulations,
+                                     selected, expand, strict)
+    return tables
+
+
+def resultToTable(result, key=None, keyName='simulationid', expand=True):
+    """
+    Convert a result to a table with a single group.
+
+    Args:
+        result: handle to simulation result (as returned by getResult())
+        key: key of the group, e.g. the simulation id (optional)
+        keyName (str): name of the key column
+        expand (bool): whether array values should be expanded or kept as
+            handles to java objects (optional)
+
+    Returns:
+        ResultTable : columnar table of the result
+    """
+    names = [str(s) for s in result.getHeaderStrings()]
+    types = [str(s) for s in result.getTypeStrings()]
+    units = [str(s) for s in result.getHeaderUnits()]
+    parts = [_convertObjects(result.getDataObjects(), types, expand)]
+    return _tableFromParts(names, types, units, [key], parts, keyName)
+
+
+# Helper Functions
+
+def _toArray(obj, simplaceType, expand=True):
+    if simplaceType in ['DOUBLE', 'INT', 'BOOLEAN']:
+        return numpy.array(obj)
+    elif simplaceType in ['DATE']:
+        return numpy.array([str(s)[:10] for s in obj])
+    elif simplaceType in ['CHAR']:
+        return numpy.array([str(s) for s in obj])
+    elif expand and simplaceType in ['DOUBLEARRAY', 'INTARRAY']:
+        rows = [numpy.array(row) for row in obj]
+        if len(rows) > 0 and len(set(len(r) for r in rows)) == 1:
+            return numpy.stack(rows)
+        return _objectArray(rows)
+    elif expand and simplaceType in ['CHARARRAY']:
+        return _objectArray([[str(s) for s in row] for row in obj])
+    else:
+        return _objectArray(list(obj))
+
+def _objectArray(rows):
+    arr = numpy.empty(len(rows), dtype=object)
+    for i, row in enumerate(rows):
+        arr[i] = row
+    return arr
+
+def _convertObjects(obj, types, expand=True):
+    return [_toArray(o, t, expand) for o, t in zip(obj, types)]
+
+def _fetchTable(simplaceInstance, output, simulations, columns=None,
+                expand=True, strict=True):
+    names = types = units = index = None
+    parts = []
+    for simid in simulations:
+        result = simplace.getResult(simplaceInstance, output, simid)
+        if names is None:
+            names = [str(s) for s in result.getHeaderStrings()]
+            types = [str(s) for s in result.getTypeStrings()]
+            units = [str(s) for s in result.getHeaderUnits()]
+            index = _selectColumns(names, columns, strict)
+            names = [names[i] for i in index]
+            types = [types[i] for i in index]
+            units = [units[i] for i in index]
+        obj = result.getDataObjects()
+        parts.append([_toArray(obj[i], t, expand) for i, t in zip(index, types)])
+    return _tableFromParts(names, types, units, simulations, parts)
+
+def _selectColumns(names, columns, strict):
+    if columns is None:
+        return list(range(len(names)))
+    position = {n: i for i, n in enumerate(names)}
+    if strict:
+        missing = [c for c in columns if c not in position]
+        if len(missing) > 0:
+            raise KeyError('Unknown columns: ' + ', '.join(missing))
+    return [position[c] for c in columns if c in position]
+
+def _concat(arrays):
+    if len(arrays) == 1:
+        return arrays[0]
+    try:
+        return numpy.concatenate(arrays)
+    except ValueError:
+        return _objectArray([row for a in arrays for row in a])
+
+def _tableFromParts(names, types, units, keys, parts, keyName='simulationid'):
+    if names is None:
+        return ResultTable({}, [], [0], keyName)
+    lengths = [len(p[0]) if len(p) > 0 else 0 for p in parts]
+    offsets = numpy.r_[0, numpy.cumsum(lengths)].astype(numpy.int64)
+    columns = {name: _concat([p[i] for p in parts])
+               for i, name in enumerate(names)}
+    return ResultTable(columns, keys, offsets, keyName,
+                       dict(zip(names, types)), dict(zip(names, units)))
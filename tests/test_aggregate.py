@@ -0,0 +1,75 @@
+import numpy
+import pytest
+
+from simplace.aggregate import aggregateResult
+
+
+class FakeResult:
+    """Result with the java methods used by aggregateResult."""
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    def getHeaderStrings(self):
+        return list(self.columns)
+
+    def getDataObjects(self, start=None, end=None):
+        if start is not None:
+            raise AssertionError('windows are sliced in python')
+        return [list(v) for v in self.columns.values()]
+
+
+def test_monthly_sum_and_max():
+    res = FakeResult({'CURRENT.DATE': ['1990-01-01', '1990-01-02', '1990-02-01'],
+                      'Rain': [1.0, 2.0, 4.0], 'LAI': [0.1, 0.3, 0.2]})
+    out = aggregateResult(res, by='month', funcs={'Rain': 'sum', 'LAI': 'max'},
+                          window=2)
+    assert out['year'].tolist() == [1990, 1990]
+    assert out['month'].tolist() == [1, 2]
+    assert out['Rain'].tolist() == [3.0, 4.0]
+    assert out['LAI'].tolist() == [0.3, 0.2]
+
+
+def test_empty_result_with_mean():
+    res = FakeResult({'CURRENT.DATE': [], 'Rain': []})
+    out = aggregateResult(res, funcs={'Rain': ['mean', 'first', 'count']})
+    assert len(out['month']) == 0
+    assert len(out['Rain_mean']) == 0
+    assert len(out['Rain_first']) == 0
+
+
+def test_groups_by_simulation():
+    res = FakeResult({'CURRENT.DATE': ['2000-01-01', '2000-01-02'] * 2,
+                      'CURRENT.SIMULATIONID': ['a', 'a', 'b', 'b'],
+                      'Rain': [1.0, 2.0, 10.0, 20.0]})
+    out = aggregateResult(res, by='year', funcs={'Rain': 'sum'}, window=3)
+    assert out['CURRENT.SIMULATIONID'].tolist() == ['a', 'b']
+    assert out['year'].tolist() == [2000, 2000]
+    assert out['Rain'].tolist() == [3.0, 30.0]
+
+
+def test_nan_ignored_by_all_reducers():
+    nan = float('nan')
+    res = FakeResult({'CURRENT.DATE': ['2000-01-01', '2000-01-02',
+                                       '2000-01-03', '2000-02-01'],
+                      'Rain': [nan, 2.0, nan, nan]})
+    funcs = {'Rain': ['sum', 'mean', 'min', 'max', 'count', 'first', 'last']}
+    out = aggregateResult(res, by='month', funcs=funcs, window=1)
+    for r in ['sum', 'mean', 'min', 'max', 'first', 'last']:
+        assert out['Rain_' + r][0] == 2.0
+    assert out['Rain_count'].tolist() == [1.0, 0.0]
+    assert numpy.isnan(out['Rain_first'][1]) and numpy.isnan(out['Rain_last'][1])
+
+
+def test_unknown_reducer():
+    with pytest.raises(ValueError):
+        aggregateResult(FakeResult({'CURRENT.DATE': []}), funcs={'x': 'median'})
+
+
+def test_sum_of_period_without_values_is_nan():
+    res = FakeResult({'CURRENT.DATE': ['1990-01-01', '1990-02-01', '1990-02-02'],
+                      'Rain': [numpy.nan, 1.0, numpy.nan]})
+    out = aggregateResult(res, funcs={'Rain': ['sum', 'count']}, window=1)
+    assert numpy.isnan(out['Rain_sum'][0])
+    assert out['Rain_sum'][1] == 1.0
+    assert out['Rain_count'].tolist() == [0.0, 1.0]
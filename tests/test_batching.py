@@ -0,0 +1,58 @@
+import json
+
+import simplace
+from simplace.batching import AdaptiveBatchExecutor
+
+MB = 2 ** 20
+
+
+def _stats(heap, gcCount=0, heapMax=1000 * MB):
+    return {'gcCount': gcCount, 'heapUsed': heap, 'heapAfterGc': heap,
+            'heapMax': heapMax}
+
+
+def test_batches_grow_while_throughput_improves():
+    ex = AdaptiveBatchExecutor(None, [], initialBatch=8)
+    ex._decide(8, 0.1, 0.8, 0.1, _stats(0), _stats(0))
+    assert ex.size == 16
+    ex._decide(16, 0.1, 0.8, 0.1, _stats(0), _stats(0))
+    assert ex.size == 32
+    assert ex.decisions[1]['reason'] == 'throughput improved, continue'
+    ex._decide(32, 0.5, 7.0, 0.5, _stats(0), _stats(0))
+    assert ex.decisions[-1]['reason'] == \
+        'throughput decreased, back to best size'
+    assert ex.size < 32
+
+
+def test_memory_limits_the_batch_size(tmp_path):
+    log = str(tmp_path / 'decisions.jsonl')
+    ex = AdaptiveBatchExecutor(None, [], initialBatch=10, memoryFraction=0.5,
+                               logFile=log)
+    ex._decide(10, 0.0, 1.0, 0.0, _stats(100 * MB), _stats(300 * MB))
+    decision = ex.decisions[-1]
+    assert decision['memoryPerSimulation'] == 20 * MB
+    assert decision['memoryLimit'] == 10
+    assert ex.size == 10
+    assert decision['reason'].endswith('limited by memory')
+    with open(log) as f:
+        assert json.loads(f.readline())['nextSize'] == 10
+
+
+def test_run_creates_batches_and_releases(monkeypatch):
+    created = []
+    released = []
+    monkeypatch.setattr(simplace, 'createSimulation',
+                        lambda sh, p: created.append(p) or str(len(created)))
+    monkeypatch.setattr(simplace, 'runSimulations', lambda sh: None)
+    monkeypatch.setattr(simplace, 'getResult',
+                        lambda sh, output, simid: {'id': simid})
+    monkeypatch.setattr(simplace, 'getJvmStatistics', lambda: _stats(0))
+    ex = AdaptiveBatchExecutor(None, ['YearOut'], initialBatch=2,
+                               convert=lambda r: r['id'],
+                               release=lambda: released.append(1))
+    parameterlist = [{'vLUE': i} for i in range(7)]
+    results = ex.run(parameterlist)
+    assert created == parameterlist
+    assert results == [{'YearOut': str(i + 1)} for i in range(7)]
+    assert sum(d['size'] for d in ex.decisions) == 7
+    assert len(released) == len(ex.decisions)
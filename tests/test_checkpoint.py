@@ -0,0 +1,88 @@
+import json
+import os
+
+import numpy
+import pytest
+
+import simplace
+from simplace.checkpoint import runProjectResumable, unfinishedLines
+
+
+SOLUTION = '''<solution>
+  <simmodel>
+    <output id="YearOut" driver="CSVOutput">
+      <filename>${_OUTPUTDIR_}/year_${projectid}.csv</filename>
+    </output>
+  </simmodel>
+</solution>
+'''
+
+
+class FakeSimplace:
+    """Writes one csv output file per chunk, fails on a given chunk."""
+
+    def __init__(self, tmp_path, failOn=None):
+        self.dirs = {'_WORKDIR_': str(tmp_path),
+                     '_OUTPUTDIR_': str(tmp_path / 'out')}
+        os.makedirs(self.dirs['_OUTPUTDIR_'], exist_ok=True)
+        self.failOn = failOn
+        self.chunks = []
+
+    def getSimplaceDirectories(self, sh):
+        return dict(self.dirs)
+
+    def runProjectLines(self, sh, solution, project, lines, parameters=None,
+                        outputs=None):
+        if lines[0] == self.failOn:
+            raise RuntimeError('interrupted')
+        self.chunks.append(list(lines))
+        path = os.path.join(self.dirs['_OUTPUTDIR_'], 'year_%d.csv' % lines[0])
+        with open(path, 'w') as f:
+            f.write('line\n' + '\n'.join(str(l) for l in lines))
+        return {o: {'line': numpy.array(lines)} for o in outputs or []}
+
+
+def _patch(monkeypatch, fake):
+    monkeypatch.setattr(simplace, 'getSimplaceDirectories',
+                        fake.getSimplaceDirectories)
+    monkeypatch.setattr(simplace, 'runProjectLines', fake.runProjectLines)
+
+
+def test_resume_after_interruption(tmp_path, monkeypatch):
+    solution = tmp_path / 'Maize.sol.xml'
+    solution.write_text(SOLUTION)
+    manifest = str(tmp_path / 'run.json')
+    fake = FakeSimplace(tmp_path, failOn=3)
+    other = os.path.join(fake.dirs['_OUTPUTDIR_'], 'notes.txt')
+    _patch(monkeypatch, fake)
+    with pytest.raises(RuntimeError):
+        runProjectResumable(None, str(solution), None, '1-5', manifest,
+                            chunkSize=2, outputs=['YearOut'])
+    with open(other, 'w') as f:
+        f.write('not an output of the solution')
+    assert unfinishedLines(manifest) == '3-5'
+
+    fake.failOn = None
+    state = runProjectResumable(None, str(solution), None, '1-5', manifest,
+                                chunkSize=2, outputs=['YearOut'])
+    assert fake.chunks == [[1, 2], [3, 4], [5]]
+    assert unfinishedLines(manifest) == ''
+    assert sorted(state['chunks']) == ['000000', '000001', '000002']
+    files = state['chunks']['000001']['files']
+    assert [os.path.basename(f) for f in files] == ['YearOut.npz',
+                                                    'year_3.csv']
+    assert numpy.load(files[0])['line'].tolist() == [3, 4]
+    assert os.path.exists(other)
+    assert os.listdir(fake.dirs['_OUTPUTDIR_']) == ['notes.txt']
+
+
+def test_manifest_of_another_run_is_rejected(tmp_path, monkeypatch):
+    solution = tmp_path / 'Maize.sol.xml'
+    solution.write_text(SOLUTION)
+    manifest = str(tmp_path / 'run.json')
+    _patch(monkeypatch, FakeSimplace(tmp_path))
+    runProjectResumable(None, str(solution), None, '1-2', manifest)
+    with open(manifest) as f:
+        assert json.load(f)['lines'] == '1-2'
+    with pytest.raises(ValueError):
+        runProjectResumable(None, str(solution), None, '1-3', manifest)
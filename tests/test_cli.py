@@ -0,0 +1,72 @@
+import argparse
+import json
+
+import pytest
+
+import simplace
+from simplace.cli import main, parseParameter, summarize
+
+
+def test_parse_parameter():
+    assert parseParameter('vLUE=3.2') == ('vLUE', 3.2)
+    assert parseParameter('vDays=10') == ('vDays', 10)
+    assert parseParameter('vTable=1,2.5,x') == ('vTable', [1, 2.5, 'x'])
+    assert parseParameter('vName=maize') == ('vName', 'maize')
+    with pytest.raises(argparse.ArgumentTypeError):
+        parseParameter('vLUE')
+
+
+def _report():
+    return {'seconds': 10.0,
+            'batches': [{'batch': 0, 'lines': [1, 2], 'rows': 60,
+                         'worker': 11, 'seconds': 4.0, 'peakMemory': 100,
+                         'files': ['b0.npz']},
+                        {'batch': 1, 'lines': [3], 'rows': 30,
+                         'worker': 11, 'seconds': 2.0, 'peakMemory': 300,
+                         'files': ['b1.npz']}],
+            'failed': [{'batch': 2, 'lines': [4, 5], 'worker': 12,
+                        'seconds': None, 'peakMemory': 200, 'files': [],
+                        'error': 'Traceback\n  ...\nRuntimeError: boom\n'}]}
+
+
+def test_summary():
+    summary = summarize(_report(), 'a.sol.xml', None, 5)
+    assert summary['finishedLines'] == 3 and summary['failedLines'] == 2
+    assert summary['linesPerSecond'] == 0.3
+    assert summary['rowsPerSecond'] == 9.0
+    assert summary['batchSeconds'] == {'min': 2.0, 'max': 4.0, 'total': 6.0}
+    assert summary['peakMemoryPerWorker'] == {'11': 300, '12': 200}
+    assert summary['failed'] == [{'batch': 2, 'lines': [4, 5],
+                                  'error': 'RuntimeError: boom'}]
+    assert summary['files'] == ['b0.npz', 'b1.npz']
+    empty = summarize({'seconds': 0.0, 'batches': [], 'failed': []},
+                      'a.sol.xml', None, 0)
+    assert empty['linesPerSecond'] is None
+    assert empty['batchSeconds']['min'] is None
+
+
+def test_exit_codes(tmp_path, monkeypatch, capsys):
+    calls = {}
+
+    def run(solution, project, lines, **kwargs):
+        calls.update(kwargs, lines=lines)
+        return _report()
+
+    monkeypatch.setattr(simplace, 'runProjectScheduled', run)
+    path = str(tmp_path / 'summary.json')
+    assert main(['a.sol.xml', '--lines', '1-5', '--quiet', '--param',
+                 'vLUE=3', '--summary', path]) == 1
+    assert calls['lines'] == [1, 2, 3, 4, 5]
+    assert calls['parameters'] == {'vLUE': 3}
+    with open(path) as f:
+        assert json.load(f)['error'] is None
+    capsys.readouterr()
+
+    def fail(*args, **kwargs):
+        raise RuntimeError('no java')
+
+    monkeypatch.setattr(simplace, 'runProjectScheduled', fail)
+    assert main(['a.sol.xml', '--lines', '1', '--quiet']) == 2
+    summary = json.loads(capsys.readouterr().out)
+    assert summary['error'] == 'RuntimeError: no java'
+    assert summary['finishedLines'] == 0
@@ -0,0 +1,64 @@
+import os
+
+import numpy
+
+from simplace.csvreader import readOutputFile, readOutputFiles
+
+
+def _write(path, text):
+    with open(path, 'w', newline='') as f:
+        f.write(text)
+    return str(path)
+
+
+def test_read_file_with_units_and_dates(tmp_path):
+    path = _write(tmp_path / 'out.csv',
+                  'CURRENT.DATE;Yield;Count;Crop\r\n'
+                  'date;kg/ha;-;-\r\n'
+                  '01.01.1990;1.5;3;maize\r\n'
+                  '02.01.1990;;4;wheat\r\n')
+    names, units, columns = readOutputFile(path)
+    assert names == ['CURRENT.DATE', 'Yield', 'Count', 'Crop']
+    assert units == ['date', 'kg/ha', '-', '-']
+    assert columns['CURRENT.DATE'].tolist() == \
+        list(numpy.array(['1990-01-01', '1990-01-02'], dtype='datetime64[D]'))
+    assert columns['Yield'][0] == 1.5 and numpy.isnan(columns['Yield'][1])
+    assert columns['Count'].dtype.kind == 'i'
+    assert columns['Crop'].tolist() == ['maize', 'wheat']
+
+
+def test_ragged_lines_and_dtypes(tmp_path):
+    path = _write(tmp_path / 'out.csv', 'a;b\n1;2\n3\n\n')
+    names, units, columns = readOutputFile(path, units=False,
+                                           dtypes={'a': float})
+    assert units == ['', '']
+    assert columns['a'].dtype == numpy.float64
+    assert columns['a'].tolist() == [1.0, 3.0]
+    assert columns['b'][0] == 2 and numpy.isnan(columns['b'][1])
+
+
+def test_empty_file(tmp_path):
+    assert readOutputFile(_write(tmp_path / 'out.csv', '')) == ([], [], {})
+
+
+def test_read_files_with_key_and_cache(tmp_path):
+    for line, values in [(1, '1;2.5\n2;3.5\n'), (2, '1;4.5\n')]:
+        _write(tmp_path / ('run_%d_YearOut.csv' % line),
+               'Year;Yield\n' + values)
+    pattern = str(tmp_path / '*_YearOut.csv')
+    for _ in range(2):
+        table = readOutputFiles(pattern, key=r'_(\d+)_YearOut',
+                                keyName='projectline', workers=1, cache=True)
+        assert table.group('1')['Yield'].tolist() == [2.5, 3.5]
+        assert table.group('2')['Yield'].tolist() == [4.5]
+    assert len(os.listdir(tmp_path / '.simplace-cache')) == 2
+
+
+def test_wide_cell_and_missing_final_line_break(tmp_path):
+    rows = ['%d;ok' % i for i in range(50)]
+    rows[3] = '3;' + 'x' * 500
+    path = _write(tmp_path / 'out.csv', 'Count;Note\n' + '\n'.join(rows))
+    names, units, columns = readOutputFile(path)
+    assert columns['Count'].tolist() == list(range(50))
+    assert columns['Note'][3] == 'x' * 500
+    assert columns['Note'][49] == 'ok'
@@ -0,0 +1,97 @@
+import numpy
+import pytest
+
+from simplace import projectLinesToList
+from simplace.distributed import Broker, SQLiteBroker, Coordinator, \
+    encodePayload, decodePayload, encodeResult, decodeResult
+
+
+def test_payload_round_trip():
+    payload = {'lines': '1-3', 'values': numpy.array([1.5, 2.5]),
+               'count': numpy.int64(3), 'parameters': None}
+    out = decodePayload(encodePayload(payload))
+    assert out['values'].dtype == numpy.float64
+    assert out['values'].tolist() == [1.5, 2.5]
+    assert out['count'] == 3 and out['parameters'] is None
+    with pytest.raises(TypeError):
+        encodePayload({'x': object()})
+
+
+def test_result_round_trip():
+    result = {'YearOut': {'Yield': numpy.array([1.0, 2.0]),
+                          'Date': numpy.array(['1990-01-01'],
+                                              dtype='datetime64[D]'),
+                          'Crop': numpy.array(['maize', 'wheat'])},
+              'Empty': {}}
+    out = decodeResult(encodeResult(result))
+    assert list(out) == ['YearOut', 'Empty']
+    for name, values in result['YearOut'].items():
+        numpy.testing.assert_array_equal(out['YearOut'][name], values)
+    with pytest.raises(ValueError):
+        encodeResult({'YearOut': {'Obj': [[1, 2], [3]]}})
+
+
+def test_broker_life_cycle(tmp_path):
+    broker = SQLiteBroker(str(tmp_path / 'queue.sqlite'))
+    first = broker.submit('lines', {'lines': '1-2'}, 'job1')
+    second = broker.submit('lines', {'lines': '3'}, 'job1')
+    assert broker.jobTasks('job1') == [first, second]
+    taskId, kind, payload = broker.claim('w1')
+    assert (taskId, kind, payload) == (first, 'lines', {'lines': '1-2'})
+    broker.complete(taskId, 'w1', {'YearOut': {'Yield': numpy.array([1.0])}},
+                    1, 0.5)
+    assert broker.result(first)['YearOut']['Yield'].tolist() == [1.0]
+    assert broker.claim('w2')[0] == second
+    broker.fail(second, 'w2', 'error', 0.1)
+    assert broker.counts() == {'pending': 0, 'running': 0, 'done': 1,
+                               'failed': 1}
+    assert broker.requeue(60.0, 3) == 1
+    assert broker.claim('w3')[0] == second
+    assert broker.requeue(-1.0, 3) == 1
+    assert broker.claim('w4')[0] == second
+    assert broker.requeue(-1.0, 3) == 0
+    assert broker.claim('w5') is None
+    assert broker.tasks()[1]['error'] == 'heartbeat lost'
+    assert broker.result(second) is None
+
+
+def test_coordinator_collects_its_job(tmp_path):
+    path = str(tmp_path / 'queue.sqlite')
+    co = Coordinator(SQLiteBroker(path), job='NRW')
+    other = Coordinator(SQLiteBroker(path))
+    ids = co.submitLines('a.sol.xml', 'a.proj.xml', '1-5', chunkSize=2,
+                         outputs=['YearOut'])
+    other.submitLines('b.sol.xml', None, '1', chunkSize=2)
+    assert len(ids) == 3
+    broker = SQLiteBroker(path)
+    while True:
+        task = broker.claim('w1')
+        if task is None:
+            break
+        taskId, kind, payload = task
+        lines = numpy.array(projectLinesToList(payload['lines']))
+        broker.complete(taskId, 'w1', {'YearOut': {'line': lines}},
+                        len(lines), 0.1)
+    again = Coordinator(SQLiteBroker(path), job='NRW')
+    assert again.collect('YearOut')['line'].tolist() == [1, 2, 3, 4, 5]
+    report = again.report()
+    assert report['units'] == 3 and report['done'] == 3
+    assert report['workers']['w1']['units'] == 3
+
+
+def test_wait_and_requeue_are_scoped_to_the_job(tmp_path):
+    path = str(tmp_path / 'queue.sqlite')
+    a = Coordinator(SQLiteBroker(path), leaseSeconds=-1.0, job='A')
+    b = Coordinator(SQLiteBroker(path), job='B')
+    a.submitLines('a.sol.xml', None, '1', chunkSize=1)
+    b.submitLines('b.sol.xml', None, '1-2', chunkSize=1)
+    broker = SQLiteBroker(path)
+    taskId = broker.claim('w1')[0]
+    broker.complete(taskId, 'w1', {}, 0, 0.1)
+    broker.claim('w2')
+    assert a.wait(pollInterval=0.01, timeout=5, verbose=False) == \
+        {'pending': 0, 'running': 0, 'done': 1, 'failed': 0}
+    assert broker.counts('B') == {'pending': 1, 'running': 1, 'done': 0,
+                                  'failed': 0}
+    with pytest.raises(TypeError):
+        Broker()
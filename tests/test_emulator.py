@@ -0,0 +1,69 @@
+import numpy
+
+import simplace
+from simplace.emulator import Emulator, GaussianProcess, latinHypercube
+
+
+def test_latin_hypercube_has_one_point_per_stratum():
+    points = latinHypercube(20, 3, seed=1)
+    assert points.shape == (20, 3)
+    for d in range(3):
+        assert sorted(numpy.floor(points[:, d] * 20).astype(int)) == \
+            list(range(20))
+
+
+def test_gaussian_process_interpolates_smooth_function():
+    X = latinHypercube(40, 2, seed=2)
+    f = lambda X: numpy.sin(3 * X[:, 0]) + X[:, 1] ** 2
+    gp = GaussianProcess().fit(X, f(X))
+    test = latinHypercube(10, 2, seed=3)
+    mean, std = gp.predict(test)
+    numpy.testing.assert_allclose(mean, f(test), atol=0.05)
+    assert (std < 0.1).all()
+    _, far = gp.predict([[5.0, 5.0]])
+    assert far[0] > 10 * std.max()
+    assert numpy.abs(gp.leaveOneOutErrors()).max() < 0.1
+
+
+class FakeSimplace:
+    """Simulations whose Yield is a smooth function of two parameters."""
+
+    def __init__(self):
+        self.queue = []
+        self.results = {}
+        self.runs = 0
+
+    def createSimulation(self, sh, parameters):
+        simid = str(len(self.results) + len(self.queue))
+        self.queue.append((simid, parameters))
+        return simid
+
+    def runSimulations(self, sh):
+        for simid, p in self.queue:
+            yearly = p['vLUE'] * 1000 + p['vSowingDay'] * numpy.arange(3)
+            self.results[simid] = {'Yield': yearly}
+            self.runs += 1
+        self.queue = []
+
+    def getResult(self, sh, output, simid):
+        return self.results[simid]
+
+
+def test_emulator_answers_inside_and_simulates_outside(monkeypatch):
+    fake = FakeSimplace()
+    monkeypatch.setattr(simplace, 'createSimulation', fake.createSimulation)
+    monkeypatch.setattr(simplace, 'runSimulations', fake.runSimulations)
+    monkeypatch.setattr(simplace, 'getResult', fake.getResult)
+    monkeypatch.setattr(simplace, 'resultToList', lambda r: r)
+    em = Emulator(None, {'vLUE': (2.5, 3.5), 'vSowingDay': (90, 140)},
+                  {'Yield': ('YearOut', 'Yield'),
+                   'Total': ('YearOut', 'Yield', 'sum')})
+    errors = em.fit(30, seed=0, batchSize=7)
+    assert fake.runs == 30 and set(errors) == {'Yield', 'Total'}
+    inside = em.query({'vLUE': 3.0, 'vSowingDay': 100}, maxStd={'Yield': 5})
+    assert inside['source'] == 'emulator'
+    assert abs(inside['Yield'] - 3200) < 5
+    outside = em.query({'vLUE': 4.0, 'vSowingDay': 100}, learn=True)
+    assert outside == {'Yield': 4200.0, 'Yield_std': 0.0, 'Total': 12300.0,
+                       'Total_std': 0.0, 'source': 'simulation'}
+    assert len(em.X) == 31
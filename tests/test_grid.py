@@ -0,0 +1,30 @@
+import numpy
+
+from simplace.grid import GridRunner
+
+
+def test_masked_cells_numbered_row_by_row():
+    mask = numpy.array([[True, False], [True, True]])
+    grid = GridRunner(mask, firstLine=5)
+    assert grid.lines.tolist() == [5, 6, 7]
+    result = grid.allocate(['Yield'], [1990, 1991])
+    assert result['Yield'].shape == (2, 2, 2)
+    grid.scatter(result, {'line': [5, 7, 6, 99],
+                          'CURRENT.YEAR': [1990, 1991, 1991, 1990],
+                          'Yield': [1.0, 2.0, 3.0, 4.0]}, 'line')
+    stack = result['Yield']
+    assert stack[0, 0, 0] == 1.0
+    assert stack[1, 1, 1] == 2.0
+    assert stack[1, 1, 0] == 3.0
+    assert numpy.isnan(stack).sum() == 5
+
+
+def test_cell_lines_and_memmap(tmp_path):
+    mask = numpy.array([[True, True]])
+    grid = GridRunner(mask, cellLines=numpy.array([[20, 10]]))
+    result = grid.allocate(['Yield'], [2000], outputDir=str(tmp_path / 'maps'))
+    grid.scatter(result, {'line': [10, 20], 'CURRENT.YEAR': [2000, 2000],
+                          'Yield': [1.5, 2.5]}, 'line')
+    result.save(str(tmp_path / 'maps'))
+    saved = numpy.load(str(tmp_path / 'maps' / 'Yield.npy'))
+    assert saved.tolist() == [[[2.5, 1.5]]]
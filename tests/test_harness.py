@@ -0,0 +1,66 @@
+from simplace.harness import FixtureResult, recordResult, recordVarmap, \
+    checkFixture, _Number, _Boolean
+
+
+class FakeResult:
+    """Result with the java methods used by recordResult."""
+
+    def __init__(self, columns, types, units=None):
+        self.columns = columns
+        self.types = types
+        self.units = units or ['-'] * len(columns)
+
+    def getHeaderStrings(self):
+        return list(self.columns)
+
+    def getTypeStrings(self):
+        return list(self.types)
+
+    def getHeaderUnits(self):
+        return list(self.units)
+
+    def getDataObjects(self):
+        return [list(v) for v in self.columns.values()]
+
+
+def _result():
+    return FakeResult(
+        {'CURRENT.DATE': ['1990-01-01T00:00:00', '1990-01-02T00:00:00'],
+         'Yield': [_Number(1.5), None],
+         'Count': [_Number(3), _Number(4)],
+         'Flag': [_Boolean(1), _Boolean(0)],
+         'Crop': ['maize', 'wheat']},
+        ['DATE', 'DOUBLE', 'INT', 'BOOLEAN', 'CHAR'],
+        ['-', 'kg/ha', '-', '-', '-'])
+
+
+def test_result_round_trip(tmp_path):
+    path = str(tmp_path / 'year.npz')
+    recordResult(_result(), path)
+    fixture = FixtureResult(path)
+    assert fixture.kind == 'result'
+    assert fixture.getHeaderStrings() == ['CURRENT.DATE', 'Yield', 'Count',
+                                          'Flag', 'Crop']
+    assert fixture.getHeaderUnits()[1] == 'kg/ha'
+    assert fixture.expected() == {
+        'CURRENT.DATE': ['1990-01-01', '1990-01-02'], 'Yield': [1.5, None],
+        'Count': [3, 4], 'Flag': [True, False], 'Crop': ['maize', 'wheat']}
+    assert [len(c) for c in fixture.getDataObjects(0, 0)] == [1] * 5
+
+
+def test_check_fixture_matches_conversions(tmp_path):
+    path = str(tmp_path / 'year.npz')
+    recordResult(_result(), path)
+    assert checkFixture(path) == []
+
+
+def test_varmap_round_trip(tmp_path):
+    path = str(tmp_path / 'step.npz')
+    varmap = FakeResult({'LAI': _Number(2.5), 'Crop': 'maize'},
+                        ['DOUBLE', 'CHAR'])
+    varmap.getDataObjects = lambda: [_Number(2.5), 'maize']
+    recordVarmap(varmap, path)
+    fixture = FixtureResult(path)
+    assert fixture.kind == 'varmap'
+    assert fixture.expected() == {'LAI': 2.5, 'Crop': 'maize'}
+    assert fixture.getDataObjects() == [2.5, 'maize']
@@ -0,0 +1,77 @@
+import numpy
+
+from simplace.incremental import IncrementalProject
+from simplace.tables import ResultTable, _objectArray
+
+
+def _write(path, text):
+    with open(path, 'w') as f:
+        f.write(text)
+    return str(path)
+
+
+def _project(tmp_path, rows):
+    solution = _write(tmp_path / 'Maize.sol.xml', '<solution/>')
+    data = _write(tmp_path / 'proj.csv', 'SiteID;Soil\n' + '\n'.join(rows))
+    return IncrementalProject(str(tmp_path / 'store.sqlite'), solution, None,
+                              data, keyColumn='SiteID', workDir=str(tmp_path))
+
+
+class FakeRun:
+    """Replaces _runLines, one output row per line with an array column."""
+
+    def __init__(self, inc):
+        self.inc = inc
+        self.batches = []
+
+    def __call__(self, simplaceInstance, batch, outputs, expand):
+        self.batches.append(list(batch))
+        hashes = self.inc.lineHashes(batch)
+        sites = numpy.array([float(hashes[line][0]) for line in batch])
+        layers = _objectArray([numpy.arange(line, dtype=float)
+                               for line in batch])
+        table = ResultTable({'SiteID': sites, 'Layers': layers},
+                            [None], [0, len(batch)], 'projectline')
+        return {'YearOut': table}
+
+
+def test_only_changed_lines_are_run(tmp_path):
+    inc = _project(tmp_path, ['10;loam', '20;sand', '30;clay'])
+    run = inc._runLines = FakeRun(inc)
+    first = inc.run(None, ['YearOut'])
+    assert run.batches == [[1, 2, 3]]
+    assert first['YearOut'].keys == ['10', '20', '30']
+    assert inc.changedLines(['YearOut']) == []
+    _write(inc.projectData, 'SiteID;Soil\n10;loam\n20;silt\n30;clay\n')
+    assert inc.changedLines(['YearOut']) == [2]
+    second = inc.run(None, ['YearOut'])
+    assert run.batches[-1] == [2]
+    assert inc.report['run'] == 1 and inc.report['reused'] == 2
+    layers = second['YearOut']['Layers']
+    assert [list(v) for v in layers] == [[0.0], [0.0, 1.0], [0.0, 1.0, 2.0]]
+    inc.close()
+
+
+def test_solution_and_parameters_change_all_hashes(tmp_path):
+    inc = _project(tmp_path, ['10;loam', '20;sand'])
+    before = inc.lineHashes()
+    inc.parameters = {'vLUE': numpy.array([3.2, 3.3])}
+    changed = inc.lineHashes()
+    assert all(before[l][1] != changed[l][1] for l in before)
+    inc.parameters = {'vLUE': numpy.array([3.2, 3.3])}
+    assert inc.lineHashes() == changed
+    _write(inc.solution, '<solution version="2"/>')
+    assert inc.lineHashes()[1][1] != changed[1][1]
+    inc.close()
+
+
+def test_store_reads_without_pickle(tmp_path):
+    inc = _project(tmp_path, ['10;loam'])
+    table = ResultTable({'SiteID': numpy.array([10, 10]),
+                         'Names': _objectArray([['a', 'b'], None])},
+                        [None], [0, 2], 'projectline')
+    inc._store('YearOut', table, {'10': 'h'}, [1])
+    out = inc._load('10', 'YearOut')
+    assert out['SiteID'].tolist() == [10, 10]
+    assert out['Names'][0] == ['a', 'b'] and out['Names'][1] is None
+    inc.close()
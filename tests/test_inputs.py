@@ -0,0 +1,58 @@
+import os
+
+import numpy
+
+from simplace.inputs import TmpfsCsvWriter
+
+
+def _read(path):
+    with open(path) as f:
+        return f.read().splitlines()
+
+
+def test_tables_are_written_once_and_shared(tmp_path):
+    writer = TmpfsCsvWriter(str(tmp_path / 'inputs'))
+    columns = {'DATE': numpy.array(['1990-01-01', '1990-01-02'],
+                                   dtype='datetime64[D]'),
+               'RAIN': numpy.array([0.1, 1.0 / 3.0]), 'SITE': [1, 2]}
+    a = writer.register('a', columns)
+    b = writer.register('b', dict(columns))
+    assert a == b and len(writer) == 2
+    lines = _read(a)
+    assert lines[0] == 'DATE;RAIN;SITE'
+    assert lines[1] == '01.01.1990;0.10000000000000001;1'
+    assert float(lines[2].split(';')[1]) == 1.0 / 3.0
+    writer.remove('a')
+    assert os.path.exists(b)
+    writer.remove('b')
+    assert not os.path.exists(b)
+    writer.clear()
+    assert os.path.exists(str(tmp_path / 'inputs'))
+
+
+def test_ensemble_and_parameters():
+    with TmpfsCsvWriter(dateFormat='%Y-%m-%d') as writer:
+        dates = numpy.array(['2000-03-01', '2000-03-02'])
+        names = writer.registerEnsemble(
+            'weather', dates, {'TMIN': [[1.0, 2.0], [3.0, 4.0]],
+                               'CO2': [400.0, 400.0]})
+        assert names == ['weather_0', 'weather_1']
+        lines = _read(writer.path('weather_1'))
+        assert lines == ['DATE;TMIN;CO2', '2000-03-01;3;400', '2000-03-02;4;400']
+        parameters = writer.parameters({'vWeatherFile': 'weather_0'},
+                                       relative=True)
+        assert parameters == {'vWeatherFile': writer.filename('weather_0')}
+        root = writer.root
+    assert not os.path.exists(root)
+
+
+def test_changed_table_replaces_the_file(tmp_path):
+    writer = TmpfsCsvWriter(str(tmp_path), dateFormat='%d/%m/%Y')
+    first = writer.register('w', {'DATE': ['1990-05-04'], 'RAIN': [1.0]},
+                            dateColumn='DATE')
+    assert _read(first)[1] == '04/05/1990;1'
+    second = writer.register('w', {'DATE': ['1990-05-04'], 'RAIN': [2.0]},
+                             dateColumn='DATE')
+    assert second != first
+    assert not os.path.exists(first)
+    assert 'w' in writer
@@ -0,0 +1,50 @@
+import simplace.jvm as jvm
+from simplace.simplace import _mergeJavaParameters
+
+MB = 2 ** 20
+
+
+def _auto(monkeypatch, cpus, memory, **kwargs):
+    monkeypatch.setattr(jvm, 'availableCpus', lambda: cpus)
+    monkeypatch.setattr(jvm, 'availableMemory', lambda: memory)
+    return jvm.autoJavaParameters(**kwargs)
+
+
+def test_heap_and_gc_follow_the_workload(monkeypatch):
+    assert _auto(monkeypatch, 1, None) == ['-Xmx768m', '-XX:+UseSerialGC']
+    assert _auto(monkeypatch, 8, None, slotCount=4) == \
+        ['-Xmx1536m', '-XX:+UseParallelGC', '-XX:ParallelGCThreads=4']
+    assert _auto(monkeypatch, 8, None, slotCount=2, projectLines=4000) == \
+        ['-Xmx9024m', '-XX:+UseG1GC', '-XX:ParallelGCThreads=2']
+    assert _auto(monkeypatch, 8, None, slotCount=2, projectLines=4000,
+                 memoryOutputs=False)[0] == '-Xmx1024m'
+
+
+def test_heap_is_capped_by_available_memory(monkeypatch):
+    params = _auto(monkeypatch, 4, 2048 * MB, projectLines=10000)
+    assert params[0] == '-Xmx1536m'
+    assert _auto(monkeypatch, 4, 100 * MB)[0] == '-Xmx256m'
+
+
+def test_explicit_parameters_replace_derived_ones():
+    auto = ['-Xmx4096m', '-XX:+UseG1GC', '-XX:ParallelGCThreads=4']
+    assert _mergeJavaParameters(auto, ['-Xmx2g']) == \
+        ['-XX:+UseG1GC', '-XX:ParallelGCThreads=4', '-Xmx2g']
+    assert _mergeJavaParameters(auto, ['-XX:+UseSerialGC']) == \
+        ['-Xmx4096m', '-XX:+UseSerialGC']
+    assert _mergeJavaParameters(auto, ['-XX:ParallelGCThreads=1',
+                                       '-Dfoo=1']) == \
+        ['-Xmx4096m', '-XX:+UseG1GC', '-XX:ParallelGCThreads=1', '-Dfoo=1']
+
+
+def test_statistics_delta():
+    before = {'gcCount': 3, 'gcSeconds': 0.5, 'collectors': {'G1': (3, 0.5)},
+              'heapUsed': 10, 'uptimeSeconds': 1.0}
+    after = {'gcCount': 5, 'gcSeconds': 0.75,
+             'collectors': {'G1': (4, 0.6), 'Old': (1, 0.15)},
+             'heapUsed': 20, 'uptimeSeconds': 4.0}
+    delta = jvm.jvmStatisticsDelta(before, after)
+    assert delta['gcCount'] == 2 and delta['gcSeconds'] == 0.25
+    assert delta['collectors']['Old'] == (1, 0.15)
+    assert delta['collectors']['G1'][0] == 1
+    assert delta['heapUsed'] == 20 and delta['uptimeSeconds'] == 3.0
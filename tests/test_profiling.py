@@ -0,0 +1,75 @@
+import pytest
+
+from simplace.profiling import Profiler
+
+
+class Frame:
+
+    def __init__(self, name):
+        self.className, self.methodName = name.rsplit('.', 1)
+
+    def getClassName(self):
+        return self.className
+
+    def getMethodName(self):
+        return self.methodName
+
+
+class Thread:
+
+    def __init__(self, threadId):
+        self.threadId = threadId
+
+    def getId(self):
+        return self.threadId
+
+
+class Entry:
+
+    def __init__(self, threadId, names):
+        self.thread = Thread(threadId)
+        self.frames = [Frame(n) for n in names]
+
+    def getKey(self):
+        return self.thread
+
+    def getValue(self):
+        return self.frames
+
+
+class Traces:
+    """Stand-in for the map returned by Thread.getAllStackTraces."""
+
+    def __init__(self, stacks):
+        self.entries = [Entry(i, names) for i, names in stacks.items()]
+
+    def entrySet(self):
+        return self.entries
+
+
+WAITING = ['java.lang.Object.wait', 'net.simplace.sim.FWSimEngine.run']
+COMPONENT = ['net.simplace.sim.components.Soil.process',
+             'net.simplace.sim.FWSimEngine.step']
+
+
+def test_waiting_caller_is_left_out():
+    prof = Profiler()
+    prof._caller = 1
+    prof._sample(Traces({1: WAITING, 2: COMPONENT, 3: COMPONENT,
+                         4: ['java.lang.Object.wait']}), 0.5)
+    assert prof.components == {'net.simplace.sim.components.Soil': 2}
+    assert prof.componentSeconds['net.simplace.sim.components.Soil'] == \
+        pytest.approx(0.5)
+    assert prof.samples == 2
+
+
+def test_single_thread_is_kept():
+    prof = Profiler()
+    prof._caller = 1
+    prof._sample(Traces({1: WAITING}), 0.2)
+    prof._sample(Traces({1: COMPONENT}), 0.3)
+    table = prof.componentTable()
+    assert table['component'].tolist() == ['(framework)',
+                                           'net.simplace.sim.components.Soil']
+    assert table['seconds'].tolist() == pytest.approx([0.2, 0.3])
+    assert table['fraction'].tolist() == [0.5, 0.5]
@@ -0,0 +1,63 @@
+from simplace import projectLinesToList, projectLinesToString
+from simplace.scheduler import LineCostModel, planBatches, _crashedBatches
+
+
+def test_project_line_specifications():
+    assert projectLinesToList('1-3,7, 9-10') == [1, 2, 3, 7, 9, 10]
+    assert projectLinesToList([4, 2]) == [2, 4]
+    assert projectLinesToString([1, 2, 3, 7, 9, 10]) == '1-3,7,9-10'
+    assert projectLinesToList(projectLinesToString(range(5, 40))) == \
+        list(range(5, 40))
+
+
+def test_batches_shrink_towards_the_end():
+    lines = list(range(1, 41))
+    batches = planBatches(lines, [1.0] * 40, workers=2)
+    assert sorted(l for b in batches for l in b) == lines
+    sizes = [len(b) for b in batches]
+    assert sizes == sorted(sizes, reverse=True)
+    assert sizes[0] == 10 and sizes[-1] == 1
+
+
+def test_batches_start_with_expensive_lines_and_respect_limits():
+    batches = planBatches([1, 2, 3, 4, 5], [1.0, 9.0, 1.0, 1.0, 1.0],
+                          workers=1, minBatchSize=2, maxBatchSize=3)
+    assert batches[0][0] == 2
+    assert all(2 <= len(b) <= 3 for b in batches[:-1])
+    assert sorted(l for b in batches for l in b) == [1, 2, 3, 4, 5]
+
+
+def test_cost_model_apportions_and_blends(tmp_path):
+    path = str(tmp_path / 'costs.sqlite')
+    model = LineCostModel(path, key='maize', alpha=0.5)
+    assert model.predict([1, 2]) == [1.0, 1.0]
+    model.update([1, 2], 4.0)
+    assert model.known() == {1: 2.0, 2: 2.0}
+    model.update([1], 6.0)
+    assert model.known()[1] == 4.0
+    assert model.predict([3]) == [4.0]
+    model.close()
+    again = LineCostModel(path, key='maize')
+    assert again.known() == {1: 4.0, 2: 2.0}
+    assert LineCostModel(path, key='wheat').known() == {}
+
+
+class Process:
+
+    def __init__(self, pid, alive, exitcode=None):
+        self.pid = pid
+        self.alive = alive
+        self.exitcode = exitcode
+
+    def is_alive(self):
+        return self.alive
+
+
+def test_batches_of_crashed_workers_are_reported():
+    running = {10: (0, [1, 2]), 11: (1, [3])}
+    crashed = _crashedBatches([Process(10, False, -9), Process(11, True)],
+                              running)
+    assert running == {11: (1, [3])}
+    assert [(r['batch'], r['lines'], r['worker']) for r in crashed] == \
+        [(0, [1, 2], 10)]
+    assert 'exit code -9' in crashed[0]['error']
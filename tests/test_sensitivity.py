@@ -0,0 +1,62 @@
+import numpy
+
+from simplace.sensitivity import SobolAccumulator, MorrisAccumulator, \
+    saltelliSample, morrisSample, elementaryEffects
+
+BOUNDS = {'a': (0.0, 1.0), 'b': (0.0, 1.0)}
+
+
+def _model(X):
+    return X[..., 0] + 2 * X[..., 1]
+
+
+def _sobolBatch(acc, n, seed):
+    A, B, AB = saltelliSample(BOUNDS, n, seed)
+    acc.update(_model(A), _model(B), _model(AB).T)
+
+
+def test_saltelli_sample_shapes_and_bounds():
+    A, B, AB = saltelliSample({'a': (2.0, 3.0), 'b': (-1.0, 0.0)}, 50, 1)
+    assert A.shape == B.shape == (50, 2)
+    assert AB.shape == (2, 50, 2)
+    assert (A[:, 0] >= 2).all() and (A[:, 0] <= 3).all()
+    assert (AB[0, :, 0] == B[:, 0]).all() and (AB[0, :, 1] == A[:, 1]).all()
+
+
+def test_sobol_indices_of_linear_model():
+    acc = SobolAccumulator(list(BOUNDS), bootstrap=20, seed=0)
+    for seed in range(4):
+        _sobolBatch(acc, 5000, seed)
+    assert acc.samples == 20000
+    out = acc.indices()
+    numpy.testing.assert_allclose(out['S1'], [0.2, 0.8], atol=0.05)
+    numpy.testing.assert_allclose(out['ST'], [0.2, 0.8], atol=0.05)
+    assert (out['S1_low'] <= out['S1_high']).all()
+
+
+def test_sobol_merge_equals_single_accumulator():
+    single = SobolAccumulator(list(BOUNDS), bootstrap=0)
+    parts = [SobolAccumulator(list(BOUNDS), bootstrap=0) for _ in range(2)]
+    for seed, part in enumerate(parts):
+        _sobolBatch(single, 100, seed)
+        _sobolBatch(part, 100, seed)
+    parts[0].merge(parts[1])
+    for name in ['S1', 'ST']:
+        numpy.testing.assert_allclose(parts[0].indices()[name],
+                                      single.indices()[name])
+
+
+def test_morris_effects_of_linear_model():
+    bounds = {'a': (0.0, 2.0), 'b': (0.0, 1.0)}
+    points = morrisSample(bounds, 10, seed=3)
+    assert points.shape == (10, 3, 2)
+    effects = elementaryEffects(points, 3 * points[..., 0] - points[..., 1],
+                                bounds)
+    numpy.testing.assert_allclose(effects, numpy.tile([6.0, -1.0], (10, 1)))
+    acc = MorrisAccumulator(list(bounds), bootstrap=0)
+    acc.update(effects)
+    out = acc.indices()
+    assert acc.samples == 10
+    numpy.testing.assert_allclose(out['mu'], [6.0, -1.0])
+    numpy.testing.assert_allclose(out['mu_star'], [6.0, 1.0])
+    numpy.testing.assert_allclose(out['sigma'], [0.0, 0.0], atol=1e-12)
@@ -0,0 +1,79 @@
+import numpy
+
+import simplace
+from simplace.harness import _Number
+from simplace.stepping import EnsembleStepper, StepReader
+
+
+class Varmap:
+    """Varmap with the java methods used by StepReader."""
+
+    def __init__(self, day, stage):
+        self.values = [_Number(day), _Number(stage)]
+
+    def getHeaderStrings(self):
+        return ['DAY', 'DevStage']
+
+    def getTypeStrings(self):
+        return ['INT', 'DOUBLE']
+
+    def getDataObjects(self):
+        return self.values
+
+
+class Ensemble:
+    """Members whose DevStage grows by their rate every step."""
+
+    def __init__(self, rates):
+        self.rates = rates
+        self.days = [0] * len(rates)
+        self.stepAllCalls = 0
+
+    def step(self, member, count):
+        self.days[member] += count
+        return Varmap(self.days[member], self.days[member] * self.rates[member])
+
+    def stepSimulation(self, sh, count, parameters, varFilter, member):
+        return self.step(member, count)
+
+    def stepAllSimulations(self, sh, count, parameterlist, varFilter):
+        self.stepAllCalls += 1
+        return [self.step(i, count) for i in range(len(self.rates))]
+
+
+def _run(monkeypatch, **kwargs):
+    ensemble = Ensemble([1.0, 0.5, 0.25])
+    monkeypatch.setattr(simplace, 'stepSimulation', ensemble.stepSimulation)
+    monkeypatch.setattr(simplace, 'stepAllSimulations',
+                        ensemble.stepAllSimulations)
+    stepper = EnsembleStepper(None, 3, lambda v: v['DevStage'] >= 2.0,
+                              maxSteps=20, **kwargs)
+    return ensemble, stepper, stepper.run()
+
+
+def test_stopped_members_are_not_stepped(monkeypatch):
+    ensemble, stepper, trajectories = _run(monkeypatch)
+    assert stepper.stopStep.tolist() == [2, 4, 8]
+    assert ensemble.days == [2, 4, 8]
+    assert ensemble.stepAllCalls == 2
+    assert [t['DAY'].tolist()[-1] for t in trajectories] == [2, 4, 8]
+    assert trajectories[2]['DevStage'].tolist() == \
+        [0.25, 0.5, 0.75, 1.0, 1.25, 1.5, 1.75, 2.0]
+
+
+def test_bulk_stepping_is_opt_in(monkeypatch):
+    ensemble, stepper, trajectories = _run(monkeypatch, stepAllFraction=0)
+    assert stepper.stopStep.tolist() == [2, 4, 8]
+    assert ensemble.days == [8, 8, 8]
+    assert ensemble.stepAllCalls == 8
+    assert [len(t['DAY']) for t in trajectories] == [2, 4, 8]
+
+
+def test_reader_grows_beyond_capacity():
+    reader = StepReader(None, capacity=2)
+    for day in range(5):
+        reader.read(Varmap(day, day * 0.5))
+    assert reader.steps == 5
+    assert reader.value('DevStage') == 2.0
+    assert reader.trajectory()['DAY'].dtype == numpy.int64
+    assert reader.values(1) == {'DAY': 1.0, 'DevStage': 0.5}
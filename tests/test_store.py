@@ -0,0 +1,52 @@
+import numpy
+
+from simplace.store import CompactResultStore, CompactColumn
+
+
+def _result():
+    return {'Yield': numpy.array([7012.3, 6844.1, numpy.nan]),
+            'Year': numpy.array([1990.0, 1991.0, 1992.0]),
+            'Flag': numpy.array([True, False, True]),
+            'Date': ['1990-12-31', '1991-12-31', '1992-12-31'],
+            'Crop': ['maize', 'wheat', 'maize'],
+            'Day': numpy.array(['1990-01-01', 'NaT', '1992-01-01'],
+                               dtype='datetime64[D]')}
+
+
+def test_encodings():
+    columns = {n: CompactColumn(v, 1e-6) for n, v in _result().items()}
+    assert {n: c.encoding for n, c in columns.items()} == {
+        'Yield': 'float32', 'Year': 'int', 'Flag': 'bits',
+        'Date': 'datestring', 'Crop': 'dictionary', 'Day': 'date'}
+    assert CompactColumn([0.1, 0.2], tolerance=0).encoding == 'plain'
+
+
+def test_round_trip_and_compression():
+    store = CompactResultStore(tolerance=1e-6)
+    store.add(1, _result())
+    store.add(2, {'Yield': numpy.arange(1000) * 0.5})
+    assert store.compressCold(maxAge=0) > 0
+    for key, expected in [(1, _result()),
+                          (2, {'Yield': numpy.arange(1000) * 0.5})]:
+        out = store.get(key)
+        assert list(out) == list(expected)
+        for name, values in expected.items():
+            if isinstance(values, list):
+                assert out[name] == values
+            elif values.dtype.kind == 'f':
+                numpy.testing.assert_allclose(out[name], values, rtol=1e-6)
+                assert out[name].dtype == values.dtype
+            else:
+                numpy.testing.assert_array_equal(out[name], values)
+    report = store.memoryReport()
+    assert report['columns'] == 7
+    assert report['ratio'] < 1
+
+
+def test_remove_and_object_columns():
+    store = CompactResultStore()
+    store.add('a', {'Values': [[1, 2], [3]]})
+    assert store.column('a', 'Values') == [[1, 2], [3]]
+    assert store.compressCold() == 0
+    store.remove('a')
+    assert len(store) == 0 and 'a' not in store
@@ -0,0 +1,93 @@
+import pytest
+
+import simplace
+from simplace.harness import _Number
+from simplace.tables import ResultTable, getResultTable, getResults, \
+    resultToTable
+
+
+class FakeResult:
+    """Result with the java methods used by the table functions."""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def getHeaderStrings(self):
+        return ['CURRENT.DATE', 'Yield', 'Layers']
+
+    def getTypeStrings(self):
+        return ['DATE', 'DOUBLE', 'DOUBLEARRAY']
+
+    def getHeaderUnits(self):
+        return ['-', 'kg/ha', 'cm']
+
+    def getDataObjects(self):
+        return [['199%d-12-31T00:00' % i for i in range(self.rows)],
+                [_Number(i * 10.0) for i in range(self.rows)],
+                [[1.0, 2.0]] * self.rows]
+
+
+def _patch(monkeypatch, results):
+    fetched = []
+
+    def getResult(sh, output, simulation=None):
+        fetched.append((output, simulation))
+        return results[output][simulation]
+
+    monkeypatch.setattr(simplace, 'getResult', getResult)
+    monkeypatch.setattr(simplace, 'getSimulationIDs',
+                        lambda sh: sorted(results['YearOut']))
+    return fetched
+
+
+def test_simulations_in_one_table(monkeypatch):
+    _patch(monkeypatch, {'YearOut': {'1': FakeResult(2), '2': FakeResult(3)}})
+    table = getResultTable(None, 'YearOut')
+    assert len(table) == 5
+    assert table.keys == ['1', '2']
+    assert table['simulationid'].tolist() == ['1', '1', '2', '2', '2']
+    assert table.group('2')['Yield'].tolist() == [0.0, 10.0, 20.0]
+    assert table['Layers'].shape == (5, 2)
+    assert table.units['Yield'] == 'kg/ha'
+    assert table.types['CURRENT.DATE'] == 'DATE'
+    assert table.group('1')['CURRENT.DATE'].tolist() == ['1990-12-31',
+                                                         '1991-12-31']
+
+
+def test_select_concat_and_groups():
+    first = resultToTable(FakeResult(2), 'a')
+    second = resultToTable(FakeResult(1), 'b')
+    table = ResultTable.concat([first, None, second])
+    assert table.keys == ['a', 'b']
+    assert table.offsets.tolist() == [0, 2, 3]
+    assert [(k, len(g['Yield'])) for k, g in table.groups()] == \
+        [('a', 2), ('b', 1)]
+    selected = table.select(['Yield'])
+    assert selected.names() == ['Yield', 'simulationid']
+    assert selected.group('b')['Yield'].base is not None
+    assert len(ResultTable.concat([])) == 0
+
+
+def test_ragged_arrays_become_object_columns():
+    result = FakeResult(2)
+    result.getDataObjects = lambda: [['1990-01-01', '1990-01-02'],
+                                     [_Number(1.0), _Number(2.0)],
+                                     [[1.0], [1.0, 2.0]]]
+    table = resultToTable(result)
+    assert table['Layers'].dtype == object
+    assert table['Layers'][1].tolist() == [1.0, 2.0]
+
+
+def test_several_outputs_in_one_pass(monkeypatch):
+    fetched = _patch(monkeypatch, {'YearOut': {'1': FakeResult(2)},
+                                   'DayOut': {'1': FakeResult(3)}})
+    tables = getResults(None, ['YearOut', 'DayOut'], '1',
+                        columns=['Yield', 'Missing'])
+    assert fetched == [('YearOut', '1'), ('DayOut', '1')]
+    assert tables['YearOut'].names() == ['Yield', 'simulationid']
+    assert len(tables['DayOut']) == 3
+    tables = getResults(None, 'YearOut', ['1'],
+                        columns={'YearOut': ['CURRENT.DATE']})
+    assert tables['YearOut'].names() == ['CURRENT.DATE', 'simulationid']
+    with pytest.raises(KeyError):
+        getResults(None, ['YearOut'], '1', columns={'YearOut': ['Missing']})